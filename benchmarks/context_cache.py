@@ -0,0 +1,107 @@
+# benchmarks/context_cache.py
+# -*- coding: utf-8 -*-
+"""
+Cost of the deep link context cache at N live entries.
+
+Measures put/get/expire of ContextCache with the cache already holding N entries, next to the
+previous implementation (a plain dict fully scanned by cleanup_cache() on every message).
+
+    python benchmarks/context_cache.py --entries 100000 --ops 20000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+# Settings are read at import time: configure a throwaway environment before importing the app
+os.environ.update({
+    'API_ID': os.environ.get('API_ID', '1'),
+    'API_HASH': os.environ.get('API_HASH', 'benchmark'),
+    'PHONE_NUMBER': os.environ.get('PHONE_NUMBER', '+10000000000'),
+    'SOURCE_BOT_IDENTIFIER': os.environ.get('SOURCE_BOT_IDENTIFIER', '1'),
+    'BOT_TOKEN': os.environ.get('BOT_TOKEN', '123456:BENCHMARK'),
+    'TARGET_CHAT_IDS': '',
+    'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'WARNING'),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.context_cache import ContextCache # noqa: E402
+
+TEXT = "RT @someone: " + "x" * 280
+
+
+def _make_data() -> dict:
+    return {'text': TEXT, 'media_type': 'photo', 'file_id': None}
+
+
+def _per_op_us(started: float, ops: int) -> float:
+    return (time.perf_counter() - started) * 1e6 / ops
+
+
+def bench_context_cache(entries: int, ops: int) -> dict:
+    cache = ContextCache(ttl_seconds=600, max_entries=entries, max_bytes=1 << 40)
+    ids = [uuid.uuid4().hex for _ in range(entries)]
+    for context_id in ids:
+        cache.put(context_id, _make_data())
+
+    # At capacity: every put also evicts the least recently used entry
+    started = time.perf_counter()
+    for _ in range(ops):
+        cache.put(uuid.uuid4().hex, _make_data())
+    put_us = _per_op_us(started, ops)
+
+    recent = ids[-ops:]
+    started = time.perf_counter()
+    for context_id in recent:
+        cache.get(context_id)
+    get_us = _per_op_us(started, ops)
+
+    # Nothing expired: the common case on every message
+    started = time.perf_counter()
+    for _ in range(ops):
+        cache.expire()
+    expire_us = _per_op_us(started, ops)
+
+    # Everything expired at once: one full drain
+    started = time.perf_counter()
+    drained = cache.expire(time.monotonic() + 601)
+    drain_ms = (time.perf_counter() - started) * 1000
+    return {'put_us': put_us, 'get_us': get_us, 'expire_us': expire_us, 'drain_ms': drain_ms, 'drained': drained, 'stats': cache.get_stats()}
+
+
+def bench_legacy_scan(entries: int, ops: int) -> float:
+    """Per-message cleanup_cache() of the plain dict implementation (full scan, nothing expired)."""
+    cache = {}
+    now = time.time()
+    for _ in range(entries):
+        cache[uuid.uuid4().hex] = {**_make_data(), 'timestamp': now}
+    started = time.perf_counter()
+    for _ in range(ops):
+        now = time.time()
+        expired = [key for key, value in cache.items() if now - value.get('timestamp', 0) > 600]
+        for key in expired:
+            del cache[key]
+    return _per_op_us(started, ops)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--ops', type=int, default=20000)
+    parser.add_argument('--legacy-ops', type=int, default=50, help="Scans of the previous implementation (each is O(entries))")
+    args = parser.parse_args()
+
+    result = bench_context_cache(args.entries, args.ops)
+    print(f"ContextCache with {args.entries} entries ({args.ops} ops each):")
+    print(f"  put (with LRU eviction): {result['put_us']:.2f} us/op")
+    print(f"  get (hit):               {result['get_us']:.2f} us/op")
+    print(f"  expire (none due):       {result['expire_us']:.2f} us/op")
+    print(f"  expire (all due):        {result['drain_ms']:.1f} ms for {result['drained']} entries")
+    print(f"  stats: {result['stats']}")
+    legacy_us = bench_legacy_scan(args.entries, args.legacy_ops)
+    print(f"Previous dict + full-scan cleanup_cache() per message: {legacy_us:.0f} us/op")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/egress_throughput.py
+# -*- coding: utf-8 -*-
+"""
+Delivery throughput of the egress workers against a mock Bot API server.
+
+Publishes FX send jobs for many target chats and measures targets delivered per second with
+0 (in-process), 1, 2, 4... worker processes. The mock server answers every request from
+several processes (SO_REUSEPORT), optionally after a fixed latency.
+
+    python benchmarks/egress_throughput.py --messages 200 --targets 50 --workers 0,1,2,4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BOT_TOKEN = "123456:BENCHMARK"
+
+# Settings are read at import time: configure a throwaway environment before importing the app
+os.environ.update({
+    'API_ID': os.environ.get('API_ID', '1'),
+    'API_HASH': os.environ.get('API_HASH', 'benchmark'),
+    'PHONE_NUMBER': os.environ.get('PHONE_NUMBER', '+10000000000'),
+    'SOURCE_BOT_IDENTIFIER': os.environ.get('SOURCE_BOT_IDENTIFIER', '1'),
+    'BOT_TOKEN': BOT_TOKEN,
+    'SHARD_BOT_TOKENS': '',
+    'TARGET_CHAT_IDS': '',
+    'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'WARNING'),
+    # Measure the delivery machinery, not Telegram's limits
+    'SEND_GLOBAL_RATE': '1000000',
+    'SEND_GLOBAL_BURST': '1000000',
+    'SEND_GROUP_RATE_PER_MIN': '1000000',
+    'SEND_GROUP_BURST': '1000000',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.bot_api_server import start_mock_server # noqa: E402
+
+
+# --- Benchmark ---
+async def run_in_process(messages: int, targets: list[int]) -> float:
+    from telegram_clients import setup
+    from handlers.message_processing import ContentPayload, launch_fxtwitter_sends
+
+    bot = setup.setup_send_bot(BOT_TOKEN, name="benchmark")
+    await bot.initialize()
+    semaphore = asyncio.Semaphore(int(os.environ.get('MAX_CONCURRENT_TASKS', 5)))
+    payload = ContentPayload(text="benchmark")
+    started = time.monotonic()
+    tasks = []
+    for message_id in range(messages):
+        tasks.extend(launch_fxtwitter_sends(bot, payload, targets, semaphore, f"Msg {message_id}: "))
+    results = await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+    await bot.shutdown()
+    assert all(results), "some in-process sends failed"
+    return elapsed
+
+
+async def run_with_workers(workers: int, messages: int, targets: list[int]) -> float:
+    from handlers.egress import EgressPool
+    from handlers.message_processing import ContentPayload
+
+    pool = EgressPool(workers, [BOT_TOKEN], queue_size=10000)
+    pool.start()
+    payload = ContentPayload(text="benchmark")
+    # Warm-up: worker start-up and bot initialization are not part of the measurement
+    await pool.publish_fxtwitter(None, payload, targets, -1, "Warm-up: ")
+    expected = len(targets)
+    while pool.targets_succeeded_total + pool.targets_failed_total < expected:
+        await asyncio.sleep(0.01)
+
+    started = time.monotonic()
+    for message_id in range(messages):
+        await pool.publish_fxtwitter(None, payload, targets, message_id, f"Msg {message_id}: ")
+    expected += messages * len(targets)
+    while pool.targets_succeeded_total + pool.targets_failed_total < expected:
+        await asyncio.sleep(0.005)
+    elapsed = time.monotonic() - started
+    failed = pool.targets_failed_total
+    await pool.stop()
+    assert failed == 0, f"{failed} sends failed"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=100, help="Source messages to fan out")
+    parser.add_argument('--targets', type=int, default=50, help="Target chats per message")
+    parser.add_argument('--workers', default="0,1,2,4", help="Comma-separated worker counts (0 = in-process)")
+    parser.add_argument('--concurrency', type=int, default=20, help="MAX_CONCURRENT_TASKS per process")
+    parser.add_argument('--server-processes', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--latency', type=float, default=0.0, help="Mock Bot API latency per request (seconds)")
+    args = parser.parse_args()
+
+    port, servers = start_mock_server(args.server_processes, args.latency)
+    os.environ['BOT_API_BASE_URL'] = f"http://127.0.0.1:{port}/bot"
+    os.environ['MAX_CONCURRENT_TASKS'] = str(args.concurrency)
+    os.environ['HTTP_TEXT_POOL_SIZE'] = str(args.concurrency)
+
+    targets = [-1000000000000 - i for i in range(args.targets)]
+    total = args.messages * args.targets
+    print(f"{args.messages} messages x {args.targets} targets = {total} sends, "
+          f"mock latency {args.latency * 1000:.0f} ms, {os.cpu_count()} CPU(s)")
+    baseline = None
+    try:
+        for workers in (int(w) for w in args.workers.split(',')):
+            if workers <= 0:
+                elapsed = asyncio.run(run_in_process(args.messages, targets))
+                label = "in-process"
+            else:
+                elapsed = asyncio.run(run_with_workers(workers, args.messages, targets))
+                label = f"{workers} worker(s)"
+            rate = total / elapsed
+            baseline = baseline or rate
+            print(f"{label:>12}: {elapsed:7.2f}s  {rate:9.0f} sends/s  x{rate / baseline:.2f}")
+    finally:
+        for server in servers:
+            server.terminate()
+
+
+if __name__ == '__main__':
+    main()
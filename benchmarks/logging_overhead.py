@@ -0,0 +1,126 @@
+# benchmarks/logging_overhead.py
+# -*- coding: utf-8 -*-
+"""
+Event-loop time spent logging one message's fan-out.
+
+Emits the per-target "Successfully sent" line for every target of a simulated fan-out from a
+coroutine and measures how long the event loop is busy, with:
+  inline   - StreamHandler on the root logger (previous setup: format + write + flush on the loop)
+  queue    - QueueHandler -> QueueListener thread (formatting/writing off the loop)
+  sampled  - queue + LOG_SEND_SUCCESS_SAMPLE_EVERY=0 (only the per-message summary line)
+
+--write-latency-us simulates a stdout that blocks on each write (a pipe to a busy log
+collector or a slow terminal); 0 measures writes to a local file.
+
+    python benchmarks/logging_overhead.py --targets 1000 --messages 20 [--json] [--write-latency-us 50]
+"""
+import argparse
+import asyncio
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import tempfile
+import time
+
+# Settings are read at import time: configure a throwaway environment before importing the app
+os.environ.update({
+    'API_ID': os.environ.get('API_ID', '1'),
+    'API_HASH': os.environ.get('API_HASH', 'benchmark'),
+    'PHONE_NUMBER': os.environ.get('PHONE_NUMBER', '+10000000000'),
+    'SOURCE_BOT_IDENTIFIER': os.environ.get('SOURCE_BOT_IDENTIFIER', '1'),
+    'BOT_TOKEN': os.environ.get('BOT_TOKEN', '123456:BENCHMARK'),
+    'TARGET_CHAT_IDS': '',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import logging_config # noqa: E402
+
+logger = logging.getLogger("benchmark.sender")
+
+
+class _BlockingStream:
+    """File stream whose writes block for a fixed time (releasing the GIL, like a blocked pipe)."""
+
+    def __init__(self, stream, latency_seconds: float):
+        self._stream = stream
+        self._latency = latency_seconds
+
+    def write(self, text: str):
+        if self._latency:
+            time.sleep(self._latency)
+        return self._stream.write(text)
+
+    def flush(self):
+        self._stream.flush()
+
+
+async def fan_out(message_id: int, targets: int, per_target: bool):
+    """Logs what the pipeline logs for one message; yields to the loop like real sends would."""
+    log_prefix = f"Msg {message_id}: [Send] "
+    for chat_id in range(-1001000000000, -1001000000000 + targets):
+        if per_target:
+            logger.info(f"{log_prefix}Target {chat_id}: Successfully sent 'FXTwitter Link'.")
+        await asyncio.sleep(0)
+    logger.info(f"{log_prefix}Finished sending for Msg {message_id}. Tasks Succeeded: {targets}, Tasks Failed: 0")
+
+
+async def measure(messages: int, targets: int, per_target: bool) -> float:
+    """Seconds of loop time per message (main() subtracts a run with logging disabled)."""
+    started = time.perf_counter()
+    for message_id in range(messages):
+        await fan_out(message_id, targets, per_target)
+    return (time.perf_counter() - started) / messages
+
+
+def _install(mode: str, stream, use_json: bool):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(logging.INFO)
+    formatter = logging_config.JsonFormatter() if use_json else logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(formatter)
+    if mode == 'inline':
+        root.addHandler(stream_handler)
+        return None
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging_config._DeferredQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help="Use the JSON line format")
+    parser.add_argument('--output', help="Log destination (default: a temp file)")
+    parser.add_argument('--write-latency-us', type=float, default=50, help="Time each write to the log stream blocks")
+    args = parser.parse_args()
+
+    path = args.output or os.path.join(tempfile.mkdtemp(), 'bench.log')
+    logging.getLogger().handlers.clear()
+    logging.disable(logging.CRITICAL)
+    baseline = min(asyncio.run(measure(args.messages, args.targets, per_target=False)) for _ in range(3))
+    logging.disable(logging.NOTSET)
+
+    print(f"{args.messages} message(s) x {args.targets} target(s), {'json' if args.json else 'text'} format, "
+          f"{args.write_latency_us:g} us per write, output {path}")
+    print(f"  no logging:  {baseline * 1000:8.2f} ms loop time per message")
+    for mode, per_target in (('inline', True), ('queue', True), ('sampled', False)):
+        with open(path, 'a', encoding='utf-8') as stream:
+            listener = _install(mode, _BlockingStream(stream, args.write_latency_us / 1e6), args.json)
+            loop_seconds = asyncio.run(measure(args.messages, args.targets, per_target))
+            drain_started = time.perf_counter()
+            if listener is not None:
+                listener.stop()
+            drain_ms = (time.perf_counter() - drain_started) * 1000
+        print(f"  {mode:<11} {(loop_seconds - baseline) * 1000:8.2f} ms logging on the loop per message"
+              f" (listener drained the rest in {drain_ms:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
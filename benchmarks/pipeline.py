@@ -0,0 +1,356 @@
+# benchmarks/pipeline.py
+# -*- coding: utf-8 -*-
+"""
+Offline end-to-end benchmark of the message pipeline.
+
+Builds synthetic source-bot messages (real Telethon Message objects with the "View Tweet"
+ReplyInlineMarkup, tweet-like text and photo/video media) and pushes them through the ingest
+queue into handle_new_message, which analyzes, formats, downloads (fake Telethon client) and
+fans out to the target groups through a fake Bot. The fake Bot answers after a configurable
+latency and can inject errors, RetryAfter and ChatMigrated. Nothing touches the network, and
+config/outbox/deep link state goes to a temp directory.
+
+Reports messages/s, sends/s, per-message processing time and the delivery latency from the
+source post to the first/last group (latency ledger) per mode, for each target count.
+Sends run in-process (EGRESS_WORKERS=0); benchmarks/egress_throughput.py covers the workers.
+
+    python benchmarks/pipeline.py --targets 10,1000,10000 --messages 10 [--latency 0.05] [--concurrency 50]
+        [--error-rate 0.001] [--retry-after-rate 0.001] [--migrate-rate 0.0001] [--telegram-limits]
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+_STATE_DIR = tempfile.mkdtemp(prefix='pipeline_bench_')
+BOT_TOKEN = "123456:BENCHMARK"
+SOURCE_BOT_ID = 777000
+
+# Settings are read at import time: configure a throwaway environment before importing the app
+os.environ.update({
+    'API_ID': os.environ.get('API_ID', '1'),
+    'API_HASH': os.environ.get('API_HASH', 'benchmark'),
+    'PHONE_NUMBER': os.environ.get('PHONE_NUMBER', '+10000000000'),
+    'SOURCE_BOT_IDENTIFIER': str(SOURCE_BOT_ID),
+    'BOT_TOKEN': BOT_TOKEN,
+    'SHARD_BOT_TOKENS': '',
+    'TARGET_CHAT_IDS': '',
+    'EGRESS_WORKERS': '0',
+    'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'CRITICAL'), # Injected failures would flood the output (pipeline failures are counted)
+    'OUTBOX_FILE': os.path.join(_STATE_DIR, 'outbox.sqlite3'),
+    'DEEP_LINK_INDEX_FILE': os.path.join(_STATE_DIR, 'deep_links.sqlite3'),
+    'MEDIA_TEMP_DIR': _STATE_DIR,
+})
+if '--telegram-limits' not in sys.argv:
+    # Measure the pipeline, not Telegram's limits
+    os.environ.update({
+        'SEND_GLOBAL_RATE': '1000000',
+        'SEND_GLOBAL_BURST': '1000000',
+        'SEND_GROUP_RATE_PER_MIN': '1000000',
+        'SEND_GROUP_BURST': '1000000',
+    })
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Bot, Chat, Message as PtbMessage, PhotoSize, User, Video # noqa: E402
+from telegram.error import ChatMigrated, NetworkError, RetryAfter # noqa: E402
+from telethon.tl import types # noqa: E402
+from telethon.tl.custom import Message # noqa: E402
+
+from config import settings, persistent_config, group_config, shard_config # noqa: E402
+from telegram_clients import bot_pool # noqa: E402
+from utils import identity_cache, file_id_cache, logging_config, outbox, deep_links, latency_ledger # noqa: E402
+from handlers import message_handlers # noqa: E402
+from handlers.ingest_queue import IngestQueue # noqa: E402
+
+# Registries persist next to the code: keep the benchmark's writes out of the project
+# (the file constant is read on load, the write-behind writer keeps its own path)
+persistent_config.TARGET_GROUPS_FILE = persistent_config._writer.path = os.path.join(_STATE_DIR, 'target_groups.json')
+group_config.GROUP_MODES_FILE = group_config._writer.path = os.path.join(_STATE_DIR, 'group_modes.json')
+shard_config.SHARD_MAP_FILE = shard_config._writer.path = os.path.join(_STATE_DIR, 'shard_map.json')
+file_id_cache.FILE_ID_CACHE_FILE = file_id_cache._writer.path = os.path.join(_STATE_DIR, 'file_id_cache.json')
+
+_USERNAMES = ('elonmusk', 'naval', 'VitalikButerin', 'cz_binance', 'pmarca', 'balajis')
+_ACTIONS = ('Tweet', 'Tweet', 'Retweet', 'Quote', 'Reply')
+_WORDS = ('launch', 'token', 'chain', 'today', 'new', 'market', 'build', 'ship', 'onchain', 'community', 'airdrop', 'update')
+
+
+def _percentiles(values: list[float]) -> tuple[float, float, float]:
+    """p50 / p95 / p99 (nearest rank), zeros without values."""
+    if not values:
+        return 0.0, 0.0, 0.0
+    ordered = sorted(values)
+    return tuple(ordered[max(0, math.ceil(q * len(ordered)) - 1)] for q in (0.5, 0.95, 0.99))
+
+
+def _format_ms(values: tuple) -> str:
+    return " / ".join(f"{v * 1000:7.1f}" for v in values)
+
+
+# --- Synthetic source messages ---
+class MessageFactory:
+    """Source-bot messages as Telethon delivers them: text, "View Tweet" URL button, optional media."""
+
+    def __init__(self, photo_share: float, video_share: float, photo_bytes: int, video_bytes: int, seed: int):
+        self._random = random.Random(seed)
+        self._photo_share = photo_share
+        self._video_share = video_share
+        self._photo_bytes = photo_bytes
+        self._video_bytes = video_bytes
+        self._ids = itertools.count(1)
+
+    def _text(self, username: str, status_id: int) -> str:
+        action = self._random.choice(_ACTIONS)
+        body = " ".join(self._random.choice(_WORDS) for _ in range(self._random.randint(8, 40)))
+        text = f"🐦 **{action}** from **{username}**\n\n"
+        if action == 'Retweet':
+            text += "**RT** "
+        return text + f"{body} https://x.com/{username}/status/{status_id}"
+
+    def build(self) -> Message:
+        message_id = next(self._ids)
+        now = datetime.datetime.now(datetime.timezone.utc) # Posted "now": the ledger measures from here
+        username = self._random.choice(_USERNAMES)
+        status_id = 1800000000000000000 + message_id # Unique: dedupe never suppresses a benchmark message
+        markup = types.ReplyInlineMarkup([types.KeyboardButtonRow([
+            types.KeyboardButtonUrl(settings.BUTTON_TEXT_TO_FIND, f"https://x.com/{username}/status/{status_id}"),
+        ])])
+        media = None
+        draw = self._random.random()
+        if draw < self._photo_share:
+            photo = types.Photo(
+                id=message_id, access_hash=message_id, file_reference=b'', date=now, dc_id=1,
+                sizes=[types.PhotoSize('y', 1280, 720, self._photo_bytes)],
+            )
+            media = types.MessageMediaPhoto(photo=photo)
+        elif draw < self._photo_share + self._video_share:
+            document = types.Document(
+                id=message_id, access_hash=message_id, file_reference=b'', date=now, dc_id=1,
+                mime_type='video/mp4', size=self._video_bytes,
+                attributes=[types.DocumentAttributeVideo(duration=15, w=1280, h=720)],
+            )
+            media = types.MessageMediaDocument(document=document)
+        message = Message(
+            id=message_id, peer_id=types.PeerUser(SOURCE_BOT_ID), date=now,
+            from_id=types.PeerUser(SOURCE_BOT_ID), media=media, reply_markup=markup,
+        )
+        message.text = self._text(username, status_id)
+        return message
+
+
+class FakeTelethonClient:
+    """Serves download_media with a fixed latency (bytes or a file, like Telethon)."""
+    parse_mode = None
+
+    def __init__(self, download_latency: float):
+        self._latency = download_latency
+        self.downloads_total = 0
+
+    async def download_media(self, message, file=None):
+        await asyncio.sleep(self._latency)
+        self.downloads_total += 1
+        data = b'\0' * (message.file.size or 1)
+        if file is bytes:
+            return data
+        with open(file, 'wb') as f:
+            f.write(data)
+        return file
+
+
+# --- Fake Bot API ---
+class FakeBot(Bot):
+    """
+    telegram.Bot whose send methods answer locally after latency (+- jitter), uploads after
+    upload_latency. Each request fails with error_rate (NetworkError), is flood-limited with
+    retry_after_rate (RetryAfter) and migrates its chat with migrate_rate (ChatMigrated, then
+    every later send to the old id is answered with ChatMigrated as Telegram does).
+    """
+
+    def __init__(self, token: str, latency: float, jitter: float, upload_latency: float,
+                 error_rate: float, retry_after_rate: float, retry_after: int, migrate_rate: float, seed: int):
+        super().__init__(token)
+        with self._unfrozen():
+            self._latency = latency
+            self._jitter = jitter
+            self._upload_latency = upload_latency
+            self._error_rate = error_rate
+            self._retry_after_rate = retry_after_rate
+            self._retry_after = retry_after
+            self._migrate_rate = migrate_rate
+            self._random = random.Random(seed)
+            self._migrated: dict[int, int] = {}
+            self._migration_ids = itertools.count(-1009000000000, -1)
+            self._chat = Chat(id=-1, type=Chat.SUPERGROUP)
+            self.counts = {'requests': 0, 'delivered': 0, 'uploads': 0, 'errors': 0, 'retry_after': 0, 'migrated': 0}
+
+    async def get_me(self, *args, **kwargs) -> User:
+        return User(id=bot_pool.bot_id_from_token(self.token), is_bot=True, first_name="Benchmark", username="benchmark_bot")
+
+    async def _respond(self, chat_id: int, upload: bool, **fields):
+        self.counts['requests'] += 1
+        delay = self._upload_latency if upload else self._latency
+        if self._jitter and delay:
+            delay *= 1 + self._random.uniform(-self._jitter, self._jitter)
+        await asyncio.sleep(delay)
+        if chat_id in self._migrated:
+            raise ChatMigrated(self._migrated[chat_id])
+        draw = self._random.random()
+        if draw < self._error_rate:
+            self.counts['errors'] += 1
+            raise NetworkError("Bad Gateway")
+        draw -= self._error_rate
+        if draw < self._retry_after_rate:
+            self.counts['retry_after'] += 1
+            raise RetryAfter(self._retry_after)
+        draw -= self._retry_after_rate
+        if draw < self._migrate_rate:
+            self.counts['migrated'] += 1
+            self._migrated[chat_id] = next(self._migration_ids)
+            raise ChatMigrated(self._migrated[chat_id])
+        self.counts['delivered'] += 1
+        if upload:
+            self.counts['uploads'] += 1
+        return PtbMessage(message_id=1, date=datetime.datetime.now(datetime.timezone.utc), chat=self._chat, **fields)
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        return await self._respond(chat_id, False, text=text)
+
+    async def send_photo(self, chat_id, photo, *args, **kwargs):
+        return await self._respond(chat_id, not isinstance(photo, str), photo=(PhotoSize('bench-photo', 'bench-photo', 1280, 720),))
+
+    async def send_video(self, chat_id, video, *args, **kwargs):
+        return await self._respond(chat_id, not isinstance(video, str), video=Video('bench-video', 'bench-video', 1280, 720, 15))
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, *args, **kwargs):
+        return await self._respond(chat_id, False)
+
+
+# --- Runs ---
+async def run(target_count: int, args, factory: MessageFactory) -> dict:
+    targets = [-1001000000000 - i for i in range(target_count)]
+    await persistent_config.replace_target_groups(targets)
+    fx_targets = targets[:int(target_count * args.fx_share)]
+    for chat_id in fx_targets:
+        group_config.set_group_mode(chat_id, group_config.MODE_FXTWITTER)
+
+    bot = FakeBot(
+        BOT_TOKEN, args.latency, args.jitter, args.upload_latency, args.error_rate,
+        args.retry_after_rate, args.retry_after, args.migrate_rate, args.seed,
+    )
+    bot_pool.register_primary(bot)
+    await identity_cache.refresh_bot_identity(bot)
+    client = FakeTelethonClient(args.download_latency)
+    semaphore = asyncio.Semaphore(args.concurrency) # main.py sizes it with MAX_CONCURRENT_TASKS
+
+    processing_seconds = []
+
+    async def process_item(item):
+        started = time.perf_counter()
+        await message_handlers.handle_new_message(item.message, client, bot, semaphore, downgraded=item.downgraded)
+        processing_seconds.append(time.perf_counter() - started)
+
+    ingest = IngestQueue(process_item, maxsize=settings.INGEST_QUEUE_SIZE, num_workers=settings.INGEST_WORKERS,
+                         overflow_policy=settings.INGEST_OVERFLOW_POLICY)
+    ingest.start()
+    started = time.time()
+    for _ in range(args.messages):
+        await ingest.put(factory.build())
+        if args.rate > 0:
+            await asyncio.sleep(1 / args.rate)
+    await ingest.stop(drain_timeout=3600)
+    elapsed = time.time() - started
+
+    # Reset the modes for the next target count
+    for chat_id in fx_targets:
+        group_config.remove_group(chat_id)
+    summary = latency_ledger.get_latency_ledger().summary(time.time() - started) # Messages of this run only
+    return {
+        'elapsed': elapsed,
+        'processed': ingest.processed_total,
+        'failed': ingest.failed_total,
+        'bot': bot.counts,
+        'downloads': client.downloads_total,
+        'processing': _percentiles(processing_seconds),
+        'delivery': summary,
+    }
+
+
+async def main_async(args) -> list[tuple[int, dict]]:
+    factory = MessageFactory(args.photo_share, args.video_share, args.photo_bytes, args.video_bytes, args.seed)
+    if args.outbox:
+        await outbox.open_outbox()
+    await deep_links.open_deep_link_index()
+    results = []
+    try:
+        for target_count in args.targets:
+            results.append((target_count, await run(target_count, args, factory)))
+    finally:
+        await deep_links.close_deep_link_index()
+        await outbox.close_outbox()
+        await persistent_config.flush_target_groups()
+        await group_config.flush_group_modes()
+        await file_id_cache.flush()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', default="10,1000,10000", help="Comma-separated target group counts (one run each)")
+    parser.add_argument('--messages', type=int, default=10, help="Source messages per run")
+    parser.add_argument('--rate', type=float, default=0, help="Source messages per second (0 = as fast as the ingest queue takes them)")
+    parser.add_argument('--fx-share', type=float, default=0.5, help="Share of the targets in FXTwitter mode (the rest is Full mode)")
+    parser.add_argument('--photo-share', type=float, default=0.4, help="Share of messages with a photo")
+    parser.add_argument('--video-share', type=float, default=0.2, help="Share of messages with a video")
+    parser.add_argument('--photo-bytes', type=int, default=150 * 1024)
+    parser.add_argument('--video-bytes', type=int, default=4 * 1024 * 1024)
+    parser.add_argument('--download-latency', type=float, default=0.2, help="Seconds per Telethon media download")
+    parser.add_argument('--latency', type=float, default=0.03, help="Seconds per Bot API request")
+    parser.add_argument('--jitter', type=float, default=0.3, help="Latency varies by up to this fraction")
+    parser.add_argument('--upload-latency', type=float, default=0.5, help="Seconds per request that uploads media")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests failing with NetworkError")
+    parser.add_argument('--retry-after-rate', type=float, default=0.0, help="Share of requests answered with RetryAfter")
+    parser.add_argument('--retry-after', type=int, default=1, help="RetryAfter seconds")
+    parser.add_argument('--migrate-rate', type=float, default=0.0, help="Share of requests whose chat migrates (ChatMigrated)")
+    parser.add_argument('--concurrency', type=int, default=50, help=f"Concurrent Bot API requests (MAX_CONCURRENT_TASKS, configured: {settings.MAX_CONCURRENT_TASKS})")
+    parser.add_argument('--no-outbox', dest='outbox', action='store_false', help="Do not journal sends in the outbox")
+    parser.add_argument('--telegram-limits', action='store_true', help="Keep the send scheduler's Telegram rate limits")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    args.targets = [int(t) for t in args.targets.split(',')]
+
+    logging_config.setup_logging()
+    print(f"{args.messages} message(s) per run, FX share {args.fx_share:.0%}, media {args.photo_share:.0%} photo / {args.video_share:.0%} video, "
+          f"Bot API {args.latency * 1000:.0f} ms (uploads {args.upload_latency * 1000:.0f} ms), "
+          f"errors {args.error_rate:g} / RetryAfter {args.retry_after_rate:g} / migrations {args.migrate_rate:g}, "
+          f"concurrency {args.concurrency}, {settings.INGEST_WORKERS} ingest worker(s), "
+          f"{'Telegram rate limits' if args.telegram_limits else 'no rate limits'}")
+    try:
+        results = asyncio.run(main_async(args))
+    finally:
+        logging_config.stop_logging()
+        shutil.rmtree(_STATE_DIR, ignore_errors=True)
+
+    for target_count, result in results:
+        counts = result['bot']
+        elapsed = result['elapsed']
+        print(f"\n{target_count} target(s): {result['processed']} message(s) in {elapsed:.2f}s "
+              f"({result['processed'] / elapsed:.2f} msg/s, {counts['delivered'] / elapsed:.0f} sends/s)")
+        print(f"  requests {counts['requests']}, delivered {counts['delivered']}, uploads {counts['uploads']}, downloads {result['downloads']}, "
+              f"errors {counts['errors']}, RetryAfter {counts['retry_after']}, migrated {counts['migrated']}, pipeline failures {result['failed']}")
+        print(f"  {'(ms)':<28}{'p50':>7}   {'p95':>7}   {'p99':>7}")
+        print(f"  {'message processing':<28}{_format_ms(result['processing'])}")
+        for mode, stats in result['delivery'].items():
+            if not stats['messages']:
+                continue
+            print(f"  {mode + ' first delivery':<28}{_format_ms(stats['first'])}")
+            print(f"  {mode + ' last delivery':<28}{_format_ms(stats['last'])}")
+
+
+if __name__ == '__main__':
+    main()
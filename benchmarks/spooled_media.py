@@ -0,0 +1,181 @@
+# benchmarks/spooled_media.py
+# -*- coding: utf-8 -*-
+"""
+Peak RSS of downloading and uploading large media with download_media_spooled() vs into memory.
+
+A fake Telethon client "downloads" --messages media of --size-mb each, concurrently, writing
+--chunk-kb chunks like Telethon does (into a BytesIO for file=bytes, into the file for a path).
+Each mode runs in a fresh subprocess so resource.getrusage() reports that mode's own peak:
+  baseline      - imports only (interpreter + app modules)
+  memory        - client.download_media(file=bytes) for every media (previous behaviour)
+  spooled       - download_media_spooled() with MEDIA_SPOOL_MAX_MEMORY_BYTES (or --max-memory-mb)
+  upload-path   - spooled download, then send_document() of the temp file as a Path (PTB reads it whole)
+  upload-stream - spooled download, then send_document() of SpooledMedia.open_upload() (streamed)
+
+Uploads go to the stand-in Bot API server (tests/bot_api_server.py) in its own process.
+
+    python benchmarks/spooled_media.py --size-mb 200 --messages 4 [--max-memory-mb 8] [--json]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+# Settings are read at import time: configure a throwaway environment before importing the app
+os.environ.update({
+    'API_ID': os.environ.get('API_ID', '1'),
+    'API_HASH': os.environ.get('API_HASH', 'benchmark'),
+    'PHONE_NUMBER': os.environ.get('PHONE_NUMBER', '+10000000000'),
+    'SOURCE_BOT_IDENTIFIER': os.environ.get('SOURCE_BOT_IDENTIFIER', '1'),
+    'BOT_TOKEN': os.environ.get('BOT_TOKEN', '123456:BENCHMARK'),
+    'TARGET_CHAT_IDS': '',
+    'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'CRITICAL'),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pathlib import Path # noqa: E402
+from telegram import Bot # noqa: E402
+from telegram.request import HTTPXRequest # noqa: E402
+from config import settings # noqa: E402
+from utils.helpers.media_utils import download_media_spooled # noqa: E402
+from tests.bot_api_server import start_mock_server # noqa: E402
+
+MODES = ('baseline', 'memory', 'spooled', 'upload-path', 'upload-stream')
+
+
+class FakeFile:
+    def __init__(self, size: int):
+        self.size = size
+        self.ext = '.mp4'
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, size: int):
+        self.id = message_id
+        self.file = FakeFile(size)
+
+
+class FakeClient:
+    """download_media() that produces message.file.size bytes chunk by chunk."""
+
+    def __init__(self, chunk_bytes: int):
+        self._chunk = os.urandom(chunk_bytes)
+
+    async def download_media(self, message, file=None):
+        remaining = message.file.size
+        if file is bytes:
+            out = io.BytesIO()
+        else:
+            out = open(file, 'wb')
+        try:
+            while remaining > 0:
+                chunk = self._chunk[:min(len(self._chunk), remaining)]
+                out.write(chunk)
+                remaining -= len(chunk)
+                await asyncio.sleep(0) # Other downloads progress in between, like network reads
+            if file is bytes:
+                return out.getvalue()
+            return file
+        finally:
+            out.close()
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+async def _run_mode(mode: str, size: int, messages: int, chunk_bytes: int, max_memory_bytes: int, temp_dir: str) -> int:
+    client = FakeClient(chunk_bytes)
+    fake_messages = [FakeMessage(i, size) for i in range(messages)]
+    if mode == 'baseline':
+        return 0
+    if mode == 'memory':
+        results = await asyncio.gather(*(client.download_media(m, file=bytes) for m in fake_messages))
+        total = sum(len(data) for data in results)
+        del results
+        return total
+    results = await asyncio.gather(*(download_media_spooled(client, m, max_memory_bytes, temp_dir) for m in fake_messages))
+    try:
+        if mode.startswith('upload'):
+            await _upload_all(results, stream=mode == 'upload-stream')
+        return sum(spooled.size for spooled in results)
+    finally:
+        for spooled in results:
+            spooled.close()
+
+
+async def _upload(bot: Bot, chat_id: int, spooled, stream: bool):
+    if not stream:
+        await bot.send_document(chat_id, spooled.data if spooled.in_memory else Path(spooled.path))
+        return
+    with spooled.open_upload() as media_input:
+        await bot.send_document(chat_id, media_input)
+
+
+async def _upload_all(results: list, stream: bool):
+    """Uploads every media concurrently (one connection each), like a carrier send per message."""
+    port, servers = start_mock_server(1, 0.0)
+    try:
+        request = HTTPXRequest(connection_pool_size=len(results), media_write_timeout=300)
+        async with Bot('123456:BENCHMARK', base_url=f'http://127.0.0.1:{port}/bot', request=request) as bot:
+            await asyncio.gather(*(_upload(bot, -1000 - i, spooled, stream) for i, spooled in enumerate(results)))
+    finally:
+        for server in servers:
+            server.terminate()
+
+
+def run_child(args) -> dict:
+    with tempfile.TemporaryDirectory(prefix='spool_bench_') as temp_dir:
+        total = asyncio.run(_run_mode(
+            args.mode, args.size_mb * 1024 * 1024, args.messages, args.chunk_kb * 1024,
+            args.max_memory_mb * 1024 * 1024, temp_dir,
+        ))
+    return {'mode': args.mode, 'bytes': total, 'peak_rss_mb': _peak_rss_mb()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=4, help="Media downloaded concurrently")
+    parser.add_argument('--chunk-kb', type=int, default=512)
+    parser.add_argument('--max-memory-mb', type=int, default=settings.MEDIA_SPOOL_MAX_MEMORY_BYTES // (1024 * 1024))
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS) # Child process
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_child(args)))
+        return
+
+    results = {}
+    for mode in MODES:
+        child_args = [
+            sys.executable, os.path.abspath(__file__), '--mode', mode,
+            '--size-mb', str(args.size_mb), '--messages', str(args.messages),
+            '--chunk-kb', str(args.chunk_kb), '--max-memory-mb', str(args.max_memory_mb),
+        ]
+        output = subprocess.run(child_args, check=True, capture_output=True, text=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    baseline = results['baseline']['peak_rss_mb']
+    print(f"{args.messages} x {args.size_mb} MB media, {args.chunk_kb} KB chunks, spool threshold {args.max_memory_mb} MB:")
+    print(f"  baseline peak RSS: {baseline:.0f} MB")
+    for mode in MODES[1:]:
+        result = results[mode]
+        action = 'uploaded' if mode.startswith('upload') else 'downloaded'
+        print(f"  {mode:<13} peak RSS {result['peak_rss_mb']:>7.0f} MB (+{result['peak_rss_mb'] - baseline:.0f} MB), "
+              f"{result['bytes'] / (1024 * 1024):.0f} MB {action}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+# benchmarks/tweet_header.py
+# -*- coding: utf-8 -*-
+"""
+parse_tweet_header() against the previous extract_action_and_username() + body/RT formatting.
+
+Parity: random source-bot-like texts (bold/spacing/case variants, RT prefixes, junk, whitespace
+usernames) go through both implementations; (action, username) and the formatted Full-mode body
+must be identical. Differences caused by the documented limits of the new parser are counted
+separately instead of failing:
+  multiple headers  - the first header wins (the old code preferred Retweet > Tweet > Quote > Reply)
+  scan window       - the header must start within HEADER_SCAN_LIMIT characters
+  bounded runs      - at most 8 whitespace / 2 asterisks around the action word, 64-char usernames
+
+Timing: a typical message, then adversarial texts (long runs of spaces, tabs, asterisks) on
+which the old unbounded patterns backtrack quadratically.
+
+    python benchmarks/tweet_header.py --cases 20000 --sizes 1000,4000,10000 [--seed 1]
+"""
+import argparse
+import html
+import os
+import random
+import re
+import sys
+import time
+
+# Settings are read at import time: configure a throwaway environment before importing the app
+os.environ.update({
+    'API_ID': os.environ.get('API_ID', '1'),
+    'API_HASH': os.environ.get('API_HASH', 'benchmark'),
+    'PHONE_NUMBER': os.environ.get('PHONE_NUMBER', '+10000000000'),
+    'SOURCE_BOT_IDENTIFIER': os.environ.get('SOURCE_BOT_IDENTIFIER', '1'),
+    'BOT_TOKEN': os.environ.get('BOT_TOKEN', '123456:BENCHMARK'),
+    'TARGET_CHAT_IDS': '',
+    'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'CRITICAL'),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.helpers.text_utils import parse_tweet_header, HEADER_SCAN_LIMIT # noqa: E402
+from handlers.message_processing.content_formatter import format_full_message_body_html # noqa: E402
+
+# --- Previous implementation (verbatim logic, logging removed) ---
+_LEGACY_PATTERNS = [
+    (r"\**\s*(Retweet)\s*\**\s+from\s+\*\*([^ *]+?)\*\*", "Retweet"),
+    (r"\**\s*(Tweet)\s*\**\s+from\s+\*\*([^ *]+?)\*\*", "Tweet"),
+    (r"\**\s*(Quote)\s*\**\s+from\s+\*\*([^ *]+?)\*\*", "Quote"),
+    (r"\**\s*(Reply)\s*\**\s+from\s+\*\*([^ *]+?)\*\*", "Reply"),
+]
+_LEGACY_FALLBACK = r"from\s+\*\*([^ *]+?)\*\*"
+
+
+def legacy_extract_action_and_username(text: str) -> tuple[str | None, str | None]:
+    if not text:
+        return None, None
+    for pattern, action_type in _LEGACY_PATTERNS:
+        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+        if match:
+            return action_type, match.group(2).strip()
+    match = re.search(_LEGACY_FALLBACK, text, re.IGNORECASE | re.MULTILINE)
+    if match:
+        return None, match.group(1).strip()
+    return None, None
+
+
+def legacy_format_full_message_body_html(original_text: str, action_type: str | None) -> str:
+    body_start_index = -1
+    if "\n\n" in original_text: body_start_index = original_text.find("\n\n") + 2
+    elif "\n" in original_text: body_start_index = original_text.find("\n") + 1
+    message_body_raw = original_text[body_start_index:].strip() if body_start_index != -1 else original_text
+    if action_type == "Retweet":
+        rt_match = re.match(r"^\**\s*RT\s*\**\s*(.*)", message_body_raw, re.IGNORECASE | re.DOTALL)
+        if rt_match:
+            return f"<b>RT</b> {html.escape(rt_match.group(1).strip())}"
+    return html.escape(message_body_raw)
+
+
+def legacy(text: str) -> tuple:
+    action_type, username = legacy_extract_action_and_username(text)
+    return action_type, username, legacy_format_full_message_body_html(text, action_type)
+
+
+def current(text: str) -> tuple:
+    header = parse_tweet_header(text)
+    return header.action_type, header.username, format_full_message_body_html(text, header.action_type, header)
+
+
+# --- Random source-bot-like texts ---
+_ACTIONS = ["Tweet", "Retweet", "Quote", "Reply", "tweet", "RETWEET", "Posted", ""]
+_USERNAMES = ["elonmusk", "a", "user_123", "Ünïcødé", "\t", "\n", "x.y-z", "名前"]
+_SPACES = ["", " ", "  ", "\t", "\n", " \n "]
+_BOLD = ["", "*", "**"]
+_FROM_GAPS = [" ", "  ", "\t", ""]
+_BODY_WORDS = ["hello", "world", "RT", "**RT**", "from", "**", "*", "<b>", "&amp;", "🚀", "$TOKEN", "https://x.com/a/status/1"]
+
+
+def _random_body(rng: random.Random) -> str:
+    words = [rng.choice(_BODY_WORDS) for _ in range(rng.randint(0, 12))]
+    text = " ".join(words)
+    if rng.random() < 0.3:
+        text = rng.choice(["RT ", "**RT** ", "** RT **", "rt:", "RT"]) + text
+    return text
+
+
+def random_text(rng: random.Random) -> str:
+    """One header line (sometimes mangled or missing), a separator, then a body."""
+    if rng.random() < 0.1:
+        return "".join(rng.choice(" *\n\tfromRTweet") for _ in range(rng.randint(0, 40)))
+    bold = rng.choice(_BOLD)
+    header = (
+        f"{rng.choice(_BOLD)}{rng.choice(_ACTIONS)}{bold}{rng.choice(_SPACES)}{rng.choice(['', ' ', '  '])}"
+        f"{rng.choice(['from', 'FROM', 'by'])}{rng.choice(_FROM_GAPS)}"
+        f"{rng.choice(['**', '*', ''])}{rng.choice(_USERNAMES)}{rng.choice(['**', '*', ''])}"
+    )
+    text = header + rng.choice(["\n\n", "\n", " ", ""]) + _random_body(rng)
+    # A few texts beyond the new parser's documented limits
+    roll = rng.random()
+    if roll < 0.02:
+        text += "\nQuote from **other**"
+    elif roll < 0.04:
+        text = "x" * (HEADER_SCAN_LIMIT + 1) + text
+    elif roll < 0.06:
+        text = text.replace(" from", " " * 9 + "from", 1)
+    return text
+
+
+def explain_difference(text: str) -> str | None:
+    """Which documented limit explains a parity difference (None: unexplained)."""
+    headers = list(re.finditer(_LEGACY_FALLBACK, text, re.IGNORECASE))
+    if len(headers) > 1:
+        return "multiple headers"
+    if headers and headers[0].end() > HEADER_SCAN_LIMIT:
+        return "scan window"
+    if re.search(r"\s{9,}|\*{3,}", text) or any(len(m.group(1)) > 64 for m in headers):
+        return "bounded runs"
+    return None
+
+
+def run_parity(cases: int, seed: int) -> bool:
+    rng = random.Random(seed)
+    explained: dict[str, int] = {}
+    unexplained = []
+    for _ in range(cases):
+        text = random_text(rng)
+        if legacy(text) == current(text):
+            continue
+        reason = explain_difference(text)
+        if reason is None:
+            unexplained.append(text)
+        else:
+            explained[reason] = explained.get(reason, 0) + 1
+    print(f"Parity over {cases} random texts (seed {seed}): {cases - len(unexplained) - sum(explained.values())} identical, "
+          f"documented differences {explained or 0}, unexplained {len(unexplained)}")
+    for text in unexplained[:10]:
+        print(f"  MISMATCH {text!r}\n    old {legacy(text)!r}\n    new {current(text)!r}")
+    return not unexplained
+
+
+def _time_call(func, text: str, repeat: int) -> float:
+    """Best of `repeat` runs, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def run_timing(sizes: list[int], repeat: int):
+    typical = "**Retweet** from **someone**\n\n**RT** " + "word " * 50
+    print(f"Typical message ({len(typical)} chars): old {_time_call(legacy, typical, 2000) * 1000:.1f} us, "
+          f"new {_time_call(current, typical, 2000) * 1000:.1f} us")
+    print(f"{'adversarial input':<28}{'chars':>8}{'old (ms)':>12}{'new (ms)':>12}")
+    for size in sizes:
+        inputs = {
+            "spaces": " " * size,
+            "tabs + action word": "\t" * size + "Tweet",
+            "asterisks": "*" * size,
+            "'from **' + long name": "from **" + "a" * size,
+        }
+        for name, text in inputs.items():
+            old_ms = _time_call(legacy, text, repeat)
+            new_ms = _time_call(current, text, repeat)
+            print(f"{name:<28}{len(text):>8}{old_ms:>12.2f}{new_ms:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--sizes', default="1000,4000,10000", help="Comma-separated adversarial input sizes")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per adversarial input (best is reported)")
+    args = parser.parse_args()
+
+    ok = run_parity(args.cases, args.seed)
+    run_timing([int(size) for size in args.sizes.split(",") if size], args.repeat)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,35 +1,162 @@
 # config/group_config.py
+import asyncio
 import logging
-from collections import defaultdict
+import os
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Tuple
+
+from config import settings, persistent_config
+from utils.helpers.file_utils import JsonWriteBehind, read_json
 
 logger = logging.getLogger(__name__)
 
-# In-memory storage for group settings. Key: chat_id (int), Value: mode (str: 'full' or 'fxtwitter')
-# defaultdict ensures that if a group hasn't been configured, it defaults to 'full'.
-_group_settings = defaultdict(lambda: 'full')
+GROUP_MODES_FILE = os.path.join(settings.PROJECT_ROOT, "group_modes.json")
 
 # Define modes
 MODE_FULL = 'full'
 MODE_FXTWITTER = 'fxtwitter'
 VALID_MODES = {MODE_FULL, MODE_FXTWITTER}
+DEFAULT_MODE = MODE_FULL
+
+# Groups whose mode differs from the default. Key: chat_id (int), Value: mode (str).
+# Plain dict: reading the mode of an unconfigured group never inserts anything.
+_group_settings: Dict[int, str] = {}
+_modes_version = 0 # Bumped on every mode change
+_loaded = False
+
+# Write-behind save of the modes file (mode changes never wait for the disk)
+_writer = JsonWriteBehind(
+    GROUP_MODES_FILE,
+    lambda: {'version': _modes_version, 'modes': {str(chat_id): mode for chat_id, mode in _group_settings.items()}},
+)
+
+
+@dataclass(frozen=True, slots=True)
+class ModePartitions:
+    """Target groups split by display mode. Immutable snapshot, replaced whenever modes or targets change."""
+    version: int
+    targets: FrozenSet[int] # The target group snapshot this was built from
+    fxtwitter: Tuple[int, ...]
+    full: Tuple[int, ...]
+
+
+_partitions = ModePartitions(version=0, targets=frozenset(), fxtwitter=(), full=())
+_partitions_modes_version = 0
+
+
+def _rebuild_partitions(target_groups: FrozenSet[int]) -> ModePartitions:
+    global _partitions, _partitions_modes_version
+    fxtwitter, full = [], []
+    for chat_id in sorted(target_groups):
+        (fxtwitter if _group_settings.get(chat_id, DEFAULT_MODE) == MODE_FXTWITTER else full).append(chat_id)
+    _partitions = ModePartitions(
+        version=_partitions.version + 1, targets=target_groups, fxtwitter=tuple(fxtwitter), full=tuple(full)
+    )
+    _partitions_modes_version = _modes_version
+    logger.debug(f"Rebuilt mode partitions v{_partitions.version}: FX {len(fxtwitter)}, Full {len(full)}.")
+    return _partitions
+
+
+def get_partitions(target_groups: FrozenSet[int] | None = None) -> ModePartitions:
+    """
+    Returns the per-mode partitions of target_groups (default: the current target group snapshot).
+    O(1) on the per-message path: the partitions are only rebuilt after a mode change or when the
+    (copy-on-write) target group snapshot was replaced by a membership change.
+    """
+    if target_groups is None:
+        target_groups = persistent_config.get_target_groups()
+    partitions = _partitions
+    if partitions.targets is target_groups and _partitions_modes_version == _modes_version:
+        return partitions
+    return _rebuild_partitions(target_groups)
+
+
+def _mode_changed():
+    global _modes_version
+    _modes_version += 1
+    _rebuild_partitions(persistent_config.get_target_groups())
+    _writer.schedule()
+
 
 def set_group_mode(chat_id: int, mode: str):
     """Sets the forwarding mode for a specific group."""
     if mode not in VALID_MODES:
         logger.error(f"Attempted to set invalid mode '{mode}' for chat_id {chat_id}")
         return False
-    _group_settings[chat_id] = mode
+    if mode == DEFAULT_MODE:
+        _group_settings.pop(chat_id, None)
+    else:
+        _group_settings[chat_id] = mode
+    _mode_changed()
     logger.info(f"Set mode for chat_id {chat_id} to '{mode}'")
     return True
 
 def get_group_mode(chat_id: int) -> str:
     """Gets the forwarding mode for a specific group, defaulting to 'full'."""
-    # defaultdict handles the default case automatically
-    mode = _group_settings[chat_id]
-    # logger.debug(f"Retrieved mode for chat_id {chat_id}: '{mode}'") # Optional: Can be noisy
+    return _group_settings.get(chat_id, DEFAULT_MODE)
+
+def migrate_group(old_chat_id: int, new_chat_id: int) -> str | None:
+    """Carries a group's mode over to its new (supergroup) chat id. Returns the mode, or None if it used the default."""
+    mode = _group_settings.pop(old_chat_id, None)
+    if mode is None:
+        return None
+    _group_settings[new_chat_id] = mode
+    _mode_changed()
     return mode
 
+def remove_group(chat_id: int) -> bool:
+    """Forgets the mode of a group that is no longer a target."""
+    if _group_settings.pop(chat_id, None) is None:
+        return False
+    _mode_changed()
+    return True
+
 def get_current_settings() -> dict:
     """Returns a copy of the current settings dictionary."""
     # Return a copy to prevent external modification
-    return dict(_group_settings)
\ No newline at end of file
+    return dict(_group_settings)
+
+
+# --- Persistence ---
+def _read_group_modes_file() -> dict:
+    """Reads the group modes JSON file (blocking, internal use)."""
+    try:
+        data = read_json(GROUP_MODES_FILE)
+        if data is None:
+            logger.info(f"{GROUP_MODES_FILE} not found. All groups use the default mode '{DEFAULT_MODE}'.")
+            return {}
+        if not isinstance(data, dict) or not isinstance(data.get('modes', {}), dict):
+            logger.error(f"Invalid format in {GROUP_MODES_FILE}. Expected an object. Starting fresh.")
+            return {}
+        return data
+    except Exception as e:
+        logger.error(f"Failed to load group modes from {GROUP_MODES_FILE}: {e}", exc_info=True)
+        return {}
+
+
+async def load_group_modes():
+    """Loads the saved display modes once (off the event loop)."""
+    global _loaded, _modes_version
+    if _loaded:
+        return
+    data = await asyncio.to_thread(_read_group_modes_file)
+    for chat_id, mode in data.get('modes', {}).items():
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring invalid chat id in {GROUP_MODES_FILE}: {chat_id}")
+            continue
+        if mode not in VALID_MODES:
+            logger.warning(f"Ignoring invalid mode '{mode}' for chat {chat_id} in {GROUP_MODES_FILE}.")
+            continue
+        if mode != DEFAULT_MODE and chat_id not in _group_settings: # Changes made while loading win
+            _group_settings[chat_id] = mode
+    _modes_version = max(_modes_version, int(data.get('version', 0))) + 1
+    _loaded = True
+    _rebuild_partitions(persistent_config.get_target_groups())
+    logger.info(f"Loaded display modes for {len(_group_settings)} group(s) (version {_modes_version}).")
+
+
+async def flush_group_modes():
+    """Waits for any pending write-behind save to finish (call on shutdown)."""
+    await _writer.flush()
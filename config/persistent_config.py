@@ -1,96 +1,120 @@
 # config/persistent_config.py
 import asyncio
-import json
 import logging
 import os
-from typing import List, Set
+from typing import FrozenSet, Iterable, List, Set
 
 from config import settings # To access PROJECT_ROOT
+from utils.helpers.file_utils import JsonWriteBehind, read_json
 
 logger = logging.getLogger(__name__)
 
 TARGET_GROUPS_FILE = os.path.join(settings.PROJECT_ROOT, "target_groups.json")
-# Use an asyncio Lock for safe concurrent file access
-_file_lock = asyncio.Lock()
 
-# Internal cache to avoid reading file *constantly* if reads are very frequent,
-# but prioritize reading from file for add/remove operations.
-# For this use case (reading once per incoming message), caching might be overkill,
-# but it's here as an example pattern. We'll primarily rely on direct file reads
-# in the message handler for simplicity and guaranteed freshness.
-# _cached_groups: Set[int] = set()
-# _cache_loaded = False
+# In-memory registry. The set is an immutable snapshot that is *replaced* (copy-on-write)
+# on every add/remove, so the per-message hot path can read it without any lock.
+_target_groups: FrozenSet[int] = frozenset()
+_loaded = False
 
-async def load_target_groups() -> List[int]:
-    """Loads the list of target group IDs from the JSON file."""
-    async with _file_lock:
-        try:
-            if os.path.exists(TARGET_GROUPS_FILE):
-                with open(TARGET_GROUPS_FILE, 'r', encoding='utf-8') as f:
-                    group_ids = json.load(f)
-                    if isinstance(group_ids, list):
-                        # Ensure all elements are integers
-                        valid_ids = {int(gid) for gid in group_ids if isinstance(gid, (int, str)) and str(gid).lstrip('-').isdigit()}
-                        logger.debug(f"Loaded {len(valid_ids)} target groups from {TARGET_GROUPS_FILE}")
-                        return list(valid_ids)
-                    else:
-                        logger.error(f"Invalid format in {TARGET_GROUPS_FILE}. Expected a list. Starting fresh.")
-                        return []
-            else:
-                logger.info(f"{TARGET_GROUPS_FILE} not found. Starting with an empty target group list.")
-                return []
-        except (json.JSONDecodeError, ValueError) as e:
-            logger.error(f"Error decoding JSON or converting IDs from {TARGET_GROUPS_FILE}: {e}. Starting fresh.")
-            # Optionally back up the corrupted file here
-            return []
-        except Exception as e:
-            logger.error(f"Failed to load target groups from {TARGET_GROUPS_FILE}: {e}", exc_info=True)
-            return [] # Return empty list on failure
-
-async def _save_target_groups(group_ids: Set[int]):
-    """Saves the set of target group IDs to the JSON file (internal use)."""
-    # Assumes lock is already held by caller (add/remove)
+# Write-behind: add/remove only mark the registry dirty; a single background task
+# writes the latest snapshot to disk.
+_writer = JsonWriteBehind(TARGET_GROUPS_FILE, lambda: sorted(_target_groups))
+
+
+def _read_target_groups_file() -> Set[int]:
+    """Reads target group IDs from the JSON file (blocking, internal use)."""
     try:
-        # Convert set to list for JSON compatibility
-        id_list = sorted(list(group_ids))
-        with open(TARGET_GROUPS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(id_list, f, indent=4)
-        logger.debug(f"Saved {len(id_list)} target groups to {TARGET_GROUPS_FILE}")
+        group_ids = read_json(TARGET_GROUPS_FILE)
+        if group_ids is None:
+            logger.info(f"{TARGET_GROUPS_FILE} not found. Starting with an empty target group list.")
+            return set()
+        if not isinstance(group_ids, list):
+            logger.error(f"Invalid format in {TARGET_GROUPS_FILE}. Expected a list. Starting fresh.")
+            return set()
+        # Ensure all elements are integers
+        valid_ids = {int(gid) for gid in group_ids if isinstance(gid, (int, str)) and str(gid).lstrip('-').isdigit()}
+        logger.debug(f"Loaded {len(valid_ids)} target groups from {TARGET_GROUPS_FILE}")
+        return valid_ids
+    except ValueError as e: # json.JSONDecodeError is a ValueError
+        logger.error(f"Error decoding JSON or converting IDs from {TARGET_GROUPS_FILE}: {e}. Starting fresh.")
+        # Optionally back up the corrupted file here
+        return set()
     except Exception as e:
-        logger.error(f"Failed to save target groups to {TARGET_GROUPS_FILE}: {e}", exc_info=True)
+        logger.error(f"Failed to load target groups from {TARGET_GROUPS_FILE}: {e}", exc_info=True)
+        return set()
+
+
+async def _ensure_loaded():
+    """Loads the registry from disk once (off the event loop)."""
+    global _target_groups, _loaded
+    if _loaded:
+        return
+    group_ids = await asyncio.to_thread(_read_target_groups_file)
+    if not _loaded: # Another coroutine may have finished loading while we were reading
+        _target_groups = frozenset(group_ids)
+        _loaded = True
+
+
+def get_target_groups() -> FrozenSet[int]:
+    """
+    Returns the current immutable snapshot of target group IDs.
+    Lock-free and does no I/O: safe to call on every incoming message.
+    """
+    return _target_groups
+
+
+async def load_target_groups() -> List[int]:
+    """Returns the list of target group IDs (reads the JSON file only on first call)."""
+    await _ensure_loaded()
+    return list(_target_groups)
+
+
+async def flush_target_groups():
+    """Waits for any pending write-behind save to finish (call on shutdown)."""
+    await _writer.flush()
+
+
+async def replace_target_groups(group_ids: Iterable[int]):
+    """Replaces the whole registry (e.g. when seeding from .env) and persists it."""
+    global _target_groups, _loaded
+    _target_groups = frozenset(int(gid) for gid in group_ids)
+    _loaded = True
+    _writer.schedule()
+    await flush_target_groups()
+
 
 async def add_target_group(group_id: int) -> bool:
     """Adds a group ID to the persistent list if not already present."""
+    global _target_groups
     if not isinstance(group_id, int):
         logger.error(f"Attempted to add non-integer group ID: {group_id}")
         return False
 
-    async with _file_lock:
-        current_groups_list = await load_target_groups() # Load fresh inside lock
-        current_groups_set = set(current_groups_list)
-        if group_id not in current_groups_set:
-            current_groups_set.add(group_id)
-            await _save_target_groups(current_groups_set)
-            logger.info(f"Added group {group_id} to persistent target list.")
-            return True
-        else:
-            logger.debug(f"Group {group_id} is already in the target list.")
-            return False
+    await _ensure_loaded()
+    if group_id in _target_groups:
+        logger.debug(f"Group {group_id} is already in the target list.")
+        return False
+
+    # Copy-on-write: readers holding the old snapshot are unaffected
+    _target_groups = _target_groups | {group_id}
+    _writer.schedule()
+    logger.info(f"Added group {group_id} to persistent target list.")
+    return True
+
 
 async def remove_target_group(group_id: int) -> bool:
     """Removes a group ID from the persistent list if present."""
+    global _target_groups
     if not isinstance(group_id, int):
         logger.error(f"Attempted to remove non-integer group ID: {group_id}")
         return False
 
-    async with _file_lock:
-        current_groups_list = await load_target_groups() # Load fresh inside lock
-        current_groups_set = set(current_groups_list)
-        if group_id in current_groups_set:
-            current_groups_set.remove(group_id)
-            await _save_target_groups(current_groups_set)
-            logger.info(f"Removed group {group_id} from persistent target list.")
-            return True
-        else:
-            logger.debug(f"Group {group_id} was not found in the target list for removal.")
-            return False
\ No newline at end of file
+    await _ensure_loaded()
+    if group_id not in _target_groups:
+        logger.debug(f"Group {group_id} was not found in the target list for removal.")
+        return False
+
+    _target_groups = _target_groups - {group_id}
+    _writer.schedule()
+    logger.info(f"Removed group {group_id} from persistent target list.")
+    return True
@@ -53,6 +53,13 @@ API_ID = get_env_var('API_ID', required=True, var_type=int)
 API_HASH = get_env_var('API_HASH', required=True)
 PHONE_NUMBER = get_env_var('PHONE_NUMBER', required=True)
 BOT_TOKEN = get_env_var('BOT_TOKEN', required=True)
+# Extra bots that share the fan-out (comma-separated tokens). Each target group is served by one bot that is a member of it.
+SHARD_BOT_TOKENS = [t.strip() for t in get_env_var('SHARD_BOT_TOKENS', required=False, default='').split(',') if t.strip()]
+# Self-hosted Bot API server (empty = api.telegram.org). PTB appends the token to these URLs.
+BOT_API_BASE_URL = get_env_var('BOT_API_BASE_URL', required=False, default='') # e.g. http://localhost:8081/bot
+BOT_API_BASE_FILE_URL = get_env_var('BOT_API_BASE_FILE_URL', required=False, default='') # e.g. http://localhost:8081/file/bot
+# Local mode: the server runs next to us and reads uploads straight from disk by path (limit 2000 MB instead of 50 MB)
+BOT_API_LOCAL_MODE = get_env_var('BOT_API_LOCAL_MODE', default='false', var_type=bool)
 
 # --- Bot Configuration (From .env) ---
 SOURCE_BOT_IDENTIFIER = get_env_var('SOURCE_BOT_IDENTIFIER', required=True, var_type=int)
@@ -65,6 +72,82 @@ SESSION_NAME = get_env_var('SESSION_NAME', default='my_telegram_user_session')
 BUTTON_TEXT_TO_FIND = get_env_var('BUTTON_TEXT_TO_FIND', default="View Tweet") # Essential for filtering
 MAX_CONCURRENT_TASKS = get_env_var('MAX_CONCURRENT_TASKS', default=5, var_type=int) # Used for batch sending
 LOG_LEVEL = get_env_var('LOG_LEVEL', default='INFO').upper()
+LOG_FORMAT = get_env_var('LOG_FORMAT', default='text').lower() # text | json (one JSON object per line)
+LOG_QUEUE_ENABLED = get_env_var('LOG_QUEUE_ENABLED', default='true', var_type=bool) # Format/write logs on a background thread
+# Successful sends get an INFO line only for every Nth one (0 = none, 1 = all); each message still logs a summary
+LOG_SEND_SUCCESS_SAMPLE_EVERY = get_env_var('LOG_SEND_SUCCESS_SAMPLE_EVERY', default=0, var_type=int)
+
+# --- Metrics (Prometheus text format on GET /metrics) ---
+METRICS_PORT = get_env_var('METRICS_PORT', default=0, var_type=int) # 0 = no endpoint (metrics are still recorded)
+METRICS_HOST = get_env_var('METRICS_HOST', default='127.0.0.1') # Local only by default
+
+# --- Delivery Latency Ledger (/latency) ---
+LATENCY_LEDGER_SIZE = get_env_var('LATENCY_LEDGER_SIZE', default=10000, var_type=int) # Most recent (message, mode) records kept
+# Telegram user IDs allowed to use admin commands such as /latency (comma-separated)
+ADMIN_USER_IDS = get_env_var('ADMIN_USER_IDS', required=False, var_type=list, default='')
+
+# --- Bot HTTP Transport ---
+HTTP_TEXT_POOL_SIZE = get_env_var('HTTP_TEXT_POOL_SIZE', default=MAX_CONCURRENT_TASKS + 4, var_type=int) # Connections for text/file_id sends + commands
+HTTP_MEDIA_POOL_SIZE = get_env_var('HTTP_MEDIA_POOL_SIZE', default=max(2, MAX_CONCURRENT_TASKS // 2), var_type=int) # Connections for file uploads
+HTTP_KEEPALIVE_SECONDS = get_env_var('HTTP_KEEPALIVE_SECONDS', default=120, var_type=float) # Keep idle connections warm
+HTTP_VERSION = get_env_var('HTTP_VERSION', default='1.1') # 1.1 | 2 (HTTP/2 needs python-telegram-bot[http2])
+HTTP_MEDIA_WRITE_TIMEOUT = get_env_var('HTTP_MEDIA_WRITE_TIMEOUT', default=60, var_type=float) # Seconds to push one upload
+
+# --- Media Download ---
+MEDIA_SPOOL_MAX_MEMORY_BYTES = get_env_var('MEDIA_SPOOL_MAX_MEMORY_BYTES', default=8 * 1024 * 1024, var_type=int) # Larger media is streamed to a temp file
+MEDIA_TEMP_DIR = get_env_var('MEDIA_TEMP_DIR', required=False, default='') # Empty = system temp dir
+FILE_ID_CACHE_MAX_ENTRIES = get_env_var('FILE_ID_CACHE_MAX_ENTRIES', default=5000, var_type=int) # Persistent media -> file_id LRU
+FILE_ID_CACHE_FLUSH_SECONDS = get_env_var('FILE_ID_CACHE_FLUSH_SECONDS', default=5, var_type=float) # Debounce for saving the cache file
+UPLOAD_ONCE_MAX_ATTEMPTS = get_env_var('UPLOAD_ONCE_MAX_ATTEMPTS', default=1, var_type=int) # Carrier uploads per message; 1 = no retry, the rest falls back to text
+LARGE_MEDIA_THRESHOLD_BYTES = get_env_var('LARGE_MEDIA_THRESHOLD_BYTES', default=(2000 if BOT_API_LOCAL_MODE else 50) * 1024 * 1024, var_type=int) # Bot API upload limit
+# Channel/supergroup (bot + user account are members) where the user client stages media above the threshold. 0 = disabled
+STAGING_CHAT_ID = get_env_var('STAGING_CHAT_ID', required=False, default=0, var_type=int)
+
+# --- Send Scheduler (Telegram rate limits) ---
+SEND_GLOBAL_RATE = get_env_var('SEND_GLOBAL_RATE', default=30, var_type=float) # Messages/second per bot
+SEND_GLOBAL_BURST = get_env_var('SEND_GLOBAL_BURST', default=10, var_type=float)
+SEND_GROUP_RATE_PER_MIN = get_env_var('SEND_GROUP_RATE_PER_MIN', default=20, var_type=float) # Messages/minute per group
+SEND_GROUP_BURST = get_env_var('SEND_GROUP_BURST', default=3, var_type=float)
+SEND_MAX_FLOOD_RETRIES = get_env_var('SEND_MAX_FLOOD_RETRIES', default=3, var_type=int) # RetryAfter retries per send
+
+# --- Duplicate Tweet Suppression ---
+DEDUPE_ENABLED = get_env_var('DEDUPE_ENABLED', default='true', var_type=bool)
+DEDUPE_WINDOW_SECONDS = get_env_var('DEDUPE_WINDOW_SECONDS', default=900, var_type=int) # How long a status ID is remembered
+DEDUPE_MAX_ENTRIES = get_env_var('DEDUPE_MAX_ENTRIES', default=10000, var_type=int)
+# Per action type: suppress | allow. 'default' applies to unlisted/unknown actions.
+DEDUPE_POLICY = get_env_var('DEDUPE_POLICY', default='default:suppress')
+
+# --- Deep Link Context Cache (content resent by /start deploy_<id>) ---
+CONTEXT_CACHE_TTL_SECONDS = get_env_var('CONTEXT_CACHE_TTL_SECONDS', default=600, var_type=float)
+CONTEXT_CACHE_MAX_ENTRIES = get_env_var('CONTEXT_CACHE_MAX_ENTRIES', default=50000, var_type=int) # LRU eviction above this
+CONTEXT_CACHE_MAX_BYTES = get_env_var('CONTEXT_CACHE_MAX_BYTES', default=64 * 1024 * 1024, var_type=int) # Estimated size of the cached texts
+# Signed deploy deep links: the link carries the source message ID + HMAC, the content is in a SQLite index
+DEEP_LINK_SECRET = get_env_var('DEEP_LINK_SECRET', required=False, default='') # Empty = random key generated once and kept in the index
+DEEP_LINK_INDEX_FILE = get_env_var('DEEP_LINK_INDEX_FILE', required=False, default='') or os.path.join(PROJECT_ROOT, 'deep_links.sqlite3')
+DEEP_LINK_RETENTION_DAYS = get_env_var('DEEP_LINK_RETENTION_DAYS', default=30, var_type=float) # Links to older messages stop working
+
+# --- Ingest Queue (Telethon handler -> pipeline workers) ---
+INGEST_QUEUE_SIZE = get_env_var('INGEST_QUEUE_SIZE', default=100, var_type=int) # Max messages waiting for a worker
+INGEST_WORKERS = get_env_var('INGEST_WORKERS', default=2, var_type=int) # Messages processed concurrently
+INGEST_OVERFLOW_POLICY = get_env_var('INGEST_OVERFLOW_POLICY', default='block').lower() # block | drop_oldest | downgrade
+INGEST_MAX_WAITING = get_env_var('INGEST_MAX_WAITING', default=INGEST_QUEUE_SIZE, var_type=int) # block/downgrade: messages waiting for a full queue before newer ones are dropped
+ALBUM_WINDOW_SECONDS = get_env_var('ALBUM_WINDOW_SECONDS', default=1.5, var_type=float) # Wait for more parts of an album (grouped_id); 0 = no aggregation
+IDENTITY_REFRESH_SECONDS = get_env_var('IDENTITY_REFRESH_SECONDS', default=3600, var_type=int) # Background refresh of bot/source identities
+
+# --- Egress Workers (multi-process sending) ---
+EGRESS_WORKERS = get_env_var('EGRESS_WORKERS', default=0, var_type=int) # Worker processes that deliver sends; 0 = send from the main process
+EGRESS_QUEUE_SIZE = get_env_var('EGRESS_QUEUE_SIZE', default=1000, var_type=int) # Jobs waiting per worker before publishing blocks
+EGRESS_RING_VNODES = get_env_var('EGRESS_RING_VNODES', default=64, var_type=int) # Virtual nodes per worker on the consistent-hash ring
+EGRESS_INGEST_RATE_SHARE = get_env_var('EGRESS_INGEST_RATE_SHARE', default=0.1, var_type=float) # Part of each bot's global send rate kept by the main process (carrier uploads); the workers split the rest
+
+# --- Send Outbox (SQLite write-ahead journal of sends) ---
+OUTBOX_ENABLED = get_env_var('OUTBOX_ENABLED', default='true', var_type=bool)
+OUTBOX_FILE = get_env_var('OUTBOX_FILE', required=False, default='') or os.path.join(PROJECT_ROOT, 'outbox.sqlite3')
+OUTBOX_COMMIT_INTERVAL_MS = get_env_var('OUTBOX_COMMIT_INTERVAL_MS', default=5, var_type=float) # Group commit window: max delay added before a message's sends start
+OUTBOX_BATCH_SIZE = get_env_var('OUTBOX_BATCH_SIZE', default=500, var_type=int) # Commit early once this many records/completions are queued
+OUTBOX_SYNCHRONOUS = get_env_var('OUTBOX_SYNCHRONOUS', default='NORMAL').upper() # NORMAL = survives process crashes | FULL = also power loss
+OUTBOX_SEND_BUDGET_MS = get_env_var('OUTBOX_SEND_BUDGET_MS', default=1.0, var_type=float) # Commit time per journaled send above this is logged
+OUTBOX_RESUME_MAX_AGE_SECONDS = get_env_var('OUTBOX_RESUME_MAX_AGE_SECONDS', default=3600, var_type=int) # Older unfinished sends are dropped on startup
 
 # --- Telethon Internal (Keep if they help stability) ---
 TELETHON_SYSTEM_VERSION = "4.16.30-vxCUSTOM"
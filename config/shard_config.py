@@ -0,0 +1,169 @@
+# config/shard_config.py
+import asyncio
+import logging
+import os
+from typing import Dict, FrozenSet, Iterable
+
+from config import settings # To access PROJECT_ROOT
+from utils.helpers.file_utils import JsonWriteBehind, read_json
+
+logger = logging.getLogger(__name__)
+
+SHARD_MAP_FILE = os.path.join(settings.PROJECT_ROOT, "shard_map.json")
+
+# Sticky shard map: which bot (by bot id) delivers to which target chat, and which of our
+# bots are members of each chat. Copy-on-write like persistent_config: the per-message
+# path reads the current dicts without locks, updates replace them.
+_assignments: Dict[int, int] = {}
+_members: Dict[int, FrozenSet[int]] = {}
+_primary_bot_id: int | None = None # Serves every chat without a shard assignment
+_loaded = False
+
+
+def _snapshot() -> dict:
+    return {
+        str(chat_id): {'bot': _assignments.get(chat_id), 'members': sorted(_members.get(chat_id, ()))}
+        for chat_id in set(_assignments) | set(_members)
+    }
+
+
+_writer = JsonWriteBehind(SHARD_MAP_FILE, _snapshot)
+
+
+def _read_shard_map_file() -> dict:
+    """Reads the shard map JSON file (blocking, internal use)."""
+    try:
+        data = read_json(SHARD_MAP_FILE)
+        if data is None:
+            logger.info(f"{SHARD_MAP_FILE} not found. Starting with an empty shard map.")
+            return {}
+        if not isinstance(data, dict):
+            logger.error(f"Invalid format in {SHARD_MAP_FILE}. Expected an object. Starting fresh.")
+            return {}
+        return data
+    except Exception as e:
+        logger.error(f"Failed to load shard map from {SHARD_MAP_FILE}: {e}", exc_info=True)
+        return {}
+
+
+async def load_shard_map(primary_bot_id: int | None = None, target_chat_ids: Iterable[int] = ()):
+    """
+    Loads the shard map from disk once (off the event loop). The primary bot is recorded as a
+    member of every existing target: those chats were joined before any membership was tracked.
+    """
+    global _assignments, _members, _primary_bot_id, _loaded
+    if _loaded:
+        return
+    _primary_bot_id = primary_bot_id
+    data = await asyncio.to_thread(_read_shard_map_file)
+    assignments, members = {}, {}
+    for chat_id, entry in data.items():
+        try:
+            chat_id = int(chat_id)
+            if entry.get('bot'):
+                assignments[chat_id] = int(entry['bot'])
+            members[chat_id] = frozenset(int(b) for b in entry.get('members', []))
+        except (AttributeError, TypeError, ValueError):
+            logger.warning(f"Ignoring invalid shard map entry for chat {chat_id}: {entry}")
+    changed = False
+    if primary_bot_id is not None:
+        for chat_id in target_chat_ids:
+            if primary_bot_id not in members.get(chat_id, ()):
+                members[chat_id] = members.get(chat_id, frozenset()) | {primary_bot_id}
+                changed = True
+    _assignments, _members, _loaded = assignments, members, True
+    if changed:
+        _writer.schedule()
+    logger.info(f"Loaded shard map: {len(_assignments)} assigned chat(s).")
+
+
+def get_assigned_bot(chat_id: int) -> int | None:
+    """Bot id that delivers to chat_id (None = not assigned, use the primary bot). No I/O."""
+    return _assignments.get(chat_id)
+
+
+def get_member_bots(chat_id: int) -> FrozenSet[int]:
+    return _members.get(chat_id, frozenset())
+
+
+def get_shard_counts() -> Dict[int, int]:
+    """Number of assigned chats per bot id."""
+    counts: Dict[int, int] = {}
+    for bot_id in _assignments.values():
+        counts[bot_id] = counts.get(bot_id, 0) + 1
+    return counts
+
+
+def _least_loaded(bot_ids) -> int | None:
+    counts = get_shard_counts()
+    return min(bot_ids, key=lambda b: (counts.get(b, 0), b), default=None)
+
+
+def add_member(chat_id: int, bot_id: int) -> int:
+    """Records that bot_id is in chat_id. Returns the bot assigned to the chat (existing assignments are sticky)."""
+    global _assignments, _members
+    members = get_member_bots(chat_id) | {bot_id}
+    _members = {**_members, chat_id: members}
+    assigned = _assignments.get(chat_id)
+    if assigned is None or assigned not in members:
+        assigned = bot_id
+        _assignments = {**_assignments, chat_id: bot_id}
+        logger.info(f"Chat {chat_id} assigned to bot {bot_id}.")
+    _writer.schedule()
+    return assigned
+
+
+def remove_member(chat_id: int, bot_id: int) -> int | None:
+    """
+    Records that bot_id left chat_id. If it was the assigned bot, the chat moves to the least
+    loaded remaining member. With no recorded member left, the chat goes back to the primary bot
+    (its membership may predate the shard map). Returns the bot now assigned, or None once the
+    primary bot itself has left and none of our bots is left.
+    """
+    global _assignments, _members
+    members = get_member_bots(chat_id) - {bot_id}
+    if not members and _primary_bot_id is not None and bot_id != _primary_bot_id:
+        members = frozenset({_primary_bot_id}) # A send failing later reports the primary bot as gone too
+    _members = {**_members, chat_id: members} if members else {k: v for k, v in _members.items() if k != chat_id}
+    assigned = _assignments.get(chat_id)
+    if assigned is None:
+        assigned = _primary_bot_id if bot_id != _primary_bot_id else None
+    if assigned is None or assigned == bot_id:
+        assigned = _least_loaded(members)
+        if assigned is None:
+            _assignments = {k: v for k, v in _assignments.items() if k != chat_id}
+        else:
+            _assignments = {**_assignments, chat_id: assigned}
+            logger.info(f"Chat {chat_id} reassigned from bot {bot_id} to bot {assigned}.")
+    _writer.schedule()
+    return assigned
+
+
+def migrate_chat(old_chat_id: int, new_chat_id: int):
+    """Carries the shard entry over when a group is upgraded to a supergroup."""
+    global _assignments, _members
+    if old_chat_id not in _assignments and old_chat_id not in _members:
+        return
+    assignments = {k: v for k, v in _assignments.items() if k != old_chat_id}
+    members = {k: v for k, v in _members.items() if k != old_chat_id}
+    if old_chat_id in _assignments:
+        assignments[new_chat_id] = _assignments[old_chat_id]
+    if old_chat_id in _members:
+        members[new_chat_id] = _members[old_chat_id]
+    _assignments, _members = assignments, members
+    _writer.schedule()
+
+
+def forget_chat(chat_id: int):
+    """Drops every shard entry for a chat that is no longer a target."""
+    global _assignments, _members
+    if chat_id not in _assignments and chat_id not in _members:
+        return
+    _assignments = {k: v for k, v in _assignments.items() if k != chat_id}
+    _members = {k: v for k, v in _members.items() if k != chat_id}
+    _writer.schedule()
+
+
+async def flush_shard_map():
+    """Waits for any pending write-behind save to finish (call on shutdown)."""
+    await _writer.flush()
@@ -0,0 +1,122 @@
+# handlers/album_aggregator.py
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Telegram media groups hold 2-10 items
+MAX_ALBUM_PARTS = 10
+
+
+@dataclass(slots=True)
+class Album:
+    """All parts of one source album (messages sharing a grouped_id), in message order once complete."""
+    grouped_id: int
+    messages: list = field(default_factory=list) # telethon.tl.custom.Message
+    complete: asyncio.Event = field(default_factory=asyncio.Event) # Set when no more parts are collected
+
+    @property
+    def id(self) -> int:
+        """Id of the first part (used in logs like a message id)."""
+        return self.messages[0].id
+
+    async def wait_complete(self):
+        await self.complete.wait()
+
+
+class AlbumAggregator:
+    """
+    Buffers NewMessage events that share a grouped_id. The album is handed to enqueue_func
+    when its first part arrives, so it keeps that part's place in source order; it is marked
+    complete once no new part arrived for window_seconds (or the album is full).
+    """
+
+    def __init__(self, enqueue_func: Callable[[Album], Awaitable[bool | None]], window_seconds: float):
+        self._enqueue_func = enqueue_func
+        self._window = window_seconds
+        self._pending: dict[int, Album] = {}
+        self._deadlines: dict[int, float] = {}
+        self._timers: dict[int, asyncio.Task] = {}
+        self._enqueues: set[asyncio.Task] = set() # Hand-overs still waiting for the ingest queue
+
+        # Counters
+        self.albums_total = 0
+        self.parts_total = 0
+
+    async def add(self, message) -> bool:
+        """Buffers message if it is an album part. Returns False for ordinary messages."""
+        grouped_id = getattr(message, 'grouped_id', None)
+        if not grouped_id or self._window <= 0:
+            return False
+
+        album = self._pending.get(grouped_id)
+        is_first = album is None
+        if is_first:
+            album = self._pending[grouped_id] = Album(grouped_id=grouped_id)
+            self._timers[grouped_id] = asyncio.create_task(self._complete_when_quiet(grouped_id))
+        album.messages.append(message)
+        self.parts_total += 1
+        # Every new part pushes completion back: parts of one album arrive in a quick burst
+        self._deadlines[grouped_id] = time.monotonic() + self._window
+
+        if len(album.messages) >= MAX_ALBUM_PARTS:
+            self._timers[grouped_id].cancel()
+            self._complete(grouped_id) # Full, no need to wait
+        if is_first:
+            await self._enqueue(album)
+        return True
+
+    async def _enqueue(self, album: Album):
+        # Own task: stop() waits for it, and a cancelled event handler does not lose the album
+        task = asyncio.create_task(self._enqueue_func(album))
+        self._enqueues.add(task)
+        task.add_done_callback(self._enqueues.discard)
+        try:
+            if await asyncio.shield(task) is False:
+                logger.warning(f"Album {album.grouped_id}: dropped by the ingest queue.")
+        except Exception as e:
+            logger.error(f"Album {album.grouped_id}: failed to hand over album: {e}", exc_info=True)
+
+    async def _complete_when_quiet(self, grouped_id: int):
+        while True:
+            delay = self._deadlines.get(grouped_id, 0.0) - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        self._complete(grouped_id)
+
+    def _complete(self, grouped_id: int):
+        album = self._pending.pop(grouped_id, None)
+        self._deadlines.pop(grouped_id, None)
+        self._timers.pop(grouped_id, None)
+        if album is None:
+            return
+        album.messages.sort(key=lambda m: m.id)
+        self.albums_total += 1
+        logger.debug(f"Album {grouped_id}: collected {len(album.messages)} part(s).")
+        album.complete.set()
+
+    async def stop(self):
+        """
+        Completes every album still being collected and waits for hand-overs in flight
+        (call before stopping the ingest queue).
+        """
+        timers = list(self._timers.values())
+        for timer in timers:
+            timer.cancel()
+        for grouped_id in list(self._pending):
+            self._complete(grouped_id)
+        await asyncio.gather(*timers, return_exceptions=True)
+        if self._enqueues:
+            await asyncio.gather(*self._enqueues, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            'pending_albums': len(self._pending),
+            'albums_total': self.albums_total,
+            'parts_total': self.parts_total,
+        }
@@ -4,13 +4,14 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ChatMemberStatus, ChatType
 
-from config import persistent_config # Import the new config module
+from config import persistent_config, shard_config, group_config # Import the new config module
 
 logger = logging.getLogger(__name__)
 
 async def handle_chat_member_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handles bot being added to or removed from a group."""
-    result = update.chat_member
+    """Handles one of our bots (main or shard) being added to or removed from a group."""
+    # MY_CHAT_MEMBER updates (the bot's own status) arrive in update.my_chat_member
+    result = update.my_chat_member
     if not result:
         logger.debug("ChatMember update received but result is None.")
         return
@@ -31,9 +32,10 @@ async def handle_chat_member_update(update: Update, context: ContextTypes.DEFAUL
 
     # Bot was added or promoted to admin
     if new_status in [ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR] and old_status not in [ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR]:
-        logger.info(f"Bot joined or was promoted in group {chat_id} ('{chat.title}'). Adding to target list.")
+        logger.info(f"Bot {context.bot.id} joined or was promoted in group {chat_id} ('{chat.title}'). Adding to target list.")
+        assigned_bot = shard_config.add_member(chat_id, context.bot.id) # Sticky: keeps an existing assignment
         added = await persistent_config.add_target_group(chat_id)
-        if added:
+        if added and assigned_bot == context.bot.id:
              # Optional: Send a welcome message
             try:
                 await context.bot.send_message(
@@ -47,5 +49,11 @@ async def handle_chat_member_update(update: Update, context: ContextTypes.DEFAUL
 
     # Bot was kicked, left, or demoted from admin (treat demotion as removal for forwarding)
     elif new_status in [ChatMemberStatus.LEFT, ChatMemberStatus.KICKED]:
+        remaining_bot = shard_config.remove_member(chat_id, context.bot.id)
+        if remaining_bot is not None:
+            logger.info(f"Bot {context.bot.id} left group {chat_id} ('{chat.title}'). Bot {remaining_bot} keeps serving it.")
+            return
         logger.info(f"Bot left or was kicked from group {chat_id} ('{chat.title}'). Removing from target list.")
-        await persistent_config.remove_target_group(chat_id)
\ No newline at end of file
+        await persistent_config.remove_target_group(chat_id)
+        shard_config.forget_chat(chat_id)
+        group_config.remove_group(chat_id)
\ No newline at end of file
@@ -0,0 +1,46 @@
+# handlers/command_handlers/admin/latency.py
+# -*- coding: utf-8 -*-
+import logging
+from telegram import Update
+from telegram.ext import CallbackContext
+from telegram.constants import ParseMode
+
+from config import settings
+from utils.latency_ledger import get_latency_ledger, MODE_FXTWITTER, MODE_FULL
+
+logger = logging.getLogger(__name__)
+
+REPORT_WINDOWS = (('5m', 300), ('1h', 3600), ('24h', 86400))
+_MODE_LABELS = {MODE_FXTWITTER: "FX", MODE_FULL: "Full"}
+
+
+def _format_seconds(values: tuple) -> str:
+    return " / ".join(f"{v:.1f}" for v in values)
+
+
+def format_latency_report() -> str:
+    """Per window and mode: p50 / p95 / p99 seconds from the source post to the first and last group delivery."""
+    ledger = get_latency_ledger()
+    lines = [f"Delivery latency after the source post (s, p50 / p95 / p99), {len(ledger)} recent record(s):"]
+    for window_name, window_seconds in REPORT_WINDOWS:
+        lines.append("")
+        lines.append(f"Last {window_name}:")
+        for mode, stats in ledger.summary(window_seconds).items():
+            label = _MODE_LABELS[mode]
+            if not stats['messages']:
+                lines.append(f"  {label:<4} no deliveries")
+                continue
+            lines.append(f"  {label:<4} {stats['messages']} msg(s)")
+            lines.append(f"    first: {_format_seconds(stats['first'])}")
+            lines.append(f"    last:  {_format_seconds(stats['last'])}")
+    return "\n".join(lines)
+
+
+async def handle_latency_command(update: Update, context: CallbackContext):
+    """Handles /latency: delivery latency percentiles per mode (admins only)."""
+    user = update.effective_user
+    if not user or user.id not in settings.ADMIN_USER_IDS:
+        logger.warning(f"User {user.id if user else None} is not in ADMIN_USER_IDS, denied access to /latency.")
+        return
+    logger.info(f"Handling /latency command from admin {user.id}")
+    await update.message.reply_text(f"<pre>{format_latency_report()}</pre>", parse_mode=ParseMode.HTML)
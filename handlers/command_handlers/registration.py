@@ -9,6 +9,7 @@ from telegram.ext import Application, CommandHandler, CallbackContext, Conversat
 from .start.default import handle_start_default
 from .start.deep_link import handle_start_deep_link
 from .display.group_display import get_group_display_conversation_handler
+from .admin.latency import handle_latency_command
 from ..bot_status_handlers import handle_chat_member_update
 
 logger = logging.getLogger(__name__)
@@ -33,6 +34,10 @@ def register_all_command_handlers(application: Application):
     application.add_handler(group_display_handler)
     logger.info("Registered /display conversation handler.")
 
+    # --- /latency Command (ADMIN_USER_IDS only) ---
+    application.add_handler(CommandHandler("latency", handle_latency_command))
+    logger.info("Registered /latency admin command.")
+
     # ---> FIX: Change ChatMemberUpdatedHandler to ChatMemberHandler <---
     # React specifically to the bot's own status changes in chats
     application.add_handler(ChatMemberHandler(handle_chat_member_update, ChatMemberHandler.MY_CHAT_MEMBER))
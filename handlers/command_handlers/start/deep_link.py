@@ -6,7 +6,7 @@ from telegram.ext import CallbackContext, ConversationHandler
 from telegram.constants import ParseMode
 
 # Assuming utils are in the parent directory structure
-from utils import context_cache
+from utils import context_cache, deep_links
 
 logger = logging.getLogger(__name__)
 
@@ -21,13 +21,16 @@ async def handle_start_deep_link(update: Update, context: CallbackContext) -> in
 
     logger.info(f"Handling deep link /start command from user {user.id} in chat {chat_id}. Payload: {payload}")
 
-    if payload.startswith("deploy_"):
-        context_id = payload.split('_', 1)[1]
-        logger.info(f"Deep link 'deploy' with context_id '{context_id}' detected.")
-
-        # --->>> SỬ DỤNG HÀM RESEND TỪ CONTEXT_CACHE <<<---
-        resent_ok = await context_cache.resend_cached_message(chat_id, context_id, context.bot)
-        # -------------------------------------------------
+    if deep_links.is_signed_payload(payload) or payload.startswith("deploy_"):
+        if payload.startswith("deploy_"):
+            # Legacy link: context only exists in the in-memory cache
+            context_id = payload.split('_', 1)[1]
+            logger.info(f"Deep link 'deploy' with context_id '{context_id}' detected.")
+            resent_ok = await context_cache.resend_cached_message(chat_id, context_id, context.bot)
+        else:
+            context_id = payload
+            logger.info(f"Signed deploy deep link '{context_id}' detected.")
+            resent_ok = await deep_links.resend_linked_message(chat_id, payload, context.bot)
 
         if resent_ok:
             await update.message.reply_text(
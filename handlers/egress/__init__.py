@@ -0,0 +1,8 @@
+from .publisher import EgressPool, start_egress_pool, get_egress_pool, stop_egress_pool
+
+__all__ = [
+    "EgressPool",
+    "start_egress_pool",
+    "get_egress_pool",
+    "stop_egress_pool",
+]
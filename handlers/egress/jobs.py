@@ -0,0 +1,120 @@
+# handlers/egress/jobs.py
+# -*- coding: utf-8 -*-
+"""
+Send jobs: published by the ingest process to the egress workers and journaled in the send
+outbox for resuming after a restart. Jobs are plain dicts
+(cheap to pickle, no PTB objects): the payload carries the markup as to_dict() and media only
+as Bot API references (file_id or staged message), never as bytes.
+"""
+import asyncio
+import time
+
+from telegram import Bot, InlineKeyboardMarkup
+
+from utils.outbox import release_entries
+from utils.latency_ledger import DeliveryRecord, MODE_FXTWITTER, MODE_FULL
+
+from handlers.message_processing import sender
+from handlers.message_processing.content_formatter import ContentPayload
+from handlers.message_processing.media_handler import MediaResult, AlbumMediaResult
+from handlers.message_processing.delivery_lanes import LaneBatch
+
+JOB_FXTWITTER = 'fx'
+JOB_FULL = 'full'
+JOB_ALBUM = 'album'
+
+# Worker -> ingest process events (chat events come from sender.set_chat_event_sink)
+EVENT_JOB_DONE = 'job_done'
+
+
+def payload_to_dict(payload: ContentPayload) -> dict:
+    return {
+        'text': payload.text,
+        'caption': payload.caption,
+        'parse_mode': payload.parse_mode,
+        'reply_markup': payload.reply_markup.to_dict() if payload.reply_markup else None,
+    }
+
+
+def payload_from_dict(data: dict) -> ContentPayload:
+    markup = data.get('reply_markup')
+    return ContentPayload(
+        text=data.get('text'),
+        caption=data.get('caption'),
+        reply_markup=InlineKeyboardMarkup.de_json(markup, None) if markup else None,
+        parse_mode=data.get('parse_mode'),
+    )
+
+
+def media_to_dict(media_result: MediaResult) -> dict | None:
+    """Bot API reference of the media (None = nothing a worker can send, i.e. text only)."""
+    if media_result.staged_message_id:
+        return {
+            'media_type': media_result.media_type,
+            'staged_chat_id': media_result.staged_chat_id,
+            'staged_message_id': media_result.staged_message_id,
+        }
+    if media_result.media_type and media_result.file_id:
+        return {'media_type': media_result.media_type, 'file_id': media_result.file_id}
+    return None
+
+
+def media_from_dict(data: dict | None) -> MediaResult:
+    if not data:
+        return MediaResult(media_type=None)
+    return MediaResult(
+        media_type=data.get('media_type'),
+        file_id=data.get('file_id'),
+        staged_chat_id=data.get('staged_chat_id'),
+        staged_message_id=data.get('staged_message_id'),
+    )
+
+
+def album_to_list(album_media: AlbumMediaResult) -> list[dict]:
+    return [{'media_type': part.media_type, 'file_id': part.file_id} for part in album_media.parts]
+
+
+def album_from_list(parts: list[dict]) -> AlbumMediaResult:
+    return AlbumMediaResult(parts=[MediaResult(media_type=p['media_type'], file_id=p['file_id']) for p in parts])
+
+
+def build_job(kind: str, bot_id: int | None, message_id: int, log_prefix: str, payload: ContentPayload, media=None) -> dict:
+    """Job without targets: the pool fills in each worker's share of the target chats."""
+    return {
+        'kind': kind,
+        'bot_id': bot_id,
+        'message_id': message_id,
+        'log_prefix': log_prefix,
+        'payload': payload_to_dict(payload),
+        'media': media,
+        'targets': [],
+        'outbox_entries': None, # {chat_id: outbox entry id} of the targets, if journaled
+        'published_at': time.time(),
+    }
+
+
+def media_for_job(media_result: MediaResult | AlbumMediaResult):
+    return album_to_list(media_result) if isinstance(media_result, AlbumMediaResult) else media_to_dict(media_result)
+
+
+def latency_mode(kind: str) -> str:
+    """Latency ledger mode of a job kind (albums are Full mode deliveries)."""
+    return MODE_FXTWITTER if kind == JOB_FXTWITTER else MODE_FULL
+
+
+def launch_job(
+    bot: Bot, job: dict, semaphore: asyncio.Semaphore, lane_batch: LaneBatch | None = None, delivery: DeliveryRecord | None = None
+) -> list[asyncio.Task]:
+    """Creates the send tasks of a job for job['targets'] (the same launch_*_sends as the in-process pipeline)."""
+    kind = job['kind']
+    payload = payload_from_dict(job['payload'])
+    outbox_entries = job.get('outbox_entries')
+    args = (job['targets'], semaphore, job['log_prefix'], lane_batch, outbox_entries, delivery)
+    if kind == JOB_FXTWITTER:
+        tasks = sender.launch_fxtwitter_sends(bot, payload, *args)
+    elif kind == JOB_ALBUM:
+        tasks = sender.launch_album_sends(bot, payload, album_from_list(job['media']), *args)
+    else:
+        tasks = sender.launch_full_mode_sends(bot, payload, media_from_dict(job['media']), *args)
+    release_entries(outbox_entries) # Targets that got no send task
+    return tasks
@@ -0,0 +1,321 @@
+# handlers/egress/publisher.py
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import multiprocessing
+import queue
+import threading
+
+from telegram import Bot
+
+from config import settings
+from utils.hash_ring import ConsistentHashRing
+from utils.latency_ledger import DeliveryRecord, get_latency_ledger
+from handlers.message_processing import sender, send_scheduler
+from handlers.message_processing.content_formatter import ContentPayload
+from handlers.message_processing.media_handler import MediaResult, AlbumMediaResult
+from handlers.message_processing.delivery_lanes import LaneBatch
+from . import jobs, worker
+
+logger = logging.getLogger(__name__)
+
+_PUBLISH_PUT_TIMEOUT = 1.0 # Seconds between liveness checks while a worker queue is full
+
+
+def _needs_upload(media_result) -> bool:
+    """
+    True while the media only exists as downloaded bytes (which cannot be handed to another process),
+    or its file_id comes from the cache and no delivery has confirmed Telegram still accepts it.
+    """
+    if isinstance(media_result, AlbumMediaResult):
+        return any((part.spooled is not None and not part.file_id) or part.refetch is not None for part in media_result.parts)
+    return (media_result.spooled is not None and not media_result.file_id) or media_result.refetch is not None
+
+
+class EgressPool:
+    """
+    Ingest-side handle of the egress worker processes. Target chats are spread over the workers
+    with a consistent-hash ring, so every chat is always delivered by the same worker (its lane
+    and rate buckets live there). Workers report results, migrations and removals back.
+    """
+
+    def __init__(self, num_workers: int, tokens: list[str], queue_size: int = 1000, vnodes: int = 64):
+        self._num_workers = max(1, num_workers)
+        self._tokens = list(tokens)
+        self._queue_size = queue_size
+        self._ring = ConsistentHashRing(vnodes=vnodes)
+        self._processes: dict[int, multiprocessing.Process] = {}
+        self._job_queues: dict[int, multiprocessing.Queue] = {}
+        self._event_queue = None
+        self._event_thread: threading.Thread | None = None
+        self._event_tasks: set[asyncio.Task] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+        # Counters
+        self.jobs_published_total = 0
+        self.targets_published_total = 0
+        self.targets_succeeded_total = 0
+        self.targets_failed_total = 0
+        self.carrier_sends_total = 0 # Deliveries made in-process to obtain a file_id
+        self.publish_waits_total = 0 # Publishes that found a worker queue full
+        self.latency_seconds_total = 0.0
+        self.latency_seconds_max = 0.0
+        self.jobs_done_total = 0
+
+    @property
+    def num_workers(self) -> int:
+        return len(self._ring.nodes)
+
+    def start(self):
+        """Spawns the worker processes (spawn context: no forked event loop or sockets)."""
+        self._loop = asyncio.get_running_loop()
+        ctx = multiprocessing.get_context('spawn')
+        self._event_queue = ctx.Queue()
+        for index in range(self._num_workers):
+            job_queue = ctx.Queue(maxsize=self._queue_size)
+            process = ctx.Process(
+                target=worker.run_worker,
+                args=(index, self._num_workers, self._tokens, job_queue, self._event_queue),
+                name=f"egress-{index}",
+                daemon=True,
+            )
+            process.start()
+            self._job_queues[index] = job_queue
+            self._processes[index] = process
+            self._ring.add_node(index)
+        self._event_thread = threading.Thread(target=self._read_events, name="egress-events", daemon=True)
+        self._event_thread.start()
+        logger.info(f"Started {self._num_workers} egress worker process(es).")
+
+    def _live_worker(self, index: int) -> bool:
+        process = self._processes.get(index)
+        if process is not None and process.is_alive():
+            return True
+        if index in self._ring.nodes:
+            # Its chats move to the neighbouring ring segments; every other chat keeps its worker
+            logger.error(f"Egress worker {index} is not running (exit code {process.exitcode if process else None}). Removing it from the ring.")
+            self._ring.remove_node(index)
+        return False
+
+    async def publish(
+        self,
+        job: dict,
+        targets: list[int],
+        outbox_entries: dict[int, int] | None = None,
+        lane_batch: LaneBatch | None = None
+    ) -> list[int]:
+        """
+        Hands job to the workers owning targets. Returns the targets that could not be handed
+        over (no live worker); the caller delivers those in-process.
+        With lane_batch, each chat is published only after every earlier source message has
+        published or delivered it, so a worker receives a chat's jobs in source order.
+        """
+        if lane_batch is not None:
+            await lane_batch.wait_turn(targets)
+            unassigned = await self._publish(job, targets, outbox_entries)
+            lane_batch.release(set(targets).difference(unassigned))
+            return unassigned
+        return await self._publish(job, targets, outbox_entries)
+
+    async def _publish(self, job: dict, targets: list[int], outbox_entries: dict[int, int] | None) -> list[int]:
+        for _ in range(self._num_workers):
+            unassigned = []
+            for index, worker_targets in self._ring.partition(targets).items():
+                if index is None or not self._live_worker(index):
+                    unassigned.extend(worker_targets)
+                    continue
+                sub_job = {**job, 'targets': worker_targets}
+                if outbox_entries:
+                    # The worker now owns these entries
+                    sub_job['outbox_entries'] = {c: outbox_entries.pop(c) for c in worker_targets if c in outbox_entries}
+                if not await self._put(index, sub_job):
+                    # The worker died while its queue was full: its chats move on the updated ring
+                    if outbox_entries is not None:
+                        outbox_entries.update(sub_job.get('outbox_entries') or {})
+                    unassigned.extend(worker_targets)
+                    continue
+                self.jobs_published_total += 1
+                self.targets_published_total += len(worker_targets)
+            if not unassigned or not self._ring.nodes:
+                return unassigned
+            targets = unassigned # A worker just died: retry on the updated ring
+        return targets
+
+    async def _put(self, index: int, sub_job: dict) -> bool:
+        """Queues sub_job for worker index. False if the worker is gone before the queue had room."""
+        job_queue = self._job_queues[index]
+        try:
+            job_queue.put_nowait(sub_job)
+            return True
+        except queue.Full:
+            pass
+        # Backpressure: the ingest worker waits until this egress worker catches up, as long as it is alive
+        self.publish_waits_total += 1
+        while self._live_worker(index):
+            try:
+                await asyncio.to_thread(job_queue.put, sub_job, True, _PUBLISH_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    async def publish_fxtwitter(
+        self,
+        bot_id: int | None,
+        payload: ContentPayload | None,
+        targets: list[int],
+        message_id: int,
+        log_prefix: str,
+        outbox_entries: dict[int, int] | None = None,
+        lane_batch: LaneBatch | None = None
+    ) -> list[int]:
+        """Publishes the FX sends of one bot. Returns the targets left for in-process delivery."""
+        if not targets or not payload or not payload.text:
+            return targets # launch_fxtwitter_sends logs/handles the invalid payload
+        job = jobs.build_job(jobs.JOB_FXTWITTER, bot_id, message_id, log_prefix, payload)
+        return await self.publish(job, targets, outbox_entries, lane_batch)
+
+    async def publish_full_mode(
+        self,
+        bot: Bot,
+        bot_id: int | None,
+        payload: ContentPayload | None,
+        media_result: MediaResult | AlbumMediaResult,
+        targets: list[int],
+        semaphore: asyncio.Semaphore,
+        message_id: int,
+        log_prefix: str,
+        lane_batch: LaneBatch | None = None,
+        outbox_entries: dict[int, int] | None = None,
+        delivery: DeliveryRecord | None = None
+    ) -> list[int]:
+        """
+        Publishes the Full mode sends of one bot. Downloaded media is first delivered in-process
+        to one target (upload once) so the workers only ever get file_ids.
+        Returns the targets left for in-process delivery.
+        """
+        if not targets or not payload:
+            return targets
+        remaining = list(targets)
+        is_album = isinstance(media_result, AlbumMediaResult)
+        launch = sender.launch_album_sends if is_album else sender.launch_full_mode_sends
+        # A carrier whose upload fails still gets the text version (sender); one refusing every send
+        # (kicked, chat not found, ...) makes no upload, so the next target takes over the carrier role.
+        # Once a file_id is known, or the content was given up, _needs_upload() ends the loop.
+        while remaining and _needs_upload(media_result) and media_result.upload_count < settings.UPLOAD_ONCE_MAX_ATTEMPTS:
+            self.carrier_sends_total += 1
+            carrier = remaining.pop(0)
+            await asyncio.gather(
+                *launch(bot, payload, media_result, [carrier], semaphore, log_prefix, lane_batch, outbox_entries, delivery),
+                return_exceptions=True
+            )
+        if not remaining:
+            return remaining
+
+        kind = jobs.JOB_ALBUM if is_album else jobs.JOB_FULL
+        job = jobs.build_job(kind, bot_id, message_id, log_prefix, payload, jobs.media_for_job(media_result))
+        return await self.publish(job, remaining, outbox_entries, lane_batch)
+
+    # --- Worker -> ingest process events ---
+    def _read_events(self):
+        """Event reader thread: hands every worker event to the event loop."""
+        while True:
+            try:
+                event = self._event_queue.get()
+            except (EOFError, OSError):
+                break
+            if event is None: # Stop sentinel
+                break
+            try:
+                self._loop.call_soon_threadsafe(self._dispatch_event, event)
+            except RuntimeError: # Loop closed
+                break
+
+    def _dispatch_event(self, event: tuple):
+        kind = event[0]
+        if kind == jobs.EVENT_JOB_DONE:
+            _, index, message_id, job_kind, succeeded, failed, latency, first_at, last_at = event
+            self.jobs_done_total += 1
+            self.targets_succeeded_total += succeeded
+            self.targets_failed_total += failed
+            self.latency_seconds_total += latency
+            if latency > self.latency_seconds_max:
+                self.latency_seconds_max = latency
+            delivery = get_latency_ledger().get(message_id, jobs.latency_mode(job_kind))
+            if delivery is not None:
+                delivery.merge(first_at, last_at, succeeded, failed)
+            logger.info(f"Msg {message_id}: egress worker {index} finished '{job_kind}' sends. Succeeded: {succeeded}, Failed: {failed} ({latency:.3f}s after publish).")
+        elif kind == sender.EVENT_CHAT_MIGRATED:
+            self._spawn_event_task(sender.apply_chat_migration(event[1], event[2], "[Egress] "))
+        elif kind == sender.EVENT_CHAT_REMOVED:
+            self._spawn_event_task(sender.apply_chat_removal(event[1], event[2], "[Egress] "))
+        else:
+            logger.warning(f"Unknown egress event: {event!r}")
+
+    def _spawn_event_task(self, coro):
+        task = asyncio.create_task(coro)
+        self._event_tasks.add(task)
+        task.add_done_callback(self._event_tasks.discard)
+
+    async def stop(self, timeout: float = 30.0):
+        """Lets every worker finish its queued jobs, then stops the processes and the event reader."""
+        for index, job_queue in self._job_queues.items():
+            if self._processes[index].is_alive():
+                await asyncio.to_thread(job_queue.put, None)
+        for index, process in self._processes.items():
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"Egress worker {index} did not stop within {timeout}s. Terminating it.")
+                process.terminate()
+        if self._event_thread is not None:
+            self._event_queue.put(None)
+            await asyncio.to_thread(self._event_thread.join, 5)
+        await asyncio.sleep(0) # Run events dispatched by the reader thread
+        if self._event_tasks:
+            await asyncio.gather(*self._event_tasks, return_exceptions=True)
+        logger.info(f"Egress workers stopped (stats: {self.get_stats()}).")
+
+    def get_stats(self) -> dict:
+        return {
+            'workers': self.num_workers,
+            'jobs_published_total': self.jobs_published_total,
+            'jobs_done_total': self.jobs_done_total,
+            'targets_published_total': self.targets_published_total,
+            'targets_succeeded_total': self.targets_succeeded_total,
+            'targets_failed_total': self.targets_failed_total,
+            'carrier_sends_total': self.carrier_sends_total,
+            'publish_waits_total': self.publish_waits_total,
+            'latency_seconds_avg': (self.latency_seconds_total / self.jobs_done_total) if self.jobs_done_total else 0.0,
+            'latency_seconds_max': self.latency_seconds_max,
+        }
+
+
+_pool: EgressPool | None = None
+
+
+def start_egress_pool() -> EgressPool | None:
+    """Starts the egress workers if EGRESS_WORKERS > 0 (otherwise every send stays in-process)."""
+    global _pool
+    if _pool is None and settings.EGRESS_WORKERS > 0:
+        # Carrier uploads and unassigned targets are sent from this process: it keeps its own share
+        # of each bot's global budget, the workers split the rest (see worker.run_worker)
+        send_scheduler.set_global_share(settings.EGRESS_INGEST_RATE_SHARE)
+        _pool = EgressPool(
+            settings.EGRESS_WORKERS,
+            [settings.BOT_TOKEN, *settings.SHARD_BOT_TOKENS],
+            queue_size=settings.EGRESS_QUEUE_SIZE,
+            vnodes=settings.EGRESS_RING_VNODES,
+        )
+        _pool.start()
+    return _pool
+
+
+def get_egress_pool() -> EgressPool | None:
+    return _pool
+
+
+async def stop_egress_pool():
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.stop()
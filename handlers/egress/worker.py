@@ -0,0 +1,127 @@
+# handlers/egress/worker.py
+# -*- coding: utf-8 -*-
+"""
+Egress worker process: receives send jobs for its shard of target chats and delivers them with
+its own Bot instances, HTTP pools, send schedulers and delivery lanes.
+"""
+import asyncio
+import logging
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram import Bot
+
+from config import settings
+from telegram_clients import setup, bot_pool
+from utils import outbox
+from utils.latency_ledger import DeliveryRecord
+from handlers.message_processing import sender, send_scheduler
+from handlers.message_processing.delivery_lanes import LaneBatch, get_lane_dispatcher
+from . import jobs
+
+logger = logging.getLogger(__name__)
+
+
+class EgressWorker:
+    """Runs the send loop of one worker process."""
+
+    def __init__(self, index: int, tokens: list[str], job_queue, event_queue):
+        self.index = index
+        self._tokens = {bot_pool.bot_id_from_token(token): token for token in tokens}
+        self._primary_id = bot_pool.bot_id_from_token(tokens[0])
+        self._job_queue = job_queue
+        self._event_queue = event_queue
+        self._bots: dict[int, Bot] = {}
+        self._bot_init_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_TASKS)
+        self._tasks: set[asyncio.Task] = set()
+        # Blocking queue reads happen on a dedicated thread
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"egress{index}-reader")
+
+    async def _get_bot(self, bot_id: int | None) -> Bot:
+        bot_id = bot_id if bot_id in self._tokens else self._primary_id
+        bot = self._bots.get(bot_id)
+        if bot is not None:
+            return bot
+        async with self._bot_init_lock:
+            bot = self._bots.get(bot_id)
+            if bot is None:
+                bot = setup.setup_send_bot(self._tokens[bot_id], name=f"egress{self.index}-{bot_id}")
+                try:
+                    await bot.initialize()
+                except Exception as e:
+                    # Sends do not need get_me(); keep the bot and let each send report its own error
+                    logger.warning(f"Egress worker {self.index}: initializing bot {bot_id} failed: {e}")
+                self._bots[bot_id] = bot
+        return bot
+
+    async def run(self):
+        # Migrations/removals are applied by the ingest process, which owns the configuration
+        sender.set_chat_event_sink(self._event_queue.put)
+        try:
+            await outbox.open_outbox() # Finished sends clear their journal entries from here
+        except Exception as e:
+            logger.error(f"Egress worker {self.index}: could not open the send outbox: {e}")
+        loop = asyncio.get_running_loop()
+        logger.info(f"Egress worker {self.index} started.")
+        try:
+            while True:
+                job = await loop.run_in_executor(self._reader, self._job_queue.get)
+                if job is None: # Stop sentinel (sent after the last job)
+                    break
+                self._start_job(job)
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+        finally:
+            for bot in self._bots.values():
+                try:
+                    await bot.shutdown()
+                except Exception as e:
+                    logger.debug(f"Egress worker {self.index}: bot shutdown failed: {e}")
+            self._reader.shutdown(wait=False)
+            await outbox.close_outbox()
+            logger.info(f"Egress worker {self.index} stopped (schedulers: {send_scheduler.get_all_stats()}).")
+
+    def _start_job(self, job: dict):
+        # Lanes are reserved synchronously in arrival order: per-chat order follows publish order
+        lane_batch = get_lane_dispatcher().open_batch(job['targets'])
+        task = asyncio.create_task(self._run_job(job, lane_batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_job(self, job: dict, lane_batch: LaneBatch):
+        kind = job['kind']
+        targets = job['targets']
+        log_prefix = job['log_prefix']
+        results = []
+        delivery = DeliveryRecord(job['message_id'], jobs.latency_mode(kind), 0.0) # Merged into the ingest process's ledger
+        try:
+            bot = await self._get_bot(job['bot_id'])
+            tasks = jobs.launch_job(bot, job, self._semaphore, lane_batch, delivery)
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        except Exception as e:
+            logger.error(f"{log_prefix}Egress worker {self.index}: job failed: {e}", exc_info=True)
+        finally:
+            lane_batch.close()
+        succeeded = sum(1 for r in results if r is True)
+        self._event_queue.put((
+            jobs.EVENT_JOB_DONE, self.index, job['message_id'], kind, succeeded, len(targets) - succeeded,
+            time.time() - job['published_at'], delivery.first_at, delivery.last_at,
+        ))
+
+
+def run_worker(index: int, num_workers: int, tokens: list[str], job_queue, event_queue):
+    """Process entry point (multiprocessing target)."""
+    from utils import logging_config
+    if not logging.getLogger().handlers:
+        logging_config.setup_logging()
+    # Ctrl+C / SIGTERM reach the whole process group: the ingest process drains the workers on shutdown
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    # Every worker sends for every bot: split each bot's global budget (minus the ingest process's share) between the workers
+    send_scheduler.set_global_share((1.0 - settings.EGRESS_INGEST_RATE_SHARE) / max(1, num_workers))
+    try:
+        asyncio.run(EgressWorker(index, tokens, job_queue, event_queue).run())
+    finally:
+        logging_config.stop_logging() # Write out the queued log records before the process exits
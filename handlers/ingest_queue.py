@@ -0,0 +1,155 @@
+# handlers/ingest_queue.py
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# --- Overflow policies (what put() does when the queue is full) ---
+OVERFLOW_BLOCK = 'block'              # Wait for a free slot (at most max_waiting handlers wait, newer messages are dropped)
+OVERFLOW_DROP_OLDEST = 'drop_oldest'  # Evict the oldest queued message to make room
+OVERFLOW_DOWNGRADE = 'downgrade'      # Wait for a slot like 'block', but process the message in cheap mode (no media)
+VALID_OVERFLOW_POLICIES = {OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DOWNGRADE}
+
+
+@dataclass(slots=True)
+class IngestItem:
+    """A source message waiting to be processed by a pipeline worker."""
+    message: object # telethon.tl.custom.Message
+    enqueued_at: float
+    downgraded: bool = False
+
+
+class IngestQueue:
+    """
+    Bounded queue between the Telethon handler and a pool of pipeline workers.
+    Telethon runs every update handler in its own task, so a put() that waits does not slow the
+    updates down: it only parks one more task. max_waiting caps those parked puts; past it,
+    new messages are dropped instead of piling up in memory.
+    """
+
+    def __init__(self, process_func: Callable[[IngestItem], Awaitable[None]], maxsize: int, num_workers: int,
+                 overflow_policy: str = OVERFLOW_BLOCK, max_waiting: int | None = None):
+        if overflow_policy not in VALID_OVERFLOW_POLICIES:
+            logger.error(f"Invalid ingest overflow policy '{overflow_policy}'. Falling back to '{OVERFLOW_BLOCK}'.")
+            overflow_policy = OVERFLOW_BLOCK
+        self._process_func = process_func
+        self._queue: asyncio.Queue[IngestItem] = asyncio.Queue(maxsize=max(1, maxsize))
+        self._num_workers = max(1, num_workers)
+        self._overflow_policy = overflow_policy
+        self._max_waiting = self._queue.maxsize if max_waiting is None else max(0, max_waiting)
+        self._waiting = 0 # put() calls waiting for a free slot
+        self._workers: list[asyncio.Task] = []
+
+        # Counters
+        self.enqueued_total = 0
+        self.processed_total = 0
+        self.failed_total = 0
+        self.dropped_total = 0
+        self.downgraded_total = 0
+        self.max_depth = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def put(self, message) -> bool:
+        """Enqueues a message according to the overflow policy. Returns False if it was dropped."""
+        item = IngestItem(message=message, enqueued_at=time.monotonic())
+
+        if self._queue.full():
+            if self._overflow_policy != OVERFLOW_DROP_OLDEST and self._waiting >= self._max_waiting:
+                self.dropped_total += 1
+                logger.warning(f"Ingest queue full ({self._queue.maxsize}) and {self._waiting} message(s) already waiting. Dropped message {getattr(message, 'id', '?')}.")
+                return False
+            if self._overflow_policy == OVERFLOW_DROP_OLDEST:
+                try:
+                    dropped = self._queue.get_nowait()
+                    self._queue.task_done()
+                    self.dropped_total += 1
+                    logger.warning(f"Ingest queue full ({self._queue.maxsize}). Dropped oldest message {getattr(dropped.message, 'id', '?')}.")
+                except asyncio.QueueEmpty:
+                    pass
+            elif self._overflow_policy == OVERFLOW_DOWNGRADE:
+                item.downgraded = True
+                self.downgraded_total += 1
+                logger.warning(f"Ingest queue full ({self._queue.maxsize}). Message {getattr(message, 'id', '?')} will be processed in downgraded mode.")
+
+        if self._overflow_policy == OVERFLOW_DROP_OLDEST:
+            self._queue.put_nowait(item) # Room was just made, never blocks
+        else:
+            self._waiting += 1
+            try:
+                await self._queue.put(item) # Waits while full
+            finally:
+                self._waiting -= 1
+
+        self.enqueued_total += 1
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    async def _worker(self, worker_id: int):
+        while True:
+            item = await self._queue.get()
+            try:
+                wait_time = time.monotonic() - item.enqueued_at
+                self.wait_time_total += wait_time
+                if wait_time > self.wait_time_max:
+                    self.wait_time_max = wait_time
+                await self._process_func(item)
+                self.processed_total += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed_total += 1
+                logger.error(f"Ingest worker {worker_id}: unhandled error processing message {getattr(item.message, 'id', '?')}: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        """Starts the worker pool (must be called from a running event loop)."""
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._worker(i), name=f"ingest-worker-{i}") for i in range(self._num_workers)]
+        logger.info(f"Started {self._num_workers} ingest worker(s). Queue size: {self._queue.maxsize}, overflow policy: '{self._overflow_policy}'.")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Waits (up to drain_timeout) for queued messages, then cancels the workers."""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Ingest queue not drained after {drain_timeout}s. {self._queue.qsize()} message(s) left unprocessed.")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("Ingest workers stopped.")
+
+    def get_stats(self) -> dict:
+        """Returns queue-depth and wait-time counters."""
+        started = self.processed_total + self.failed_total
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'capacity': self._queue.maxsize,
+            'waiting': self._waiting,
+            'max_waiting': self._max_waiting,
+            'workers': len(self._workers),
+            'enqueued_total': self.enqueued_total,
+            'processed_total': self.processed_total,
+            'failed_total': self.failed_total,
+            'dropped_total': self.dropped_total,
+            'downgraded_total': self.downgraded_total,
+            'wait_time_total': self.wait_time_total,
+            'wait_time_max': self.wait_time_max,
+            'wait_time_avg': (self.wait_time_total / started) if started else 0.0,
+        }
@@ -2,120 +2,300 @@
 # -*- coding: utf-8 -*-
 import asyncio
 import logging
+import time
 from telethon import events, TelegramClient
 from telegram import Bot
 from telegram.ext import Application
 
 from config import settings, group_config, persistent_config
-from utils import context_cache, error_handler # Keep error_handler if used elsewhere
+from telegram_clients import bot_pool
+from utils import error_handler, identity_cache, metrics # Keep error_handler if used elsewhere
+from utils.dedupe_index import get_dedupe_index
+from utils.latency_ledger import get_latency_ledger, MODE_FXTWITTER, MODE_FULL
+from utils.outbox import release_entries
+from utils.helpers import markup_utils, media_utils
+
+from .ingest_queue import IngestQueue, IngestItem
+from .album_aggregator import Album, AlbumAggregator
+from .egress import get_egress_pool
+from .egress.jobs import JOB_FXTWITTER, JOB_FULL, JOB_ALBUM, media_for_job
+from .outbox_sends import record_sends
 
 from .message_processing import (
     analyze_message,
+    record_deep_link_context,
     format_content_for_targets,
     process_media_for_full_mode,
+    process_album_media_for_full_mode,
+    release_shared_media,
     # DELETE: send_to_targets, # Không cần import hàm này nữa
     launch_fxtwitter_sends,     # <--- IMPORT Launch function
     launch_full_mode_sends,     # <--- IMPORT Launch function
+    launch_album_sends,
+    is_album_media_type,
     MessageAnalysisResult,
     ContentPayload,
     MediaResult,
+    AlbumMediaResult,
+    LaneBatch,
+    get_lane_dispatcher,
 )
 
 logger = logging.getLogger(__name__)
 
-# --- Telethon Message Handler Registration ---
-def register_handlers(application: Application, client: TelegramClient, target_bot: Bot, semaphore: asyncio.Semaphore):
-    """Registers the Telethon event handler for new messages."""
-
-    @client.on(events.NewMessage(from_users=settings.SOURCE_BOT_IDENTIFIER))
-    async def handle_new_message(event):
-        """Processes new messages from the source bot by orchestrating analysis, formatting, and sending."""
-        message = event.message
-        message_id = message.id
-        log_prefix_base = f"Msg {message_id}: "
-
-        # --- Initial Setup & Target Check ---
-        current_target_groups = await persistent_config.load_target_groups()
-        if not current_target_groups:
-            logger.debug(f"{log_prefix_base}No target groups configured. Skipping.")
-            return
+# Buffers album parts (shared grouped_id) until the whole album can go through the pipeline once
+_album_aggregator: AlbumAggregator | None = None
 
-        context_cache.cleanup_cache()
+# Per-stage latency of _process_message (label children bound once)
+_stage_seconds = metrics.histogram('message_stage_seconds', 'Time spent in each stage of handle_new_message.', ('stage',))
+_STAGE_ANALYZE = _stage_seconds.labels('analyze')
+_STAGE_CATEGORIZE = _stage_seconds.labels('categorize')
+_STAGE_FORMAT = _stage_seconds.labels('format')
+_STAGE_MEDIA_DOWNLOAD = _stage_seconds.labels('media_download')
+_STAGE_MEDIA_WAIT = _stage_seconds.labels('media_wait') # Part of the download Full mode actually waited for
+_STAGE_LAUNCH = _stage_seconds.labels('launch') # Journaling, publishing and creating the send tasks
+_STAGE_SENDS = _stage_seconds.labels('sends') # Until the last send of the message finished
+_STAGE_TOTAL = _stage_seconds.labels('total')
 
-        # --- Step 1: Analyze Message ---
-        analysis_result = await analyze_message(message, target_bot)
-        if not analysis_result:
-            logger.warning(f"{log_prefix_base}Message analysis failed or returned None. Skipping.")
-            return
-        log_prefix = analysis_result.log_prefix.replace("[Analyze]", "[Main]")
+# --- Media Prefetch Helpers ---
+async def _prefetch_media(analysis_result: MessageAnalysisResult, client: TelegramClient, bots: dict[int, Bot], album: Album | None = None) -> tuple[dict, float]:
+    """
+    Runs the Full mode media step for every delivering bot (file_ids are per bot; a download
+    is shared between bots). Returns ({bot_id: MediaResult | AlbumMediaResult}, seconds it took).
+    """
+    started = time.monotonic()
+    shared = {} # Per-message memo: each media is downloaded/staged at most once
+    try:
+        if album is not None:
+            coros = [process_album_media_for_full_mode(analysis_result, album.messages, client, bot, shared) for bot in bots.values()]
+        else:
+            coros = [process_media_for_full_mode(analysis_result, client, bot, shared) for bot in bots.values()]
+        tasks = [asyncio.ensure_future(coro) for coro in coros]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # Cancelled (nobody needs the media) or one bot failed: release what the others already
+            # hold, otherwise their references keep the shared download's temp file alive
+            for task in tasks:
+                task.cancel()
+            for outcome in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(outcome, (MediaResult, AlbumMediaResult)):
+                    outcome.close()
+            raise
+    finally:
+        release_shared_media(shared)
+    return dict(zip(bots, results)), time.monotonic() - started
+
+
+def _close_media_results(media_results: dict):
+    for media_result in media_results.values():
+        media_result.close()
+
+
+def _discard_media_prefetch(task: asyncio.Task):
+    """Cancels an unneeded prefetch, or releases its content if it already finished."""
+    if not task.done():
+        task.cancel() # The download helper removes its partial temp file on cancellation
+        return
+    if not task.cancelled() and task.exception() is None:
+        media_results, _ = task.result()
+        _close_media_results(media_results)
+
+
+def _bot_for(bot_id: int | None, default_bot: Bot) -> Bot:
+    """Bot of a shard group (default_bot when the pool does not know the id)."""
+    return bot_pool.get_bot(bot_id) or default_bot
 
-        # --- Step 1.5: Check Required Button ---
-        if not analysis_result.has_required_button:
-            logger.debug(f"{log_prefix}Skipping: Missing required button identified during analysis.")
+
+# --- Message Pipeline (run by the ingest workers) ---
+async def handle_new_message(message, client: TelegramClient, target_bot: Bot, semaphore: asyncio.Semaphore, downgraded: bool = False):
+    """Processes new messages from the source bot by orchestrating analysis, formatting, and sending."""
+    message_id = message.id
+    log_prefix_base = f"Msg {message_id}: "
+
+    # --- Initial Setup & Target Check ---
+    # In-memory snapshot: no file I/O and no lock on the per-message path
+    current_target_groups = persistent_config.get_target_groups()
+    if not current_target_groups:
+        logger.debug(f"{log_prefix_base}No target groups configured. Skipping.")
+        return
+
+    # Reserve this message's place in every target's delivery lane BEFORE the first await,
+    # so per-chat order follows source order even with several ingest workers.
+    lane_batch = get_lane_dispatcher().open_batch(current_target_groups)
+    try:
+        await _process_message(message, current_target_groups, lane_batch, client, target_bot, semaphore, downgraded)
+    finally:
+        lane_batch.close() # Release lanes of targets this message skipped
+
+
+async def handle_new_album(album: Album, client: TelegramClient, target_bot: Bot, semaphore: asyncio.Semaphore, downgraded: bool = False):
+    """
+    Runs one pipeline pass for a whole album (one analysis, one media group per target).
+    Albums that cannot be sent as a media group are processed part by part as before.
+    The album enters the queue with its first part: its lanes are reserved before waiting for the rest.
+    """
+    current_target_groups = persistent_config.get_target_groups()
+    if not current_target_groups:
+        logger.debug(f"Album {album.grouped_id}: No target groups configured. Skipping.")
+        return
+
+    lane_batch = get_lane_dispatcher().open_batch(current_target_groups) # Before the first await, like handle_new_message
+    try:
+        await album.wait_complete()
+        messages = album.messages
+        media_types = [media_utils.get_telethon_media_type(m) for m in messages]
+        if len(messages) < 2 or not all(is_album_media_type(t) for t in media_types):
+            logger.debug(f"Album {album.grouped_id}: {len(messages)} part(s) with media {media_types}. Processing parts individually.")
+            # Each part gets its own turn inside the album's lane slots
+            for message, part_batch in zip(messages, lane_batch.split(len(messages))):
+                try:
+                    await _process_message(message, current_target_groups, part_batch, client, target_bot, semaphore, downgraded)
+                finally:
+                    part_batch.close()
             return
 
-        # --- Step 2: Categorize Targets ---
-        fxtwitter_targets = []
-        full_mode_targets = []
-        # ...(logic categorization giữ nguyên)...
-        try:
-             for chat_id in current_target_groups:
-                 mode = group_config.get_group_mode(chat_id)
-                 if mode == group_config.MODE_FXTWITTER:
-                     fxtwitter_targets.append(chat_id)
-                 elif mode == group_config.MODE_FULL:
-                     full_mode_targets.append(chat_id)
-                 else:
-                     logger.warning(f"{log_prefix}Unknown mode '{mode}' for chat {chat_id}. Defaulting to 'full'.")
-                     full_mode_targets.append(chat_id)
-        except Exception as e:
-             logger.error(f"{log_prefix}Error categorizing target groups: {e}", exc_info=True)
-             return
-
-        needs_fxtwitter = bool(fxtwitter_targets)
-        needs_full_mode = bool(full_mode_targets)
-        needs_media_processing = needs_full_mode and analysis_result.media_type is not None
-
-        logger.debug(f"{log_prefix}Targets - FX: {len(fxtwitter_targets)}, Full: {len(full_mode_targets)}. Needs media: {needs_media_processing}")
-
-        if not needs_fxtwitter and not needs_full_mode:
-            logger.info(f"{log_prefix}No targets require processing for this message. Skipping.")
+        # Text and buttons usually sit on one part only: analyze the part that has them
+        lead = next((m for m in messages if markup_utils.has_specific_button(m, settings.BUTTON_TEXT_TO_FIND)), None) \
+            or next((m for m in messages if m.text), messages[0])
+        logger.info(f"Album {album.grouped_id}: processing {len(messages)} parts as one message (lead: Msg {lead.id}).")
+        await _process_message(lead, current_target_groups, lane_batch, client, target_bot, semaphore, downgraded, album)
+    finally:
+        lane_batch.close()
+
+
+async def _process_message(message, current_target_groups, lane_batch: LaneBatch, client: TelegramClient, target_bot: Bot, semaphore: asyncio.Semaphore, downgraded: bool, album: Album | None = None):
+    """Analysis, formatting and fan-out of one source message (sends go through lane_batch)."""
+    message_id = message.id
+    log_prefix_base = f"Msg {message_id}: "
+
+    message_started = time.perf_counter()
+
+    # --- Step 1: Analyze Message ---
+    analysis_result = await analyze_message(message, target_bot)
+    _STAGE_ANALYZE.observe(time.perf_counter() - message_started)
+    if not analysis_result:
+        logger.warning(f"{log_prefix_base}Message analysis failed or returned None. Skipping.")
+        return
+    log_prefix = analysis_result.log_prefix.replace("[Analyze]", "[Main]")
+
+    # --- Step 1.5: Check Required Button ---
+    if not analysis_result.has_required_button:
+        logger.debug(f"{log_prefix}Skipping: Missing required button identified during analysis.")
+        return
+
+    # --- Step 1.6: Suppress Duplicate Tweets (before any download/upload/send) ---
+    if settings.DEDUPE_ENABLED:
+        dedupe_index = get_dedupe_index()
+        if dedupe_index.check_and_record(analysis_result.tweet_status_id, analysis_result.action_type):
+            logger.info(f"{log_prefix}Skipping: duplicate of status {analysis_result.tweet_status_id} ({analysis_result.action_type}) seen in the last {settings.DEDUPE_WINDOW_SECONDS}s.")
             return
 
-        all_launched_tasks = [] # List to collect all tasks
+    # Only messages that will be forwarded get a deep link target (skipped ones never show the link)
+    record_deep_link_context(analysis_result)
+
+    # --- Step 2: Categorize Targets ---
+    # Precomputed per-mode partitions: rebuilt only when a mode or the target list changes
+    stage_started = time.perf_counter()
+    partitions = group_config.get_partitions(current_target_groups)
+    fxtwitter_targets = partitions.fxtwitter
+    full_mode_targets = partitions.full
+
+    needs_fxtwitter = bool(fxtwitter_targets)
+    needs_full_mode = bool(full_mode_targets)
+    needs_media_processing = needs_full_mode and analysis_result.media_type is not None
+    if downgraded and needs_media_processing:
+        # Ingest queue overflowed: skip download/upload, full mode targets get the text version
+        logger.warning(f"{log_prefix}Downgraded (ingest queue overflow): skipping media processing.")
+        needs_media_processing = False
+
+    logger.debug(f"{log_prefix}Targets - FX: {len(fxtwitter_targets)}, Full: {len(full_mode_targets)}. Needs media: {needs_media_processing}")
+
+    if not needs_fxtwitter and not needs_full_mode:
+        logger.info(f"{log_prefix}No targets require processing for this message. Skipping.")
+        return
+
+    all_launched_tasks = [] # List to collect all tasks
+    # Delivery times per mode, measured from the source bot's post (message.date)
+    ledger = get_latency_ledger()
+    source_ts = message.date.timestamp() if message.date else time.time()
+    egress_pool = get_egress_pool() # With EGRESS_WORKERS, sends are published to the worker processes
+    published_targets = 0
 
+    # Each target is served by its shard bot (just target_bot without SHARD_BOT_TOKENS)
+    fxtwitter_targets_by_bot = bot_pool.group_by_bot(fxtwitter_targets)
+    full_mode_targets_by_bot = bot_pool.group_by_bot(full_mode_targets)
+    _STAGE_CATEGORIZE.observe(time.perf_counter() - stage_started)
+
+    # --- Step 2.5: Speculative Media Prefetch ---
+    # Start the download now so it overlaps formatting and the FX sends; Step 5 awaits it
+    media_task = None
+    if needs_media_processing:
+        media_bots = {bot_id: _bot_for(bot_id, target_bot) for bot_id in full_mode_targets_by_bot}
+        media_task = asyncio.create_task(_prefetch_media(analysis_result, client, media_bots, album))
+        logger.debug(f"{log_prefix}Started media prefetch ({analysis_result.media_type}).")
+    prefetch_started_at = time.monotonic()
+
+    media_results = {} # bot_id -> MediaResult | AlbumMediaResult
+    try:
         # --- Step 3: Format Content (Initial - For FX) ---
         # Format content early, we need fxtwitter_payload now
+        stage_started = time.perf_counter()
         fxtwitter_payload, full_mode_payload = format_content_for_targets(
             analysis_result,
             needs_fxtwitter,
             needs_full_mode
         )
+        _STAGE_FORMAT.observe(time.perf_counter() - stage_started)
+        if media_task is not None and not full_mode_payload:
+            # No full mode message can be built, so nobody will use the media
+            logger.warning(f"{log_prefix}No Full mode payload. Cancelling media prefetch.")
+            _discard_media_prefetch(media_task)
+            media_task = None
 
         # --- Step 4: Launch FXTwitter Tasks IMMEDIATELY ---
+        launch_seconds = 0.0
         if needs_fxtwitter:
+            stage_started = time.perf_counter()
             log_prefix_send = log_prefix.replace("[Main]", "[Send]")
-            fx_tasks = launch_fxtwitter_sends(
-                target_bot,
-                fxtwitter_payload,
-                fxtwitter_targets,
-                semaphore,
-                log_prefix_send
-            )
+            fx_delivery = ledger.open(message_id, MODE_FXTWITTER, source_ts)
+            fx_tasks = []
+            for bot_id, bot_targets in fxtwitter_targets_by_bot.items():
+                # Journal the sends first: a crash mid-fan-out resumes them on the next start
+                outbox_entries = await record_sends(
+                    JOB_FXTWITTER, bot_id, message_id, log_prefix_send,
+                    fxtwitter_payload if fxtwitter_payload and fxtwitter_payload.text else None, None, bot_targets
+                )
+                if egress_pool is not None:
+                    remaining = await egress_pool.publish_fxtwitter(bot_id, fxtwitter_payload, bot_targets, message_id, log_prefix_send, outbox_entries, lane_batch)
+                    published_targets += len(bot_targets) - len(remaining)
+                    bot_targets = remaining # Only targets no worker could take are sent from here
+                fx_tasks.extend(launch_fxtwitter_sends(
+                    _bot_for(bot_id, target_bot),
+                    fxtwitter_payload,
+                    bot_targets,
+                    semaphore,
+                    log_prefix_send,
+                    lane_batch,
+                    outbox_entries,
+                    fx_delivery
+                ))
+                release_entries(outbox_entries)
             all_launched_tasks.extend(fx_tasks)
+            launch_seconds += time.perf_counter() - stage_started
             logger.info(f"{log_prefix}Launched {len(fx_tasks)} FXTwitter tasks.")
 
-        # --- Step 5: Process Media (Conditional) ---
-        media_result = MediaResult(media_type=None) # Default
-        if needs_media_processing:
-            # This await happens AFTER FX tasks are launched
-            first_full_target_id = full_mode_targets[0] if full_mode_targets else None
-            media_result = await process_media_for_full_mode(
-                analysis_result,
-                client,
-                target_bot,
-                first_full_target_id
-            )
+        # --- Step 5: Collect Prefetched Media (Conditional) ---
+        if media_task is not None:
+            stage_reached_at = time.monotonic()
+            task, media_task = media_task, None # From here on the results are owned by media_results
+            media_results, download_seconds = await task
+            waited = time.monotonic() - stage_reached_at
+            # Without prefetch the download would only have started now
+            saved = min(stage_reached_at - prefetch_started_at, download_seconds)
+            _STAGE_MEDIA_DOWNLOAD.observe(download_seconds)
+            _STAGE_MEDIA_WAIT.observe(waited)
+            logger.info(f"{log_prefix}Media prefetch took {download_seconds:.3f}s, Full mode waited {waited:.3f}s for it (saved {saved:.3f}s).")
         elif needs_full_mode:
             logger.debug(f"{log_prefix}Full mode needed, but no media processing required.")
 
@@ -123,33 +303,124 @@ def register_handlers(application: Application, client: TelegramClient, target_b
         if needs_full_mode:
             log_prefix_send = log_prefix.replace("[Main]", "[Send]")
             # We already have full_mode_payload from Step 3
-            full_tasks = launch_full_mode_sends(
-                target_bot,
-                full_mode_payload, # Use the payload formatted earlier
-                media_result,      # Pass the result from media processing
-                full_mode_targets,
-                semaphore,
-                log_prefix_send
-            )
+            stage_started = time.perf_counter()
+            full_delivery = ledger.open(message_id, MODE_FULL, source_ts)
+            full_tasks = []
+            for bot_id, bot_targets in full_mode_targets_by_bot.items():
+                bot = _bot_for(bot_id, target_bot)
+                media_result = media_results.get(bot_id) or MediaResult(media_type=None)
+                is_album = isinstance(media_result, AlbumMediaResult)
+                outbox_entries = await record_sends(
+                    JOB_ALBUM if is_album else JOB_FULL, bot_id, message_id, log_prefix_send,
+                    full_mode_payload, media_for_job(media_result), bot_targets
+                )
+                if egress_pool is not None:
+                    remaining = await egress_pool.publish_full_mode(
+                        bot, bot_id, full_mode_payload, media_result, bot_targets, semaphore, message_id, log_prefix_send,
+                        lane_batch, outbox_entries, full_delivery
+                    )
+                    published_targets += len(bot_targets) - len(remaining)
+                    bot_targets = remaining
+                if is_album:
+                    # One media group per target instead of one send per album part
+                    full_tasks.extend(launch_album_sends(
+                        bot, full_mode_payload, media_result, bot_targets, semaphore, log_prefix_send, lane_batch, outbox_entries, full_delivery
+                    ))
+                elif bot_targets:
+                    full_tasks.extend(launch_full_mode_sends(
+                        bot,
+                        full_mode_payload, # Use the payload formatted earlier
+                        media_result,      # Pass the result from media processing
+                        bot_targets,
+                        semaphore,
+                        log_prefix_send,
+                        lane_batch,
+                        outbox_entries,
+                        full_delivery
+                    ))
+                release_entries(outbox_entries)
             all_launched_tasks.extend(full_tasks)
+            launch_seconds += time.perf_counter() - stage_started
             logger.info(f"{log_prefix}Launched {len(full_tasks)} Full Mode tasks.")
+        _STAGE_LAUNCH.observe(launch_seconds)
+
 
+        if published_targets:
+            logger.info(f"{log_prefix}Published {published_targets} target send(s) to the egress workers.")
 
         # --- Step 7: Wait for All Launched Tasks ---
         if all_launched_tasks:
             log_prefix_wait = log_prefix.replace("[Main]", "[Wait]")
             logger.info(f"{log_prefix_wait}Waiting for {len(all_launched_tasks)} total send tasks to complete...")
+            stage_started = time.perf_counter()
             results = await asyncio.gather(*all_launched_tasks, return_exceptions=True)
+            _STAGE_SENDS.observe(time.perf_counter() - stage_started)
             success_count = sum(1 for r in results if isinstance(r, bool) and r is True)
             fail_count = len(results) - success_count
             # Error details are logged within execute_send
-            logger.info(f"{log_prefix_wait}Finished sending for Msg {message_id}. Tasks Succeeded: {success_count}, Tasks Failed: {fail_count}")
+            logger.info(f"{log_prefix_wait}Finished sending for Msg {message_id}. Tasks Succeeded: {success_count}, Tasks Failed: {fail_count}, Media uploads: {sum(r.upload_count for r in media_results.values())}")
         else:
             logger.info(f"{log_prefix}No messages needed to be sent (no tasks created).")
+    finally:
+        if media_task is not None:
+            _discard_media_prefetch(media_task) # Failed before Step 5
+        # Deterministic cleanup of downloaded media (memory buffer / temp file) after all sends finished
+        _close_media_results(media_results)
 
-        logger.debug(f"{log_prefix}Finished all processing for message {message_id}.")
+    _STAGE_TOTAL.observe(time.perf_counter() - message_started)
+    logger.debug(f"{log_prefix}Finished all processing for message {message_id}.")
+
+
+# --- Telethon Message Handler Registration ---
+def register_handlers(application: Application, client: TelegramClient, target_bot: Bot, semaphore: asyncio.Semaphore) -> IngestQueue:
+    """
+    Registers the Telethon event handler for new messages and starts the pipeline workers.
+    The handler only enqueues; workers run handle_new_message. Returns the IngestQueue (stop it on shutdown).
+    Call after identity_cache.prime() so the source filter uses the already resolved peer.
+    """
 
+    global _album_aggregator
+
+    async def process_item(item: IngestItem):
+        if isinstance(item.message, Album):
+            await handle_new_album(item.message, client, target_bot, semaphore, downgraded=item.downgraded)
+        else:
+            await handle_new_message(item.message, client, target_bot, semaphore, downgraded=item.downgraded)
+
+    ingest_queue = IngestQueue(
+        process_item,
+        maxsize=settings.INGEST_QUEUE_SIZE,
+        num_workers=settings.INGEST_WORKERS,
+        overflow_policy=settings.INGEST_OVERFLOW_POLICY,
+        max_waiting=settings.INGEST_MAX_WAITING,
+    )
+    # An album enters the ingest queue as a single item when its first part arrives
+    _album_aggregator = AlbumAggregator(ingest_queue.put, settings.ALBUM_WINDOW_SECONDS)
+
+    # Resolved peer from the identity cache; Telethon resolves the raw identifier itself if priming failed
+    source = identity_cache.get_source_peer() or settings.SOURCE_BOT_IDENTIFIER
+
+    @client.on(events.NewMessage(from_users=source))
+    async def on_new_message(event):
+        """Pushes new messages from the source bot into the bounded ingest queue (album parts via the aggregator)."""
+        if await _album_aggregator.add(event.message):
+            return
+        await ingest_queue.put(event.message)
+
+    ingest_queue.start()
 
     # --- End of register_handlers ---
     logger.info(f"Registered Telethon handler for messages from source: {settings.SOURCE_BOT_IDENTIFIER}")
-    logger.info("Message handler registration complete (using modular processing with correct execution order).")
\ No newline at end of file
+    logger.info("Message handler registration complete (using modular processing with correct execution order).")
+    return ingest_queue
+
+
+def get_album_stats() -> dict:
+    return _album_aggregator.get_stats() if _album_aggregator is not None else {}
+
+
+async def flush_albums():
+    """Hands albums still being collected to the ingest queue (call before stopping the queue)."""
+    if _album_aggregator is not None:
+        logger.info(f"Flushing album aggregator (stats: {_album_aggregator.get_stats()})...")
+        await _album_aggregator.stop()
@@ -1,20 +1,33 @@
-from .analyzer import analyze_message, MessageAnalysisResult
+from .analyzer import analyze_message, record_deep_link_context, MessageAnalysisResult
 from .content_formatter import format_content_for_targets, ContentPayload
-from .media_handler import process_media_for_full_mode, MediaResult
+from .media_handler import process_media_for_full_mode, process_album_media_for_full_mode, release_shared_media, MediaResult, AlbumMediaResult
 # --- THAY ĐỔI DÒNG IMPORT NÀY ---
-from .sender import launch_fxtwitter_sends, launch_full_mode_sends, execute_send # Import các hàm launch mới
+from .sender import launch_fxtwitter_sends, launch_full_mode_sends, launch_album_sends, is_album_media_type, execute_send # Import các hàm launch mới
 # ---------------------------------
+from .send_scheduler import SendScheduler, get_scheduler
+from .delivery_lanes import LaneDispatcher, LaneBatch, get_lane_dispatcher
 
 __all__ = [
     "analyze_message",
+    "record_deep_link_context",
     "MessageAnalysisResult",
     "format_content_for_targets",
     "ContentPayload",
     "process_media_for_full_mode",
     "MediaResult",
+    "process_album_media_for_full_mode",
+    "release_shared_media",
+    "AlbumMediaResult",
     # --- CẬP NHẬT EXPORTS ---
     "launch_fxtwitter_sends",
     "launch_full_mode_sends",
+    "launch_album_sends",
+    "is_album_media_type",
     # -----------------------
     "execute_send", # Optional export
+    "SendScheduler",
+    "get_scheduler",
+    "LaneDispatcher",
+    "LaneBatch",
+    "get_lane_dispatcher",
 ]
\ No newline at end of file
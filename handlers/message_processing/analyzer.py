@@ -7,7 +7,8 @@ from telegram import Bot
 
 # Import helpers from the new structure
 from utils.helpers import markup_utils, media_utils, text_utils, url_utils
-from utils import context_cache
+from utils import context_cache, identity_cache
+from utils.deep_links import get_deep_link_index
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -23,9 +24,11 @@ class MessageAnalysisResult:
     original_text: str = ""
     media_type: str | None = None
     tweet_url: str | None = None
+    tweet_status_id: str | None = None # Canonical status ID from tweet_url (dedupe key)
     action_type: str | None = None
     username: str | None = None
-    context_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    tweet_header: text_utils.TweetHeader | None = None
+    context_id: str = field(default_factory=lambda: uuid.uuid4().hex) # Start parameter of the deploy deep link
     deploy_deep_link: str | None = None
     initial_cache_data: dict = field(default_factory=dict)
 
@@ -45,31 +48,41 @@ async def analyze_message(message: Message, target_bot: Bot) -> MessageAnalysisR
         # Return None early if the button is strictly required to proceed
         # return None # Or return result with has_required_button=False if you handle it later
 
-    try:
-        bot_info = await target_bot.get_me()
-        bot_username = bot_info.username
-        if not bot_username:
-            raise ValueError("Bot username missing")
-    except Exception as e:
-        logger.error(f"{log_prefix}Could not get bot info: {e}")
-        return None # Cannot proceed without bot username for deep links
+    # Bot username comes from the identity cache (filled at startup), no API call per message
+    bot_username = identity_cache.get_bot_username()
+    if not bot_username:
+        try:
+            await identity_cache.refresh_bot_identity(target_bot) # Only if startup priming failed
+            bot_username = identity_cache.get_bot_username()
+        except Exception as e:
+            logger.error(f"{log_prefix}Could not get bot info: {e}")
+            return None # Cannot proceed without bot username for deep links
 
     original_text = message.text or ""
     media_type = media_utils.get_telethon_media_type(message)
     tweet_url = markup_utils.extract_button_url(message, settings.BUTTON_TEXT_TO_FIND) # Original URL
+    tweet_status_id = url_utils.extract_tweet_status_id(tweet_url)
 
     # --- Analyze Text Content ---
-    action_type, username = text_utils.extract_action_and_username(original_text)
+    # Single pass: action, username, body boundary and RT prefix (reused by the formatter)
+    tweet_header = text_utils.parse_tweet_header(original_text)
+    action_type, username = tweet_header.action_type, tweet_header.username
+    if not username and original_text:
+        logger.warning(f"{log_prefix}Could not extract any username/action structure from text: '{original_text[:70]}...'")
     logger.info(f"{log_prefix}Analyzed text: Action='{action_type}', User='{username}'")
 
-    # --- Prepare Common Data & Initial Cache ---
-    context_id = uuid.uuid4().hex
+    # --- Prepare Common Data & Deep Link ---
+    # The link target is only stored by record_deep_link_context(), once the message passed the button/dedupe checks
     initial_cache_data = {'text': original_text, 'media_type': media_type, 'file_id': None}
-    # Store initial data in cache immediately
-    context_cache.add_to_cache(context_id, initial_cache_data)
-    logger.debug(f"{log_prefix}Stored initial data in cache (ID: {context_id}).")
+    deep_link_index = get_deep_link_index()
+    if deep_link_index is not None:
+        # Signed link to the source message ID; the content goes to the persistent index, not memory
+        context_id = deep_link_index.make_payload(message_id)
+    else:
+        # Index unavailable: fall back to the in-memory context cache (link lives until the TTL/restart)
+        context_id = f"deploy_{uuid.uuid4().hex}"
 
-    deploy_deep_link = f"https://t.me/{bot_username}?start=deploy_{context_id}"
+    deploy_deep_link = f"https://t.me/{bot_username}?start={context_id}"
     logger.debug(f"{log_prefix}Generated deploy deep link: {deploy_deep_link}")
 
     return MessageAnalysisResult(
@@ -81,9 +94,24 @@ async def analyze_message(message: Message, target_bot: Bot) -> MessageAnalysisR
         original_text=original_text,
         media_type=media_type,
         tweet_url=tweet_url,
+        tweet_status_id=tweet_status_id,
         action_type=action_type,
         username=username,
+        tweet_header=tweet_header,
         context_id=context_id,
         deploy_deep_link=deploy_deep_link,
         initial_cache_data=initial_cache_data,
-    )
\ No newline at end of file
+    )
+
+def record_deep_link_context(analysis_result: MessageAnalysisResult):
+    """Stores the content behind the deploy deep link (deep link index, or the in-memory cache for 'deploy_' links)."""
+    log_prefix = analysis_result.log_prefix
+    context_id = analysis_result.context_id
+    deep_link_index = get_deep_link_index()
+    if deep_link_index is not None and not context_id.startswith("deploy_"):
+        deep_link_index.record(analysis_result.message_id, analysis_result.original_text, analysis_result.media_type)
+        logger.debug(f"{log_prefix}Indexed deep link context (payload: {context_id}).")
+    else:
+        cache_id = context_id.removeprefix("deploy_")
+        context_cache.add_to_cache(cache_id, analysis_result.initial_cache_data)
+        logger.debug(f"{log_prefix}Stored initial data in cache (ID: {cache_id}).")
@@ -1,7 +1,6 @@
 # handlers/message_processing/content_formatter.py
 import logging
 import html
-import re
 from dataclasses import dataclass
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
@@ -43,30 +42,20 @@ def format_fxtwitter_message_html(action_type: str | None, username: str | None,
     return f'{emoji}<b>{safe_action_text}</b> from <a href="{safe_url}">{safe_username}</a>'
 
 
-def format_full_message_body_html(original_text: str, action_type: str | None) -> str:
+def format_full_message_body_html(original_text: str, action_type: str | None, tweet_header: text_utils.TweetHeader | None = None) -> str:
     """Formats the main body of the message for Full Mode, handling RT prefix."""
-    body_start_index = -1
-    if "\n\n" in original_text: body_start_index = original_text.find("\n\n") + 2
-    elif "\n" in original_text: body_start_index = original_text.find("\n") + 1
-    message_body_raw = original_text[body_start_index:].strip() if body_start_index != -1 else original_text # Fallback to full text if no separator
-
-    formatted_body = ""
-    if action_type == "Retweet":
-        # Regex to find optional **RT** (with optional spaces) at the beginning
-        # Captures the part *after* the RT prefix. Case-insensitive, handles multi-line.
-        rt_match = re.match(r"^\**\s*RT\s*\**\s*(.*)", message_body_raw, re.IGNORECASE | re.DOTALL)
-        if rt_match:
-            prefix = "<b>RT</b>"
-            rest_of_body = rt_match.group(1).strip() # Get content after RT
-            # Escape the rest of the body to prevent unintended HTML
-            formatted_body = f"{prefix} {html.escape(rest_of_body)}"
-            logger.debug("Applied specific RT formatting.")
-        else:
-            logger.debug("Retweet action, but RT prefix not found/matched. Escaping full body.")
-            formatted_body = html.escape(message_body_raw)
+    # Reuse the header parsed during analysis instead of rescanning the text
+    if tweet_header is None:
+        tweet_header = text_utils.parse_tweet_header(original_text)
+
+    if action_type == "Retweet" and tweet_header.has_rt_prefix:
+        # Escape the rest of the body to prevent unintended HTML
+        formatted_body = f"<b>RT</b> {html.escape(tweet_header.body)}"
+        logger.debug("Applied specific RT formatting.")
     else:
-        # Not a Retweet, just escape the whole body
-        formatted_body = html.escape(message_body_raw)
+        if action_type == "Retweet":
+            logger.debug("Retweet action, but RT prefix not found/matched. Escaping full body.")
+        formatted_body = html.escape(tweet_header.body)
 
     return formatted_body
 
@@ -127,7 +116,8 @@ def format_content_for_targets(analysis_result: MessageAnalysisResult, needs_fxt
         # Format the body
         formatted_body = format_full_message_body_html(
             analysis_result.original_text,
-            analysis_result.action_type
+            analysis_result.action_type,
+            analysis_result.tweet_header
         )
 
         # Combine header and formatted body
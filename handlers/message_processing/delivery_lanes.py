@@ -0,0 +1,139 @@
+# handlers/message_processing/delivery_lanes.py
+import asyncio
+import logging
+from typing import Coroutine, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class LaneDispatcher:
+    """
+    Lane-per-chat dispatcher: sends to the same chat run one after another in source order,
+    different chats run fully in parallel.
+
+    Each lane is just the "tail" future of the last message reserved for that chat. A lane
+    whose tail has completed is removed, so idle chats cost no memory.
+    """
+
+    def __init__(self):
+        self._tails: dict[int, asyncio.Future] = {}
+
+    @property
+    def active_lanes(self) -> int:
+        return len(self._tails)
+
+    def open_batch(self, chat_ids: Iterable[int]) -> "LaneBatch":
+        """
+        Reserves a slot in each chat's lane for one source message.
+        Must be called synchronously in source-message order (before the pipeline's first await).
+        """
+        return LaneBatch(self, chat_ids)
+
+    def _release(self, chat_id: int, done: asyncio.Future):
+        if not done.done():
+            done.set_result(None)
+        if self._tails.get(chat_id) is done: # Nothing queued behind us -> reclaim the idle lane
+            del self._tails[chat_id]
+
+
+class LaneBatch:
+    """The lane reservations of one source message. Always close() it when the message is finished."""
+    __slots__ = ('_dispatcher', '_prev', '_done')
+
+    def __init__(self, dispatcher: LaneDispatcher, chat_ids: Iterable[int]):
+        self._dispatcher = dispatcher
+        self._prev: dict[int, asyncio.Future | None] = {}
+        self._done: dict[int, asyncio.Future] = {}
+        loop = asyncio.get_running_loop()
+        tails = dispatcher._tails
+        for chat_id in chat_ids:
+            if chat_id in self._done:
+                continue
+            done = loop.create_future()
+            self._prev[chat_id] = tails.get(chat_id)
+            self._done[chat_id] = done
+            tails[chat_id] = done
+
+    def split(self, count: int) -> list["LaneBatch"]:
+        """
+        Divides the reservations into count consecutive batches in the same lane slots (e.g. one
+        per album part sent separately). This batch is left empty.
+        """
+        batches = [LaneBatch(self._dispatcher, ()) for _ in range(count)]
+        if not batches:
+            return batches
+        loop = asyncio.get_running_loop()
+        for chat_id, done in self._done.items():
+            prev = self._prev[chat_id]
+            for batch in batches[:-1]:
+                batch._prev[chat_id] = prev
+                batch._done[chat_id] = prev = loop.create_future()
+            batches[-1]._prev[chat_id] = prev
+            batches[-1]._done[chat_id] = done
+        self._prev.clear()
+        self._done.clear()
+        return batches
+
+    def submit(self, chat_id: int, coro: Coroutine) -> asyncio.Task:
+        """Runs coro in chat_id's lane once every earlier message for that chat is delivered."""
+        if chat_id not in self._done:
+            # Target not reserved by this batch (e.g. added after the batch was opened): run unordered
+            return asyncio.create_task(coro)
+        prev = self._prev.pop(chat_id)
+        done = self._done.pop(chat_id)
+        return asyncio.create_task(self._run_in_lane(chat_id, prev, done, coro))
+
+    async def wait_turn(self, chat_ids: Iterable[int]):
+        """
+        Waits until every earlier message is done with these chats (delivered, or handed over
+        with release()). Used before publishing sends to another process.
+        """
+        pending = {}
+        for chat_id in chat_ids:
+            prev = self._prev.get(chat_id)
+            if prev is not None and not prev.done():
+                pending[id(prev)] = prev
+        if pending:
+            await asyncio.wait(pending.values())
+
+    def release(self, chat_ids: Iterable[int]):
+        """Passes the turn of these chats on to the next message (their sends were handed over)."""
+        for chat_id in chat_ids:
+            done = self._done.pop(chat_id, None)
+            if done is not None:
+                self._prev.pop(chat_id, None)
+                self._dispatcher._release(chat_id, done)
+
+    async def _run_in_lane(self, chat_id: int, prev: asyncio.Future | None, done: asyncio.Future, coro: Coroutine):
+        started = False
+        try:
+            if prev is not None and not prev.done():
+                await asyncio.shield(prev)
+            started = True
+            return await coro
+        finally:
+            if not started:
+                coro.close() # Cancelled while waiting for the lane
+            self._dispatcher._release(chat_id, done)
+
+    def close(self):
+        """Releases every reservation that was not submitted (target skipped for this message)."""
+        for chat_id, done in self._done.items():
+            prev = self._prev[chat_id]
+            if prev is None or prev.done():
+                self._dispatcher._release(chat_id, done)
+            else:
+                # Keep the chain intact: pass the turn on only after the previous message
+                prev.add_done_callback(lambda _f, c=chat_id, d=done: self._dispatcher._release(c, d))
+        self._prev.clear()
+        self._done.clear()
+
+
+_dispatcher: LaneDispatcher | None = None
+
+def get_lane_dispatcher() -> LaneDispatcher:
+    """Returns the process-wide lane dispatcher."""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = LaneDispatcher()
+    return _dispatcher
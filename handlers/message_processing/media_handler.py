@@ -1,12 +1,18 @@
 # handlers/message_processing/media_handler.py
+import asyncio
+import dataclasses
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
 from telethon import TelegramClient
 from telegram import Bot
 
 from .analyzer import MessageAnalysisResult
-from utils import error_handler, context_cache
+from utils import error_handler, context_cache, identity_cache, file_id_cache
+from utils.deep_links import get_deep_link_index
 from utils.helpers import media_utils # Use specific helpers
+from config import settings
+from telegram_clients import bot_pool
 
 logger = logging.getLogger(__name__)
 
@@ -15,102 +21,271 @@ class MediaResult:
     """Holds the results of media processing."""
     media_type: str | None # The effective media type after processing
     file_id: str | None = None
-    content_bytes: bytes | None = None # Only if file_id couldn't be obtained
+    spooled: media_utils.SpooledMedia | None = None # Downloaded content, only if no file_id is known yet
+    on_file_id: Callable[[str], None] | None = None # Sender reports the file_id of the first delivery here
+    # Cached file_id only: drops the cache entry and downloads the content (sender calls it if Telegram rejects the file_id)
+    refetch: Callable[[], Awaitable[media_utils.SpooledMedia | None]] | None = None
+    staged_chat_id: int | None = None # Large media: posted to the staging chat by the user client,
+    staged_message_id: int | None = None # targets receive a copy_message of it (no Bot API upload)
+    upload_count: int = 0 # Uploads of the content performed by the sender (expected: at most 1)
+
+    def close(self):
+        """Releases downloaded content (memory buffer or temp file). Safe to call more than once."""
+        if self.spooled is not None:
+            self.spooled.close()
+            self.spooled = None
+
+
+@dataclass
+class AlbumMediaResult:
+    """Media of all usable album parts, in album order."""
+    parts: list[MediaResult] = field(default_factory=list)
+    upload_count: int = 0 # Media group uploads performed by the sender (expected: at most 1)
+
+    def close(self):
+        """Releases the downloaded content of every part. Safe to call more than once."""
+        for part in self.parts:
+            part.close()
+
+
+def get_bot_id(bot: Bot) -> int | None:
+    """Id of the given bot (file_ids are per bot), falling back to the identity cache."""
+    try:
+        return bot_pool.get_bot_id(bot)
+    except Exception:
+        return identity_cache.get_bot_id()
+
+
+def _is_deep_link_bot(bot: Bot) -> bool:
+    """Deep links point at the main bot, so only its file_ids belong in the context cache."""
+    main_bot_id = identity_cache.get_bot_id()
+    return main_bot_id is None or get_bot_id(bot) == main_bot_id
+
+
+async def _run_shared(shared: dict | None, key: str, factory):
+    """
+    Runs factory() once per key for all bots resolving the same message (shared=None: just run it).
+    The work lives in its own task so one bot giving up does not cancel it for the others.
+    """
+    if shared is None:
+        return await factory()
+    task = shared.get(key)
+    if task is None:
+        task = shared[key] = asyncio.ensure_future(factory())
+    return await asyncio.shield(task)
+
+
+def release_shared_media(shared: dict):
+    """Cancels unfinished shared work and drops the memo's reference to downloaded content."""
+    for task in shared.values():
+        if not task.done():
+            task.cancel() # The download helper removes its partial temp file on cancellation
+        elif not task.cancelled() and task.exception() is None and isinstance(task.result(), media_utils.SpooledMedia):
+            task.result().close()
+    shared.clear()
+
+
+def _store_file_id_in_context(analysis_result: MessageAnalysisResult, file_id: str, log_prefix: str):
+    """Adds the reusable file_id to the context behind the message's deep link."""
+    context_id = analysis_result.context_id
+    deep_link_index = get_deep_link_index()
+    if deep_link_index is not None and not context_id.startswith("deploy_"):
+        deep_link_index.set_file_id(analysis_result.message_id, file_id)
+        logger.debug(f"{log_prefix}Updated deep link index for message {analysis_result.message_id} with file_id.")
+        return
+    # Legacy in-memory context (index unavailable when the message was analyzed)
+    context_id = context_id.removeprefix("deploy_")
+    # Retrieve potentially updated cache data first
+    updated_cache_data = context_cache.get_from_cache(context_id) or analysis_result.initial_cache_data
+    updated_cache_data['file_id'] = file_id
+    context_cache.add_to_cache(context_id, updated_cache_data)
+    logger.debug(f"{log_prefix}Updated cache for {context_id} with file_id.")
+
+
+def _spool_max_memory_bytes() -> int:
+    """In Bot API local mode media must be on disk (the server reads it by path), so never keep it in RAM."""
+    return 0 if settings.BOT_API_LOCAL_MODE else settings.MEDIA_SPOOL_MAX_MEMORY_BYTES
+
+
+async def _resolve_media(
+    message,
+    media_type: str,
+    client: TelegramClient,
+    target_bot: Bot,
+    message_id: int,
+    log_prefix: str,
+    allow_staging: bool = True,
+    shared: dict | None = None
+) -> tuple[MediaResult, str | None]:
+    """
+    Returns (MediaResult, file_id cache key) for one Telethon message: a cached file_id if this
+    media was uploaded by target_bot before, a staged copy for media above the Bot API upload
+    limit, otherwise the downloaded content (or MediaResult(None)).
+    With shared (one dict per source message), several bots resolving the same media
+    download/stage it only once.
+    """
+    # 0. Same media already uploaded by this bot? Skip both download and upload.
+    cache_key = file_id_cache.make_key(get_bot_id(target_bot), media_utils.get_telethon_media_key(message))
+    cached = file_id_cache.get(cache_key)
+    if cached and cached.get('media_type') == media_type:
+        logger.info(f"{log_prefix}Reusing cached file_id for {media_type} (no download/upload).")
+        return MediaResult(media_type=media_type, file_id=cached['file_id']), cache_key
+
+    # 0.5. Too large for a Bot API upload? Route through the user client instead of a wasted download.
+    size = media_utils.get_telethon_media_size(message)
+    if size is not None and size > settings.LARGE_MEDIA_THRESHOLD_BYTES:
+        if not (allow_staging and settings.STAGING_CHAT_ID):
+            logger.warning(f"{log_prefix}Media is {size} bytes (limit {settings.LARGE_MEDIA_THRESHOLD_BYTES}) and no staging path is available. Skipping media.")
+            return MediaResult(media_type=None), cache_key
+        staged = await _run_shared(shared, f"stage:{message.id}", lambda: _stage_large_media(message, media_type, client, size, log_prefix))
+        return dataclasses.replace(staged), cache_key # Own copy per bot
+
+    spooled_media = await _run_shared(shared, f"download:{message.id}", lambda: _download_media(message, media_type, client, message_id, log_prefix))
+    if spooled_media is None:
+        return MediaResult(media_type=None), cache_key # Treat as no media
+    if shared is not None:
+        spooled_media.share() # The memo keeps its own reference until release_shared_media()
+    # Caller must close() the result once all sends are done
+    return MediaResult(media_type=media_type, spooled=spooled_media), cache_key
+
+
+async def _download_media(message, media_type: str, client: TelegramClient, message_id: int, log_prefix: str) -> media_utils.SpooledMedia | None:
+    """Downloads the media (memory or temp file). Returns None if it failed or was empty."""
+    logger.info(f"{log_prefix}Starting media processing ({media_type})...")
+    spooled_media = None
+
+    try:
+        # 1. Download Media
+        with error_handler.handle_errors(f"Media Download ({media_type})", message_id=message_id, raise_exception=True):
+            # Small media stays in memory, larger media is streamed into a temp file
+            spooled_media = await media_utils.download_media_spooled(
+                client, message, _spool_max_memory_bytes(), settings.MEDIA_TEMP_DIR or None
+            )
+            if not spooled_media:
+                logger.warning(f"{log_prefix}Media download returned empty content.")
+                # No point proceeding if download failed/empty
+                return None
+            logger.debug(f"{log_prefix}Downloaded {spooled_media.size} bytes ({'memory' if spooled_media.in_memory else 'temp file'}).")
+
+    except Exception as media_err:
+        logger.error(f"{log_prefix}Media processing failed: {media_err}. Full mode targets might get text fallback.", exc_info=True)
+        if spooled_media:
+            spooled_media.close() # Don't keep content if processing failed
+        return None
+
+    logger.info(f"{log_prefix}Finished media processing phase. Effective Type: {media_type}, Content: {spooled_media.size} bytes")
+    return spooled_media
+
+
+async def _stage_large_media(message, media_type: str, client: TelegramClient, size: int, log_prefix: str) -> MediaResult:
+    """Posts large media to the staging chat with the user client; the bot copies it from there."""
+    logger.info(f"{log_prefix}Media is {size} bytes: staging it in chat {settings.STAGING_CHAT_ID} via the user client.")
+    try:
+        staged_message_id = await media_utils.stage_media_via_client(
+            client, message, settings.STAGING_CHAT_ID, settings.MEDIA_TEMP_DIR or None
+        )
+    except Exception as e:
+        logger.error(f"{log_prefix}Staging large media failed: {e}. Full mode targets get text fallback.", exc_info=True)
+        return MediaResult(media_type=None)
+    if not staged_message_id:
+        logger.error(f"{log_prefix}Staging large media returned no message. Full mode targets get text fallback.")
+        return MediaResult(media_type=None)
+    logger.info(f"{log_prefix}Staged large {media_type} as message {staged_message_id}.")
+    return MediaResult(media_type=media_type, staged_chat_id=settings.STAGING_CHAT_ID, staged_message_id=staged_message_id)
 
 
 async def process_media_for_full_mode(
     analysis_result: MessageAnalysisResult,
     client: TelegramClient,
     target_bot: Bot,
-    first_full_target_id: int | None
+    shared: dict | None = None
 ) -> MediaResult:
     """
-    Downloads media, attempts to upload to get a reusable file_id,
-    and updates the cache.
-    Returns a MediaResult object.
+    Resolves the media for Full mode: a cached file_id if this media was uploaded before,
+    otherwise the downloaded content. Nothing is uploaded here; the sender uploads once
+    with the first real delivery and reports the file_id back through MediaResult.on_file_id.
+    Returns a MediaResult object (valid for target_bot only: file_ids are per bot).
     """
     media_type = analysis_result.media_type
     log_prefix = analysis_result.log_prefix.replace("[Analyze]", "[Media]")
-    context_id = analysis_result.context_id
-    message = analysis_result.original_message
 
     if not media_type:
         logger.debug(f"{log_prefix}No media detected in original message.")
         return MediaResult(media_type=None)
 
-    logger.info(f"{log_prefix}Starting media processing ({media_type})...")
-    media_content_bytes = None
-    reusable_file_id = None
+    media_result, cache_key = await _resolve_media(
+        analysis_result.original_message, media_type, client, target_bot, analysis_result.message_id, log_prefix,
+        shared=shared
+    )
+    store_in_context = _is_deep_link_bot(target_bot)
 
-    try:
-        # 1. Download Media
-        with error_handler.handle_errors(f"Media Download ({media_type})", message_id=analysis_result.message_id, raise_exception=True):
-            # Using file=bytes to get content directly
-            media_content_bytes = await client.download_media(message, file=bytes)
-            if not media_content_bytes:
-                logger.warning(f"{log_prefix}Media download returned empty content.")
-                # No point proceeding if download failed/empty
-                return MediaResult(media_type=None) # Treat as no media
-
-
-        # 2. Upload to get File ID (if possible and a target exists)
-        if media_content_bytes and first_full_target_id:
-            logger.info(f"{log_prefix}Attempting initial upload to chat {first_full_target_id} for file_id.")
-            send_info = media_utils.get_ptb_send_func_and_arg(media_type)
-            if send_info:
-                upload_func_name, arg_name = send_info
-                upload_func = getattr(target_bot, upload_func_name, None)
-                if upload_func:
-                    # Prepare arguments for the upload function
-                    # Caption is not strictly needed here, but sending it might ensure the file is processed correctly
-                    upload_args = {'chat_id': first_full_target_id, arg_name: media_content_bytes}
-                    sent_msg = None
-                    with error_handler.handle_errors(f"Initial media upload ({media_type})", chat_id=first_full_target_id, raise_exception=True):
-                        sent_msg = await upload_func(**upload_args)
-
-                    if sent_msg:
-                        reusable_file_id = media_utils.get_media_file_id(sent_msg)
-                        if reusable_file_id:
-                            logger.info(f"{log_prefix}Obtained reusable file_id.")
-                            # --- Update Cache with File ID ---
-                            # Retrieve potentially updated cache data first
-                            updated_cache_data = context_cache.get_from_cache(context_id) or analysis_result.initial_cache_data
-                            updated_cache_data['file_id'] = reusable_file_id
-                            context_cache.add_to_cache(context_id, updated_cache_data)
-                            logger.debug(f"{log_prefix}Updated cache for {context_id} with file_id.")
-                            # --- Delete Temporary Message ---
-                            try:
-                                await target_bot.delete_message(first_full_target_id, sent_msg.message_id)
-                                logger.debug(f"{log_prefix}Deleted temporary upload message {sent_msg.message_id} from {first_full_target_id}.")
-                            except Exception as del_err:
-                                logger.warning(f"{log_prefix}Failed to delete temporary upload message: {del_err}")
-                        else:
-                            logger.warning(f"{log_prefix}Initial upload succeeded but could not extract file_id from sent message.")
-                    else:
-                        logger.error(f"{log_prefix}Initial upload function returned None or failed silently.")
-                else:
-                    logger.error(f"{log_prefix}PTB media upload function '{upload_func_name}' not found.")
-            else:
-                logger.error(f"{log_prefix}Unsupported media type '{media_type}' for PTB file_id generation.")
-        elif not first_full_target_id:
-             logger.warning(f"{log_prefix}Media downloaded, but no 'Full Mode' target available for initial upload to get file_id.")
+    def on_file_id(file_id: str):
+        # Called by the sender once the first delivery returned a file_id
+        file_id_cache.put(cache_key, file_id, media_type)
+        if store_in_context:
+            _store_file_id_in_context(analysis_result, file_id, log_prefix)
 
+    if media_result.file_id:
+        if store_in_context:
+            _store_file_id_in_context(analysis_result, media_result.file_id, log_prefix)
 
-    except Exception as media_err:
-        logger.error(f"{log_prefix}Media processing failed: {media_err}. Full mode targets might get text fallback.", exc_info=True)
-        # Reset media info on error
-        media_type = None
-        reusable_file_id = None
-        media_content_bytes = None # Don't keep bytes if processing failed
-
-    logger.info(f"{log_prefix}Finished media processing phase. Effective Type: {media_type}, File ID: {bool(reusable_file_id)}, Bytes: {bool(media_content_bytes)}")
-
-    # Return result, prioritizing file_id
-    if reusable_file_id:
-        return MediaResult(media_type=media_type, file_id=reusable_file_id)
-    elif media_content_bytes:
-        # Only return bytes if file_id wasn't obtained (fallback)
-        return MediaResult(media_type=media_type, content_bytes=media_content_bytes)
-    else:
-        # No media could be successfully processed
-        return MediaResult(media_type=None)
\ No newline at end of file
+        async def refetch() -> media_utils.SpooledMedia | None:
+            file_id_cache.invalidate(cache_key)
+            return await _download_media(analysis_result.original_message, media_type, client, analysis_result.message_id, log_prefix)
+
+        media_result.refetch = refetch
+        media_result.on_file_id = on_file_id
+    elif media_result.spooled:
+        media_result.on_file_id = on_file_id
+    return media_result
+
+
+async def process_album_media_for_full_mode(
+    analysis_result: MessageAnalysisResult,
+    messages: list,
+    client: TelegramClient,
+    target_bot: Bot,
+    shared: dict | None = None
+) -> AlbumMediaResult:
+    """
+    Resolves every part of an album in parallel (cached file_id or download).
+    Parts that fail are left out; the sender decides whether enough remain for a media group.
+    """
+    log_prefix = analysis_result.log_prefix.replace("[Analyze]", "[Media]")
+
+    async def resolve_part(index: int, message) -> MediaResult:
+        part_prefix = f"{log_prefix}Part {index + 1}/{len(messages)}: "
+        media_type = media_utils.get_telethon_media_type(message)
+        # Media groups need uploads or file_ids: parts above the upload limit are left out
+        media_result, cache_key = await _resolve_media(message, media_type, client, target_bot, message.id, part_prefix, allow_staging=False, shared=shared)
+        if media_result.file_id:
+            # Like single media: if Telegram rejects the cached file_id, the sender downloads the part again
+            async def refetch() -> media_utils.SpooledMedia | None:
+                file_id_cache.invalidate(cache_key)
+                return await _download_media(message, media_type, client, message.id, part_prefix)
+
+            media_result.refetch = refetch
+        if media_result.file_id or media_result.spooled:
+            media_result.on_file_id = lambda file_id: file_id_cache.put(cache_key, file_id, media_type)
+        return media_result
+
+    results = await asyncio.gather(*(resolve_part(i, m) for i, m in enumerate(messages)), return_exceptions=True)
+    album_result = AlbumMediaResult(parts=[r for r in results if isinstance(r, MediaResult) and r.media_type])
+    for r in results:
+        if isinstance(r, BaseException):
+            logger.error(f"{log_prefix}Album part failed: {r}")
+
+    # The deep link re-posts a single media: use the first part that already has a file_id
+    first = album_result.parts[0] if album_result.parts else None
+    if first is not None and _is_deep_link_bot(target_bot):
+        if first.file_id:
+            _store_file_id_in_context(analysis_result, first.file_id, log_prefix)
+        elif first.on_file_id:
+            store_part = first.on_file_id
+            def on_first_file_id(file_id: str):
+                store_part(file_id)
+                _store_file_id_in_context(analysis_result, file_id, log_prefix)
+            first.on_file_id = on_first_file_id
+
+    logger.info(f"{log_prefix}Album media ready: {len(album_result.parts)}/{len(messages)} part(s).")
+    return album_result
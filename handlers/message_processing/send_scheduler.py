@@ -0,0 +1,173 @@
+# handlers/message_processing/send_scheduler.py
+import asyncio
+import datetime
+import logging
+import time
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Reservation-based token bucket. reserve() always takes a token and returns how long
+    the caller has to wait for it (tokens may go negative = queued reservations).
+    """
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """Consumes one token and returns the delay (seconds) until it is actually available."""
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def is_idle(self, now: float) -> bool:
+        """True if the bucket is full again, i.e. dropping it loses no state."""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+def retry_after_seconds(retry_after) -> float:
+    """Normalizes RetryAfter.retry_after (int seconds or timedelta depending on PTB version)."""
+    if isinstance(retry_after, datetime.timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class SendScheduler:
+    """
+    Rate-limit-aware gate in front of every Bot API send.
+    - Global bucket: ~30 msg/s per bot.
+    - Per-chat buckets: ~20 msg/min for groups, ~1 msg/s for private chats.
+    - Chats that received RetryAfter are parked until the flood wait has passed.
+    """
+
+    # Reclaim idle per-chat buckets every N acquisitions (keeps memory flat with many groups)
+    _RECLAIM_EVERY = 1000
+
+    def __init__(self, global_rate: float, global_burst: float, group_rate_per_min: float, group_burst: float, private_rate: float = 1.0):
+        self._global_bucket = TokenBucket(global_rate, global_burst)
+        self._group_rate = group_rate_per_min / 60.0
+        self._group_burst = group_burst
+        self._private_rate = private_rate
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._parked_until: dict[int, float] = {}
+        self._acquire_count = 0
+
+        # Counters
+        self.acquired_total = 0
+        self.throttled_total = 0
+        self.throttle_wait_total = 0.0
+        self.retry_after_total = 0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if chat_id < 0: # Groups, supergroups and channels
+                bucket = TokenBucket(self._group_rate, self._group_burst)
+            else:
+                bucket = TokenBucket(self._private_rate, 1)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _reclaim_idle(self, now: float):
+        for chat_id in [cid for cid, bucket in self._chat_buckets.items() if bucket.is_idle(now)]:
+            del self._chat_buckets[chat_id]
+        for chat_id in [cid for cid, until in self._parked_until.items() if until <= now]:
+            del self._parked_until[chat_id]
+
+    async def acquire(self, chat_id: int):
+        """Waits until a send to chat_id is allowed by the chat lane and the global budget."""
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            parked_until = self._parked_until.get(chat_id)
+            if parked_until and parked_until > now:
+                delay = parked_until - now
+                waited += delay
+                await asyncio.sleep(delay)
+                continue
+
+            # Chat lane first, so a slow group never holds a global token while it waits
+            delay = self._chat_bucket(chat_id).reserve(now)
+            if delay > 0:
+                waited += delay
+                await asyncio.sleep(delay)
+                # Parked while we were waiting? Start over (the reservation is simply spent)
+                if self._parked_until.get(chat_id, 0) > time.monotonic():
+                    continue
+
+            delay = self._global_bucket.reserve(time.monotonic())
+            if delay > 0:
+                waited += delay
+                await asyncio.sleep(delay)
+            break
+
+        self.acquired_total += 1
+        if waited > 0:
+            self.throttled_total += 1
+            self.throttle_wait_total += waited
+
+        self._acquire_count += 1
+        if self._acquire_count >= self._RECLAIM_EVERY:
+            self._acquire_count = 0
+            self._reclaim_idle(time.monotonic())
+
+    def park(self, chat_id: int, seconds: float):
+        """Parks a chat lane after a RetryAfter/flood-wait; other chats are unaffected."""
+        self.retry_after_total += 1
+        until = time.monotonic() + max(0.0, seconds)
+        if until > self._parked_until.get(chat_id, 0):
+            self._parked_until[chat_id] = until
+        logger.warning(f"Flood control for chat {chat_id}: lane parked for {seconds:.1f}s.")
+
+    def get_stats(self) -> dict:
+        return {
+            'acquired_total': self.acquired_total,
+            'throttled_total': self.throttled_total,
+            'throttle_wait_total': self.throttle_wait_total,
+            'retry_after_total': self.retry_after_total,
+            'chat_buckets': len(self._chat_buckets),
+            'parked_chats': sum(1 for until in self._parked_until.values() if until > time.monotonic()),
+        }
+
+
+# One scheduler per bot: Telegram's limits apply per bot token
+_schedulers: dict[int | None, SendScheduler] = {}
+# Fraction of each bot's global budget this process may use (egress workers split it between them)
+_global_share = 1.0
+
+
+def set_global_share(share: float):
+    """Scales the per-bot global budget of schedulers created from now on."""
+    global _global_share
+    _global_share = min(1.0, max(0.01, share))
+
+
+def get_scheduler(bot_id: int | None = None) -> SendScheduler:
+    """Returns the send scheduler of a bot (created from settings on first use)."""
+    scheduler = _schedulers.get(bot_id)
+    if scheduler is None:
+        scheduler = _schedulers[bot_id] = SendScheduler(
+            global_rate=settings.SEND_GLOBAL_RATE * _global_share,
+            global_burst=max(1.0, settings.SEND_GLOBAL_BURST * _global_share),
+            group_rate_per_min=settings.SEND_GROUP_RATE_PER_MIN,
+            group_burst=settings.SEND_GROUP_BURST,
+        )
+    return scheduler
+
+
+def get_all_stats() -> dict:
+    """Scheduler counters per bot id."""
+    return {bot_id: scheduler.get_stats() for bot_id, scheduler in _schedulers.items()}
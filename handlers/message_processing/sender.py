@@ -1,107 +1,265 @@
 # handlers/message_processing/sender.py
 import asyncio
+import contextlib
 import logging
-from telegram import Bot
-from telegram.error import TelegramError, ChatMigrated
-from config import persistent_config, group_config
+import time
+from typing import Callable
+from telegram import Bot, InputMediaPhoto, InputMediaVideo
+from telegram.error import TelegramError, ChatMigrated, RetryAfter
+from config import settings, persistent_config, group_config, shard_config
+from telegram_clients import bot_pool
+from utils import logging_config, metrics
+from utils.outbox import get_outbox
+from utils.latency_ledger import DeliveryRecord
 from utils.helpers import media_utils
 
 # Import necessary types/classes from other processing modules
 from .analyzer import MessageAnalysisResult
 from .content_formatter import ContentPayload
-from .media_handler import MediaResult
+from .media_handler import MediaResult, AlbumMediaResult
+from .send_scheduler import get_scheduler, retry_after_seconds
+from .delivery_lanes import LaneBatch
 
 logger = logging.getLogger(__name__)
 
+# --- Metrics (children bound once: a sample is one increment / bisect) ---
+SEND_MODE_FXTWITTER = 'fxtwitter'
+SEND_MODE_FULL = 'full'
+SEND_MODE_ALBUM = 'album'
+_SEND_OUTCOMES = ('success', 'failure', 'error', 'cancelled')
+_sends_total = metrics.counter('sends_total', 'Target sends by mode and outcome.', ('mode', 'outcome'))
+_send_seconds = metrics.histogram('send_seconds', 'Per-send latency from scheduling to completion (lane, rate limits, retries).', ('mode',))
+_send_outcome_counters = {
+    mode: {outcome: _sends_total.labels(mode, outcome) for outcome in _SEND_OUTCOMES}
+    for mode in (SEND_MODE_FXTWITTER, SEND_MODE_FULL, SEND_MODE_ALBUM)
+}
+_send_latency = {mode: _send_seconds.labels(mode) for mode in _send_outcome_counters}
+_request_seconds = metrics.histogram('bot_api_send_seconds', 'Duration of successful Bot API send calls.').labels()
+_upload_seconds = metrics.histogram('initial_upload_seconds', 'First delivery of downloaded media (the one real upload per message).', ('kind',))
+_upload_single = _upload_seconds.labels('single')
+_upload_album = _upload_seconds.labels('album')
+
+# --- Chat migrations / removals found while sending ---
+EVENT_CHAT_MIGRATED = 'chat_migrated'
+EVENT_CHAT_REMOVED = 'chat_removed'
+
+# Egress worker processes do not own the configuration: they report chat events through this sink
+# and the ingest process applies them (apply_chat_migration / apply_chat_removal)
+_chat_event_sink: Callable[[tuple], None] | None = None
+
+
+def set_chat_event_sink(sink: Callable[[tuple], None] | None):
+    global _chat_event_sink
+    _chat_event_sink = sink
+
+
+async def apply_chat_migration(old_chat_id: int, new_chat_id: int, log_prefix: str = ""):
+    """Moves a target group to its new (supergroup) chat id in every registry."""
+    # Use persistent config to update the group list
+    removed_old = await persistent_config.remove_target_group(old_chat_id)
+    added_new = await persistent_config.add_target_group(new_chat_id)
+    logger.info(f"{log_prefix}Persistent group update: removed {old_chat_id} ({removed_old}), added {new_chat_id} ({added_new}).")
+    shard_config.migrate_chat(old_chat_id, new_chat_id)
+
+    # Carry the display mode over (also updates the per-mode partitions)
+    try:
+        mode_copied = group_config.migrate_group(old_chat_id, new_chat_id)
+        if mode_copied:
+            logger.info(f"{log_prefix}Copied display mode '{mode_copied}' from {old_chat_id} to {new_chat_id}.")
+        else:
+            logger.debug(f"{log_prefix}Old chat {old_chat_id} used default mode, new chat {new_chat_id} will also use default.")
+    except Exception as config_update_err:
+        logger.error(f"{log_prefix}Failed to update group_config display mode for migration: {config_update_err}")
+
+
+async def apply_chat_removal(chat_id: int, bot_id: int | None, log_prefix: str = ""):
+    """bot_id lost access to chat_id: hand the chat to another of our bots, or drop the target."""
+    # Another of our bots may still be in the chat: hand it over instead of dropping the target
+    remaining_bot = shard_config.remove_member(chat_id, bot_id) if bot_id else None
+    if remaining_bot is not None:
+        logger.info(f"{log_prefix}Chat is now served by bot {remaining_bot}. Keeping it as a target.")
+        return
+    await persistent_config.remove_target_group(chat_id)
+    shard_config.forget_chat(chat_id)
+    group_config.remove_group(chat_id)
+
+
+async def _on_chat_migrated(old_chat_id: int, new_chat_id: int, log_prefix: str):
+    if _chat_event_sink is not None:
+        _chat_event_sink((EVENT_CHAT_MIGRATED, old_chat_id, new_chat_id))
+        return
+    await apply_chat_migration(old_chat_id, new_chat_id, log_prefix)
+
+
+async def _on_chat_removed(chat_id: int, bot_id: int | None, log_prefix: str):
+    if _chat_event_sink is not None:
+        _chat_event_sink((EVENT_CHAT_REMOVED, chat_id, bot_id))
+        return
+    await apply_chat_removal(chat_id, bot_id, log_prefix)
+
+
 # --- execute_send function (Moved here, slightly adapted) ---
 async def execute_send(
-    send_func, send_args: dict, semaphore: asyncio.Semaphore, log_prefix: str, operation_desc: str = "Send message"
+    send_func, send_args: dict, semaphore: asyncio.Semaphore, log_prefix: str, operation_desc: str = "Send message",
+    on_file_id_rejected: Callable[[], None] | None = None
 ) -> bool:
     """
-    Executes a single send operation with semaphore, retries, and error handling.
+    Executes a single send operation through the send scheduler (rate limits + flood waits),
+    with semaphore, retries, and error handling.
     Returns True on success, False on failure.
+    on_file_id_rejected is called when Telegram refuses the file_id the send referenced.
     """
-    async with semaphore:
-        current_chat_id = send_args.get("chat_id")
-        if not current_chat_id:
-            logger.error(f"{log_prefix}Missing chat_id in send_args. Cannot execute send.")
-            return False
+    success, _ = await execute_send_with_result(send_func, send_args, semaphore, log_prefix, operation_desc, on_file_id_rejected)
+    return success
 
-        max_retries = 1 # Allow one retry, e.g., after migration
-        retries = 0
-        success = False
-        original_log_prefix = log_prefix # Keep original for logging
 
-        while retries <= max_retries:
-            try:
-                # Ensure chat_id is correctly set for this attempt
-                send_args['chat_id'] = current_chat_id
-                log_prefix_attempt = f"{original_log_prefix}Target {current_chat_id}: " # Log with current target
+# Bad Request texts for a file_id Telegram no longer accepts (expired, from another bot, ...)
+_FILE_ID_REJECTED_ERRORS = ("wrong file identifier", "wrong remote file identifier", "file_reference")
+# Errors about the target chat itself (not the content): sending anything else there fails the same way
+_PERMANENT_CHAT_ERRORS = ("bot was blocked", "user is deactivated", "chat not found",
+                          "bot is not a member", "group chat was deactivated",
+                          "need administrator rights", "chat_write_forbidden",
+                          "have no rights to send", "peer_id_invalid")
+_CHAT_REMOVED_ERRORS = ("bot is not a member", "bot was blocked", "chat not found", "group chat was deactivated")
 
-                await send_func(**send_args)
-                logger.info(f"{log_prefix_attempt}Successfully sent '{operation_desc}'.")
-                success = True
-                break # Exit loop on success
-
-            except ChatMigrated as cm_error:
-                old_chat_id = current_chat_id
-                new_chat_id = cm_error.new_chat_id
-                logger.warning(f"{log_prefix_attempt}Chat migrated from {old_chat_id} to {new_chat_id}. Updating config and retrying...")
-
-                # Use persistent config to update the group list
-                removed_old = await persistent_config.remove_target_group(old_chat_id)
-                added_new = await persistent_config.add_target_group(new_chat_id)
-                logger.info(f"{log_prefix_attempt}Persistent group update: removed {old_chat_id} ({removed_old}), added {new_chat_id} ({added_new}).")
-
-                # Update in-memory group mode settings
-                try:
-                    # Check if old chat had a specific mode set
-                    if old_chat_id in group_config._group_settings:
-                        mode_to_copy = group_config.get_group_mode(old_chat_id)
-                        # Set mode for new chat ID
-                        group_config.set_group_mode(new_chat_id, mode_to_copy)
-                        # Remove old chat ID from settings AFTER copying
-                        del group_config._group_settings[old_chat_id]
-                        logger.info(f"{log_prefix_attempt}Copied display mode '{mode_to_copy}' from {old_chat_id} to {new_chat_id}.")
-                    else:
-                        logger.debug(f"{log_prefix_attempt}Old chat {old_chat_id} used default mode, new chat {new_chat_id} will also use default.")
-                except Exception as config_update_err:
-                    logger.error(f"{log_prefix_attempt}Failed to update group_config display mode for migration: {config_update_err}")
-
-                # Update chat_id for the retry
-                current_chat_id = new_chat_id
-                retries += 1 # Consume a retry attempt
-
-            except TelegramError as e:
-                error_msg = str(e).lower()
-                # Determine log level based on error type
-                log_level = logging.ERROR
-                permanent_errors = ["bot was blocked", "user is deactivated", "chat not found",
-                                    "bot is not a member", "group chat was deactivated",
-                                    "need administrator rights", "chat_write_forbidden",
-                                    "have no rights to send", "peer_id_invalid"]
-                if any(term in error_msg for term in permanent_errors):
-                    log_level = logging.WARNING # Treat as non-critical failure for this target
-                    logger.log(log_level, f"{log_prefix_attempt}Failed '{operation_desc}' (Permanent Error): {e}. Removing target if applicable.")
-                    # Optionally remove the group here if the error indicates removal is appropriate
-                    if "bot is not a member" in error_msg or "bot was blocked" in error_msg or "chat not found" in error_msg or "group chat was deactivated" in error_msg:
-                         await persistent_config.remove_target_group(current_chat_id)
-                         # Also remove from in-memory settings if present
-                         if current_chat_id in group_config._group_settings: del group_config._group_settings[current_chat_id]
 
-                else:
-                    # Log other TelegramErrors as ERROR
-                    logger.log(log_level, f"{log_prefix_attempt}Failed '{operation_desc}': {e}", exc_info=True) # Include traceback
+async def execute_send_with_result(
+    send_func, send_args: dict, semaphore: asyncio.Semaphore, log_prefix: str, operation_desc: str = "Send message",
+    on_file_id_rejected: Callable[[], None] | None = None,
+    on_chat_error: Callable[[], None] | None = None
+) -> tuple[bool, object | None]:
+    """
+    Same as execute_send, but returns (success, sent message) so callers can read e.g. the file_id.
+    on_chat_error is called when the send failed because of the target chat (kicked, chat not found, ...).
+    """
+    current_chat_id = send_args.get("chat_id")
+    if not current_chat_id:
+        logger.error(f"{log_prefix}Missing chat_id in send_args. Cannot execute send.")
+        return False, None
 
-                # Break loop after TelegramError (no more retries needed)
-                break
-            except Exception as e:
-                # Catch any other unexpected errors
-                logger.error(f"{log_prefix_attempt}Unexpected error during '{operation_desc}': {e}", exc_info=True)
-                # Break loop after unexpected error
+    # Rate budgets are per bot: sends of different shard bots never throttle each other
+    sending_bot = getattr(send_func, '__self__', None)
+    bot_id = bot_pool.get_bot_id(sending_bot) if isinstance(sending_bot, Bot) else None
+    scheduler = get_scheduler(bot_id)
+    max_retries = 1 # Allow one retry, e.g., after migration
+    retries = 0
+    flood_retries = 0 # RetryAfter retries are counted separately
+    success = False
+    sent_message = None
+    original_log_prefix = log_prefix # Keep original for logging
+
+    while retries <= max_retries:
+        # Ensure chat_id is correctly set for this attempt
+        send_args['chat_id'] = current_chat_id
+        log_prefix_attempt = f"{original_log_prefix}Target {current_chat_id}: " # Log with current target
+        try:
+            # Wait for the chat lane / global budget BEFORE taking a concurrency slot
+            await scheduler.acquire(current_chat_id)
+            async with semaphore:
+                request_started = time.perf_counter()
+                sent_message = await send_func(**send_args)
+                _request_seconds.observe(time.perf_counter() - request_started)
+            if logging_config.sample_send_success():
+                logger.info(f"{log_prefix_attempt}Successfully sent '{operation_desc}'.")
+            elif logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"{log_prefix_attempt}Successfully sent '{operation_desc}'.")
+            success = True
+            break # Exit loop on success
+
+        except RetryAfter as ra_error:
+            wait_seconds = retry_after_seconds(ra_error.retry_after)
+            scheduler.park(current_chat_id, wait_seconds)
+            flood_retries += 1
+            if flood_retries > settings.SEND_MAX_FLOOD_RETRIES:
+                logger.error(f"{log_prefix_attempt}Failed '{operation_desc}': still flood-limited after {settings.SEND_MAX_FLOOD_RETRIES} retries.")
                 break
+            logger.warning(f"{log_prefix_attempt}Flood control on '{operation_desc}'. Retrying in {wait_seconds:.1f}s (attempt {flood_retries}/{settings.SEND_MAX_FLOOD_RETRIES}).")
+            # Loop again: scheduler.acquire() waits until the lane is unparked
 
-        return success
+        except ChatMigrated as cm_error:
+            old_chat_id = current_chat_id
+            new_chat_id = cm_error.new_chat_id
+            logger.warning(f"{log_prefix_attempt}Chat migrated from {old_chat_id} to {new_chat_id}. Updating config and retrying...")
+
+            await _on_chat_migrated(old_chat_id, new_chat_id, log_prefix_attempt)
+
+            # Update chat_id for the retry
+            current_chat_id = new_chat_id
+            retries += 1 # Consume a retry attempt
+
+        except TelegramError as e:
+            error_msg = str(e).lower()
+            # Determine log level based on error type
+            log_level = logging.ERROR
+            if any(term in error_msg for term in _PERMANENT_CHAT_ERRORS):
+                log_level = logging.WARNING # Treat as non-critical failure for this target
+                logger.log(log_level, f"{log_prefix_attempt}Failed '{operation_desc}' (Permanent Error): {e}. Removing target if applicable.")
+                # Optionally remove the group here if the error indicates removal is appropriate
+                if any(term in error_msg for term in _CHAT_REMOVED_ERRORS):
+                     await _on_chat_removed(current_chat_id, bot_id, log_prefix_attempt)
+                if on_chat_error is not None:
+                    on_chat_error()
+
+            elif on_file_id_rejected is not None and any(term in error_msg for term in _FILE_ID_REJECTED_ERRORS):
+                log_level = logging.WARNING # The caller falls back to uploading the content
+                logger.log(log_level, f"{log_prefix_attempt}Failed '{operation_desc}': file_id rejected ({e}).")
+                on_file_id_rejected()
+
+            else:
+                # Log other TelegramErrors as ERROR
+                logger.log(log_level, f"{log_prefix_attempt}Failed '{operation_desc}': {e}", exc_info=True) # Include traceback
+
+            # Break loop after TelegramError (no more retries needed)
+            break
+        except Exception as e:
+            # Catch any other unexpected errors
+            logger.error(f"{log_prefix_attempt}Unexpected error during '{operation_desc}': {e}", exc_info=True)
+            # Break loop after unexpected error
+            break
+
+    return success, sent_message
+
+
+async def _tracked_send(send_coro, mode: str, entry_id: int | None, delivery: DeliveryRecord | None = None):
+    """
+    Runs one target send: records its latency and outcome (and its delivery time in the
+    message's latency record), and clears its outbox entry once the send finished (even
+    unsuccessfully).
+    """
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        result = await send_coro
+        outcome = 'success' if result is True else 'failure'
+        if delivery is not None:
+            delivery.record(result is True)
+        return result
+    except asyncio.CancelledError:
+        outcome = 'cancelled'
+        entry_id = None # Not finished (shutdown): the entry stays for the next start
+        raise
+    finally:
+        _send_outcome_counters[mode][outcome].inc()
+        _send_latency[mode].observe(time.perf_counter() - started)
+        if entry_id is not None:
+            outbox = get_outbox()
+            if outbox is not None:
+                outbox.mark_done(entry_id)
+
+
+def _spawn_send(
+    lane_batch: LaneBatch | None, chat_id: int, send_coro, outbox_entries: dict[int, int] | None = None, mode: str = SEND_MODE_FULL,
+    delivery: DeliveryRecord | None = None
+) -> asyncio.Task:
+    """
+    Schedules a send in the chat's delivery lane (ordered per chat) or as a free task.
+    The chat's outbox entry (if any) is taken out of outbox_entries: this send now owns it.
+    """
+    entry_id = outbox_entries.pop(chat_id, None) if outbox_entries else None
+    send_coro = _tracked_send(send_coro, mode, entry_id, delivery)
+    if lane_batch is not None:
+        return lane_batch.submit(chat_id, send_coro)
+    return asyncio.create_task(send_coro)
 
 
 # --- NEW: Function to launch FXTwitter sends ---
@@ -110,7 +268,10 @@ def launch_fxtwitter_sends(
     fxtwitter_payload: ContentPayload | None,
     fxtwitter_targets: list[int],
     semaphore: asyncio.Semaphore,
-    log_prefix_send: str
+    log_prefix_send: str,
+    lane_batch: LaneBatch | None = None,
+    outbox_entries: dict[int, int] | None = None,
+    delivery: DeliveryRecord | None = None
 ) -> list[asyncio.Task]:
     """Creates and returns asyncio Tasks for sending FXTwitter messages."""
     tasks = []
@@ -130,13 +291,130 @@ def launch_fxtwitter_sends(
         send_args_fx = base_send_args.copy()
         send_args_fx['chat_id'] = chat_id
         tasks.append(
-            asyncio.create_task(
-                execute_send(target_bot.send_message, send_args_fx, semaphore, log_prefix_send, "Send FXTwitter message")
+            _spawn_send(
+                lane_batch, chat_id,
+                execute_send(target_bot.send_message, send_args_fx, semaphore, log_prefix_send, "Send FXTwitter message"),
+                outbox_entries, SEND_MODE_FXTWITTER, delivery
             )
         )
     logger.debug(f"{log_prefix_send}Created {len(tasks)} FXTwitter tasks.")
     return tasks
 
+class _UploadOnceState:
+    """
+    Shared by all full-mode sends of one message: the first target receives the real upload,
+    the file_id from that response is reused for every other target. With a cached file_id,
+    targets start with it and only upload if Telegram rejects it.
+    """
+    __slots__ = ('lock', 'file_id', 'cached_file_id', 'attempts', 'gave_up')
+
+    def __init__(self, cached_file_id: str | None = None):
+        self.lock = asyncio.Lock()
+        self.file_id = cached_file_id
+        self.cached_file_id = cached_file_id
+        self.attempts = 0
+        self.gave_up = False
+
+
+async def _send_full_upload_once(
+    state: _UploadOnceState,
+    media_send_func,
+    text_send_func,
+    base_send_args: dict,
+    media_arg_name: str,
+    media_result: MediaResult,
+    full_mode_payload: ContentPayload,
+    chat_id: int,
+    semaphore: asyncio.Semaphore,
+    log_prefix_send: str
+) -> bool:
+    """Full-mode send for one target; at most one upload of the bytes is in flight per message."""
+    media_type = media_result.media_type
+    if state.file_id is None and not state.gave_up:
+        async with state.lock: # Other targets wait here until the carrier upload is done
+            if state.file_id is None and not state.gave_up and not media_result.spooled and media_result.refetch:
+                # The cached file_id was rejected: download the content (once) and upload it instead
+                refetch, media_result.refetch = media_result.refetch, None
+                media_result.spooled = await refetch()
+                if not media_result.spooled:
+                    logger.error(f"{log_prefix_send}Could not download the media again. Remaining targets get text.")
+                    state.gave_up = True
+            if state.file_id is None and not state.gave_up and media_result.spooled:
+                chat_error = False
+
+                def on_chat_error():
+                    nonlocal chat_error
+                    chat_error = True
+
+                upload_args = base_send_args.copy()
+                upload_args['caption'] = full_mode_payload.caption
+                upload_args['chat_id'] = chat_id
+                with _upload_single.time(), media_result.spooled.open_upload(settings.BOT_API_LOCAL_MODE) as media_input:
+                    upload_args[media_arg_name] = media_input
+                    success, sent_message = await execute_send_with_result(
+                        media_send_func, upload_args, semaphore, log_prefix_send, f"Send full message ({media_type} via upload)",
+                        on_chat_error=on_chat_error
+                    )
+                if chat_error:
+                    # This chat refuses every send: not an upload attempt, the next target becomes the carrier
+                    return False
+                state.attempts += 1
+                media_result.upload_count += 1
+                if success:
+                    file_id = media_utils.get_media_file_id(sent_message) if sent_message else None
+                    if file_id:
+                        state.file_id = file_id
+                        media_result.file_id = file_id # Lets the caller hand the rest to other processes
+                        logger.info(f"{log_prefix_send}Obtained reusable file_id from first delivery (chat {chat_id}).")
+                        if media_result.on_file_id:
+                            media_result.on_file_id(file_id)
+                        media_result.close() # Bytes are never needed again for this message
+                    else:
+                        # Never upload the same bytes twice: remaining targets get the text version
+                        logger.warning(f"{log_prefix_send}Upload succeeded but no file_id could be extracted. Remaining targets get text.")
+                        state.gave_up = True
+                        media_result.close()
+                    return True
+                if state.attempts >= settings.UPLOAD_ONCE_MAX_ATTEMPTS:
+                    logger.error(f"{log_prefix_send}Media upload failed {state.attempts} time(s). Remaining targets get text.")
+                    state.gave_up = True
+                # The carrier itself falls through to the text version below, like every other target
+
+    send_args = base_send_args.copy()
+    send_args['chat_id'] = chat_id
+    if state.file_id:
+        file_id = state.file_id
+        rejected = False
+
+        def on_file_id_rejected():
+            nonlocal rejected
+            rejected = True
+
+        send_args[media_arg_name] = file_id
+        send_args['caption'] = full_mode_payload.caption
+        success = await execute_send(
+            media_send_func, send_args, semaphore, log_prefix_send, f"Send full message ({media_type} via file_id)", on_file_id_rejected
+        )
+        if success and file_id == state.cached_file_id:
+            media_result.refetch = None # Telegram accepted the cached file_id
+        if rejected and file_id == state.cached_file_id:
+            if state.file_id == file_id:
+                logger.warning(f"{log_prefix_send}Cached file_id was rejected. Falling back to download + upload once.")
+                state.file_id = None
+                media_result.file_id = None # Never hand the rejected file_id to other processes
+            # Retry this target through the upload (or the file_id it produced); never loops: the new file_id is not the cached one
+            return await _send_full_upload_once(
+                state, media_send_func, text_send_func, base_send_args, media_arg_name, media_result,
+                full_mode_payload, chat_id, semaphore, log_prefix_send
+            )
+        return success
+    if not full_mode_payload.text:
+        logger.error(f"{log_prefix_send}Target {chat_id}: media unavailable and no text content to send.")
+        return False
+    send_args['text'] = full_mode_payload.text
+    return await execute_send(text_send_func, send_args, semaphore, log_prefix_send, "Send full message (text fallback)")
+
+
 # --- NEW: Function to launch Full Mode sends ---
 def launch_full_mode_sends(
     target_bot: Bot,
@@ -144,9 +422,16 @@ def launch_full_mode_sends(
     media_result: MediaResult,
     full_mode_targets: list[int],
     semaphore: asyncio.Semaphore,
-    log_prefix_send: str
+    log_prefix_send: str,
+    lane_batch: LaneBatch | None = None,
+    outbox_entries: dict[int, int] | None = None,
+    delivery: DeliveryRecord | None = None
 ) -> list[asyncio.Task]:
-    """Creates and returns asyncio Tasks for sending Full Mode messages."""
+    """
+    Creates and returns asyncio Tasks for sending Full Mode messages.
+    Media that only exists as downloaded content is uploaded once (to the first target that
+    gets its turn); every other target is sent the file_id taken from that delivery.
+    """
     tasks = []
     if not full_mode_targets or not full_mode_payload:
          if full_mode_targets:
@@ -154,71 +439,286 @@ def launch_full_mode_sends(
          return tasks
 
     logger.info(f"{log_prefix_send}Creating {len(full_mode_targets)} Full Mode send tasks...")
-    send_func_full = None
     base_send_args_full = {
         'reply_markup': full_mode_payload.reply_markup,
         'parse_mode': full_mode_payload.parse_mode
     }
-    op_desc_full = ""
-    media_arg_name = None
-    media_value = None
 
-    # Determine send function and media argument based on MediaResult
-    if media_result.media_type and (media_result.file_id or media_result.content_bytes):
+    # Determine the media send function based on MediaResult
+    media_send_func = None
+    media_arg_name = None
+    if media_result.media_type and (media_result.file_id or media_result.spooled):
         send_info = media_utils.get_ptb_send_func_and_arg(media_result.media_type)
         if send_info:
-            send_func_name, arg_name = send_info
-            send_func_full = getattr(target_bot, send_func_name, None)
-            if send_func_full:
-                media_arg_name = arg_name
-                if media_result.file_id:
-                    media_value = media_result.file_id
-                    base_send_args_full[media_arg_name] = media_value
-                    base_send_args_full['caption'] = full_mode_payload.caption
-                    op_desc_full = f"Send full message ({media_result.media_type} via file_id)"
-                elif media_result.content_bytes:
-                    media_value = media_result.content_bytes # Keep as bytes for now
-                    base_send_args_full[media_arg_name] = media_value # Set bytes here
-                    base_send_args_full['caption'] = full_mode_payload.caption
-                    op_desc_full = f"Send full message ({media_result.media_type} via upload)"
-                else: send_func_full = None
-            else: logger.error(f"{log_prefix_send}Media func '{send_func_name}' not found. Fallback."); send_func_full = None
-        else: logger.error(f"{log_prefix_send}Unsupported media '{media_result.media_type}'. Fallback."); send_func_full = None
-    else:
-        logger.debug(f"{log_prefix_send}No media processed/available. Sending as text.")
-        send_func_full = None
-
-    # Setup for text if no media function determined or no media
-    if not send_func_full:
-        # Check if there's actually text content to send
-        if full_mode_payload.text:
-            send_func_full = target_bot.send_message
-            base_send_args_full['text'] = full_mode_payload.text
-            op_desc_full = "Send full message (text fallback)"
-            base_send_args_full.pop('caption', None) # Clean up potential args
-            if media_arg_name: base_send_args_full.pop(media_arg_name, None)
+            send_func_name, media_arg_name = send_info
+            media_send_func = getattr(target_bot, send_func_name, None)
+            if not media_send_func:
+                logger.error(f"{log_prefix_send}Media func '{send_func_name}' not found. Fallback.")
         else:
-            # Neither media nor text available for full mode
-            logger.error(f"{log_prefix_send}Cannot send full mode: No media and no text content available.")
-            send_func_full = None # Ensure no tasks are created
+            logger.error(f"{log_prefix_send}Unsupported media '{media_result.media_type}'. Fallback.")
+    elif not media_result.staged_message_id:
+        logger.debug(f"{log_prefix_send}No media processed/available. Sending as text.")
 
-    # Create tasks if a valid send function exists
-    if send_func_full:
+    if media_result.staged_message_id:
+        # Large media staged by the user client: copy it (no upload, no Bot API size limit)
+        send_func_full = target_bot.copy_message
+        base_send_args_full['from_chat_id'] = media_result.staged_chat_id
+        base_send_args_full['message_id'] = media_result.staged_message_id
+        base_send_args_full['caption'] = full_mode_payload.caption
+        op_desc_full = f"Send full message ({media_result.media_type} via staging copy)"
+    elif media_send_func and media_result.file_id and not media_result.refetch:
+        # File_id known up front (e.g. handed over by the ingest process): plain fan-out
+        send_func_full = media_send_func
+        base_send_args_full[media_arg_name] = media_result.file_id
+        base_send_args_full['caption'] = full_mode_payload.caption
+        op_desc_full = f"Send full message ({media_result.media_type} via file_id)"
+    elif media_send_func and (media_result.spooled or media_result.file_id):
+        # Upload once, then reuse the file_id. A cached file_id is sent as is; if Telegram
+        # rejects it, the cache entry is dropped and the content is downloaded and uploaded once.
+        state = _UploadOnceState(media_result.file_id)
         for chat_id in full_mode_targets:
-            send_args_full = base_send_args_full.copy()
-            send_args_full['chat_id'] = chat_id
-            # IMPORTANT: If sending bytes, ensure each task gets a fresh copy or readable stream
-            if media_arg_name and isinstance(media_value, bytes):
-                 # PTB usually handles bytes correctly, but copying ensures no race conditions
-                 send_args_full[media_arg_name] = media_value[:] # Send a copy
-
             tasks.append(
-                asyncio.create_task(
-                    execute_send(send_func_full, send_args_full, semaphore, log_prefix_send, op_desc_full)
+                _spawn_send(
+                    lane_batch, chat_id,
+                    _send_full_upload_once(
+                        state, media_send_func, target_bot.send_message, base_send_args_full, media_arg_name,
+                        media_result, full_mode_payload, chat_id, semaphore, log_prefix_send
+                    ),
+                    outbox_entries, SEND_MODE_FULL, delivery
                 )
             )
-        logger.debug(f"{log_prefix_send}Created {len(tasks)} Full Mode tasks.")
+        logger.debug(f"{log_prefix_send}Created {len(tasks)} Full Mode tasks (upload once).")
+        return tasks
+    elif full_mode_payload.text:
+        send_func_full = target_bot.send_message
+        base_send_args_full['text'] = full_mode_payload.text
+        op_desc_full = "Send full message (text fallback)"
     else:
-         logger.error(f"{log_prefix_send}Could not determine any send function for full mode targets. No tasks created.")
+        # Neither media nor text available for full mode
+        logger.error(f"{log_prefix_send}Cannot send full mode: No media and no text content available.")
+        return tasks
+
+    for chat_id in full_mode_targets:
+        send_args_full = base_send_args_full.copy()
+        send_args_full['chat_id'] = chat_id
+        tasks.append(
+            _spawn_send(
+                lane_batch, chat_id,
+                execute_send(send_func_full, send_args_full, semaphore, log_prefix_send, op_desc_full),
+                outbox_entries, SEND_MODE_FULL, delivery
+            )
+        )
+    logger.debug(f"{log_prefix_send}Created {len(tasks)} Full Mode tasks.")
+    return tasks
+
+
+# --- Album (media group) sends ---
+_INPUT_MEDIA_TYPES = {
+    media_utils.MEDIA_PHOTO: InputMediaPhoto,
+    media_utils.MEDIA_VIDEO: InputMediaVideo,
+}
+
+
+def is_album_media_type(media_type: str | None) -> bool:
+    """Only photos and videos can be mixed in one media group."""
+    return media_type in _INPUT_MEDIA_TYPES
+
+
+class _AlbumUploadState:
+    """Like _UploadOnceState, for all parts of a media group at once."""
+    __slots__ = ('lock', 'file_ids', 'attempts', 'gave_up')
+
+    def __init__(self, file_ids: list[str] | None):
+        self.lock = asyncio.Lock()
+        self.file_ids = file_ids
+        self.attempts = 0
+        self.gave_up = False
+
+
+def _build_input_media(album_media: AlbumMediaResult, sources: list, caption: str | None, parse_mode) -> list:
+    """One InputMedia per part; only the first item carries the caption (shown as the album caption)."""
+    items = []
+    for index, (part, source) in enumerate(zip(album_media.parts, sources)):
+        input_cls = _INPUT_MEDIA_TYPES[part.media_type]
+        if index == 0 and caption:
+            items.append(input_cls(media=source, caption=caption, parse_mode=parse_mode))
+        else:
+            items.append(input_cls(media=source))
+    return items
+
+
+async def _refetch_album_parts(album_media: AlbumMediaResult, log_prefix_send: str) -> bool:
+    """
+    Telegram rejected a cached file_id of the album (it does not say which): drops the cache entry
+    of every cached part and downloads those parts. False if a download failed.
+    """
+    parts = [part for part in album_media.parts if part.refetch]
+    refetches = [part.refetch for part in parts]
+    for part in parts:
+        part.refetch = None
+        part.file_id = None
+    logger.warning(f"{log_prefix_send}Cached album file_id was rejected. Downloading {len(parts)} part(s) to upload once.")
+    results = await asyncio.gather(*(refetch() for refetch in refetches), return_exceptions=True)
+    for part, spooled in zip(parts, results):
+        if isinstance(spooled, media_utils.SpooledMedia):
+            part.spooled = spooled
+    if all(part.file_id or part.spooled for part in album_media.parts):
+        return True
+    logger.error(f"{log_prefix_send}Could not download the album parts again. Remaining targets get text.")
+    album_media.close()
+    return False
+
+
+async def _send_album_to_target(
+    state: _AlbumUploadState,
+    target_bot: Bot,
+    album_media: AlbumMediaResult,
+    full_mode_payload: ContentPayload,
+    chat_id: int,
+    semaphore: asyncio.Semaphore,
+    log_prefix_send: str
+) -> bool:
+    """Sends the media group (uploading at most once per message) plus the button message if needed."""
+    # Media groups cannot carry an inline keyboard: with buttons, the full text follows as its own message
+    has_buttons = full_mode_payload.reply_markup is not None
+    caption = None if has_buttons else full_mode_payload.caption
+    group_args = {'chat_id': chat_id}
+    rejected = False
+
+    def on_file_id_rejected():
+        nonlocal rejected
+        rejected = True
+
+    # Cached file_ids are only checked while some part can still be downloaded again
+    file_id_rejected_handler = on_file_id_rejected if any(part.refetch for part in album_media.parts) else None
+
+    sent = False
+    if state.file_ids is None and not state.gave_up:
+        async with state.lock: # Other targets wait here until the carrier upload is done
+            if state.file_ids is None and not state.gave_up:
+                chat_error = False
+
+                def on_chat_error():
+                    nonlocal chat_error
+                    chat_error = True
 
-    return tasks
\ No newline at end of file
+                with _upload_album.time(), contextlib.ExitStack() as uploads:
+                    sources = [
+                        part.file_id or uploads.enter_context(part.spooled.open_upload(settings.BOT_API_LOCAL_MODE, attach=True))
+                        for part in album_media.parts
+                    ]
+                    group_args['media'] = _build_input_media(album_media, sources, caption, full_mode_payload.parse_mode)
+                    success, sent_messages = await execute_send_with_result(
+                        target_bot.send_media_group, group_args, semaphore, log_prefix_send,
+                        f"Send full album ({len(sources)} items via upload)", file_id_rejected_handler, on_chat_error
+                    )
+                if chat_error:
+                    # This chat refuses every send: not an upload attempt, the next target becomes the carrier
+                    return False
+                if rejected:
+                    # A cached part was refused: download it, then this target retries the upload
+                    if not await _refetch_album_parts(album_media, log_prefix_send):
+                        state.gave_up = True
+                else:
+                    state.attempts += 1
+                    album_media.upload_count += 1
+                if success:
+                    sent = True
+                    file_ids = [media_utils.get_media_file_id(m) for m in (sent_messages or ())]
+                    if len(file_ids) == len(album_media.parts) and all(file_ids):
+                        state.file_ids = file_ids
+                        for part, file_id in zip(album_media.parts, file_ids):
+                            if part.on_file_id and not part.file_id:
+                                part.on_file_id(file_id)
+                            part.file_id = file_id
+                            part.refetch = None # Telegram accepted the cached file_ids as well
+                        album_media.close() # Content is never needed again for this message
+                        logger.info(f"{log_prefix_send}Obtained reusable file_ids for album from first delivery (chat {chat_id}).")
+                    else:
+                        logger.warning(f"{log_prefix_send}Album upload succeeded but file_ids could not be extracted. Remaining targets get text.")
+                        state.gave_up = True
+                        album_media.close()
+                elif not rejected and state.attempts >= settings.UPLOAD_ONCE_MAX_ATTEMPTS:
+                    logger.error(f"{log_prefix_send}Album upload failed {state.attempts} time(s). Remaining targets get text.")
+                    state.gave_up = True
+                # A failed carrier falls through to the text version below, like every other target
+        if rejected:
+            return await _send_album_to_target(state, target_bot, album_media, full_mode_payload, chat_id, semaphore, log_prefix_send)
+
+    if not sent:
+        if state.file_ids:
+            file_ids = state.file_ids
+            group_args['media'] = _build_input_media(album_media, file_ids, caption, full_mode_payload.parse_mode)
+            success = await execute_send(
+                target_bot.send_media_group, group_args, semaphore, log_prefix_send,
+                f"Send full album ({len(file_ids)} items via file_id)", file_id_rejected_handler
+            )
+            if rejected:
+                async with state.lock:
+                    if state.file_ids is file_ids: # First target to notice: download, the retry uploads once
+                        state.file_ids = None
+                        if not await _refetch_album_parts(album_media, log_prefix_send):
+                            state.gave_up = True
+                return await _send_album_to_target(state, target_bot, album_media, full_mode_payload, chat_id, semaphore, log_prefix_send)
+            if not success:
+                return False
+            if file_id_rejected_handler is not None:
+                for part in album_media.parts:
+                    part.refetch = None # Telegram accepted the cached file_ids
+        elif not full_mode_payload.text:
+            logger.error(f"{log_prefix_send}Target {chat_id}: album unavailable and no text content to send.")
+            return False
+        else:
+            has_buttons = True # Album gave up: the text message below is the whole delivery
+
+    if not has_buttons:
+        return True
+    text_args = {
+        'chat_id': chat_id,
+        'text': full_mode_payload.text,
+        'reply_markup': full_mode_payload.reply_markup,
+        'parse_mode': full_mode_payload.parse_mode,
+    }
+    return await execute_send(target_bot.send_message, text_args, semaphore, log_prefix_send, "Send full album text")
+
+
+def launch_album_sends(
+    target_bot: Bot,
+    full_mode_payload: ContentPayload | None,
+    album_media: AlbumMediaResult,
+    full_mode_targets: list[int],
+    semaphore: asyncio.Semaphore,
+    log_prefix_send: str,
+    lane_batch: LaneBatch | None = None,
+    outbox_entries: dict[int, int] | None = None,
+    delivery: DeliveryRecord | None = None
+) -> list[asyncio.Task]:
+    """
+    Creates the Full Mode tasks for an album: one send_media_group per target. The first target
+    gets the upload, every other target the file_ids from that delivery.
+    Fewer than 2 usable parts fall back to the single-media path.
+    """
+    if not full_mode_targets or not full_mode_payload:
+        if full_mode_targets:
+            logger.warning(f"{log_prefix_send}Full mode targets exist but no payload. Skipping Full sends.")
+        return []
+
+    parts = album_media.parts
+    if len(parts) < 2 or not all(is_album_media_type(p.media_type) and (p.file_id or p.spooled) for p in parts):
+        single = parts[0] if parts else MediaResult(media_type=None)
+        logger.info(f"{log_prefix_send}Album has {len(parts)} usable part(s). Using single media send.")
+        return launch_full_mode_sends(target_bot, full_mode_payload, single, full_mode_targets, semaphore, log_prefix_send, lane_batch, outbox_entries, delivery)
+
+    known_file_ids = [p.file_id for p in parts]
+    state = _AlbumUploadState(known_file_ids if all(known_file_ids) else None)
+    logger.info(f"{log_prefix_send}Creating {len(full_mode_targets)} Full Mode album tasks ({len(parts)} items)...")
+    tasks = [
+        _spawn_send(
+            lane_batch, chat_id,
+            _send_album_to_target(state, target_bot, album_media, full_mode_payload, chat_id, semaphore, log_prefix_send),
+            outbox_entries, SEND_MODE_ALBUM, delivery
+        )
+        for chat_id in full_mode_targets
+    ]
+    logger.debug(f"{log_prefix_send}Created {len(tasks)} Full Mode album tasks.")
+    return tasks
@@ -0,0 +1,104 @@
+# handlers/outbox_sends.py
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+
+from telegram import Bot
+
+from config import settings, persistent_config
+from telegram_clients import bot_pool
+from utils.outbox import get_outbox
+from handlers.message_processing import ContentPayload, get_lane_dispatcher
+from .egress import jobs, get_egress_pool
+
+logger = logging.getLogger(__name__)
+
+# Background tasks delivering the sends resumed at startup
+_resume_tasks: set[asyncio.Task] = set()
+
+
+async def record_sends(
+    kind: str,
+    bot_id: int | None,
+    message_id: int,
+    log_prefix: str,
+    payload: ContentPayload | None,
+    media,
+    targets: list[int]
+) -> dict[int, int] | None:
+    """
+    Journals the sends of one bot in the outbox before they start. Returns {chat_id: entry_id}
+    for launch_*_sends (None: outbox disabled or unavailable, the sends run unjournaled).
+    Media that is not yet uploaded has no reference to journal: if resumed, it goes out as text.
+    """
+    outbox = get_outbox()
+    if outbox is None or not targets or not payload:
+        return None
+    job = jobs.build_job(kind, bot_id, message_id, log_prefix, payload, media)
+    try:
+        return await outbox.record(job, targets)
+    except Exception as e:
+        logger.error(f"{log_prefix}Could not journal {len(targets)} send(s) in the outbox: {e}. Sending without it.")
+        return None
+
+
+async def _deliver_resumed(tasks: list[asyncio.Task], lane_batches: list):
+    try:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        succeeded = sum(1 for r in results if r is True)
+        logger.info(f"[Resume] Finished {len(results)} resumed send(s). Succeeded: {succeeded}, Failed: {len(results) - succeeded}")
+    finally:
+        for lane_batch in lane_batches:
+            lane_batch.close()
+
+
+async def resume_pending_sends(default_bot: Bot, semaphore: asyncio.Semaphore) -> int:
+    """
+    Re-launches the sends a previous run journaled but did not finish (call once at startup,
+    before new messages arrive, so resumed sends keep their place in each chat's lane).
+    Returns the number of resumed sends.
+    """
+    outbox = get_outbox()
+    if outbox is None:
+        return 0
+    pending = await outbox.load_pending()
+    if not pending:
+        return 0
+
+    current_targets = set(persistent_config.get_target_groups())
+    egress_pool = get_egress_pool()
+    now = time.time()
+    resumed, dropped = 0, 0
+    tasks, lane_batches = [], []
+    for item in pending:
+        job, entries = item['job'], item['entries']
+        # Too old to be worth delivering, or the chat is no longer a target: just clear the entries
+        stale = now - item['created_at'] > settings.OUTBOX_RESUME_MAX_AGE_SECONDS
+        targets = []
+        for chat_id, entry_id in entries.items():
+            if stale or chat_id not in current_targets:
+                outbox.mark_done(entry_id)
+                dropped += 1
+            else:
+                targets.append(chat_id)
+        if not targets:
+            continue
+
+        job = {**job, 'log_prefix': f"[Resume] {job['log_prefix']}", 'published_at': now}
+        resumed += len(targets)
+        if egress_pool is not None:
+            targets = await egress_pool.publish(job, targets, entries)
+            if not targets:
+                continue
+        bot = bot_pool.get_bot(job['bot_id']) or default_bot
+        lane_batch = get_lane_dispatcher().open_batch(targets)
+        lane_batches.append(lane_batch)
+        tasks.extend(jobs.launch_job(bot, {**job, 'targets': targets, 'outbox_entries': entries}, semaphore, lane_batch))
+
+    if tasks:
+        task = asyncio.create_task(_deliver_resumed(tasks, lane_batches))
+        _resume_tasks.add(task)
+        task.add_done_callback(_resume_tasks.discard)
+    logger.info(f"Outbox: resumed {resumed} unfinished send(s) from the previous run, dropped {dropped} stale/removed.")
+    return resumed
@@ -11,23 +11,52 @@ logging_config.setup_logging()
 # ---------------------------------------------
 
 from telethon.errors import SessionPasswordNeededError
-from telegram.ext import Application # Import Application from PTB
 
 # Import necessary modules
-from config import settings, persistent_config # <-- Import persistent_config
-from telegram_clients import setup
-from handlers import message_handlers
+from config import settings, persistent_config, shard_config, group_config # <-- Import persistent_config
+from telegram_clients import setup, transport, bot_pool
+from handlers.message_processing import send_scheduler
+from utils import identity_cache, file_id_cache, outbox, deep_links, context_cache, dedupe_index, metrics
+from handlers import message_handlers, egress, outbox_sends
 from handlers.command_handlers import registration as command_registration
 
 logger = logging.getLogger(__name__)
 
+# Update types every bot polls for ('my_chat_member' = the bot's own membership changes)
+ALLOWED_UPDATES = ["message", "callback_query", "chat_member", "my_chat_member"]
+
 # Global variables to manage client and application
 telethon_client = None
 ptb_application = None
+ingest_queue = None
 shutdown_event = asyncio.Event() # Event to signal program stop
 
+def register_metrics(semaphore: asyncio.Semaphore, ingest: "message_handlers.IngestQueue"):
+    """Gauges read when /metrics is scraped, plus the get_stats() counters of every component."""
+    metrics.gauge('send_semaphore_waiters', 'Sends waiting for a MAX_CONCURRENT_TASKS slot.').set_function(
+        lambda: len(semaphore._waiters or ()) # asyncio keeps no public waiter count
+    )
+    metrics.gauge('context_cache_entries', 'Entries in the in-memory deep link context cache.').set_function(
+        lambda: len(context_cache.get_context_cache())
+    )
+    metrics.gauge('target_groups', 'Current number of target groups.').set_function(
+        lambda: len(persistent_config.get_target_groups())
+    )
+    metrics.register_stats('ingest', ingest.get_stats)
+    metrics.register_stats('transport', transport.get_stats, label='pool', grouped=True)
+    metrics.register_stats('scheduler', send_scheduler.get_all_stats, label='bot', grouped=True)
+    metrics.register_stats('bot_pool', bot_pool.get_stats, label='bot')
+    metrics.register_stats('egress', lambda: egress.get_egress_pool().get_stats() if egress.get_egress_pool() else {})
+    metrics.register_stats('outbox', lambda: outbox.get_outbox().get_stats() if outbox.get_outbox() else {})
+    metrics.register_stats('deep_links', lambda: deep_links.get_deep_link_index().get_stats() if deep_links.get_deep_link_index() else {})
+    metrics.register_stats('context_cache', context_cache.get_stats)
+    metrics.register_stats('file_id_cache', file_id_cache.get_stats)
+    metrics.register_stats('dedupe', dedupe_index.get_dedupe_index().get_stats)
+    metrics.register_stats('albums', message_handlers.get_album_stats)
+
+
 async def main():
-    global telethon_client, ptb_application
+    global telethon_client, ptb_application, ingest_queue
 
     logger.info("--- Starting Telegram Bot Application ---")
 
@@ -41,9 +70,10 @@ async def main():
     # 1. Initialize clients & application
     try:
         telethon_client = setup.setup_telethon_client()
-        ptb_application = Application.builder().token(settings.BOT_TOKEN).build()
+        ptb_application = setup.setup_ptb_application()
         logger.info("Initialized Telethon client and PTB Application.")
         ptb_bot = ptb_application.bot # Get the bot instance
+        bot_pool.register_primary(ptb_bot)
 
         # Initialize PTB Application (needed for get_me etc.)
         await ptb_application.initialize()
@@ -73,10 +103,8 @@ async def main():
             logger.info(f"No persistent groups file ({persistent_config.TARGET_GROUPS_FILE}) found, seeding with groups from .env")
             # Use list directly from settings as it's already processed
             initial_target_groups = settings.TARGET_CHAT_IDS_FROM_ENV
-            # Save this initial list to the JSON file (needs lock)
-            async with persistent_config._file_lock:
-                await persistent_config._save_target_groups(set(initial_target_groups)) # Use internal save with lock
-            # Reload to ensure format is correct and confirm save
+            # Replace the in-memory registry and persist it to the JSON file
+            await persistent_config.replace_target_groups(initial_target_groups)
             initial_target_groups = await persistent_config.load_target_groups()
             logger.info(f"Seeded and saved {len(initial_target_groups)} groups to {persistent_config.TARGET_GROUPS_FILE}")
         elif not initial_target_groups:
@@ -90,6 +118,36 @@ async def main():
         initial_target_groups = []
     # -------------------------------------------------------------
 
+    # Persistent media -> file_id cache (lets repeated media skip download + upload)
+    try:
+        await file_id_cache.load()
+    except Exception as cache_err:
+        logger.error(f"Error loading file_id cache: {cache_err}", exc_info=True)
+
+    # Sticky target chat -> bot assignments (only matters with SHARD_BOT_TOKENS)
+    try:
+        await shard_config.load_shard_map(bot_pool.bot_id_from_token(settings.BOT_TOKEN), persistent_config.get_target_groups())
+    except Exception as shard_err:
+        logger.error(f"Error loading shard map: {shard_err}", exc_info=True)
+
+    # Per-group display modes (/display), partitioned by mode for the message path
+    try:
+        await group_config.load_group_modes()
+    except Exception as modes_err:
+        logger.error(f"Error loading group display modes: {modes_err}", exc_info=True)
+
+    # Persistent index behind the signed deploy deep links
+    try:
+        await deep_links.open_deep_link_index()
+    except Exception as links_err:
+        logger.error(f"Error opening deep link index: {links_err}. Deploy links fall back to the in-memory context cache.", exc_info=True)
+
+    # Write-ahead journal of sends (unfinished sends of a previous run are resumed below)
+    try:
+        await outbox.open_outbox()
+    except Exception as outbox_err:
+        logger.error(f"Error opening send outbox: {outbox_err}. Sends are not journaled.", exc_info=True)
+
     # 2. Create Semaphore
     semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_TASKS)
     logger.info(f"Concurrency limit set to: {settings.MAX_CONCURRENT_TASKS}")
@@ -97,8 +155,12 @@ async def main():
     # 3. Register Handlers
     try:
         command_registration.register_all_command_handlers(ptb_application)
-        message_handlers.register_handlers(ptb_application, telethon_client, ptb_bot, semaphore)
-        logger.info("Successfully registered command and message handlers.")
+        # Shard bots get the same handlers (their groups send /display and membership updates to them)
+        bot_pool.build_shard_applications(command_registration.register_all_command_handlers)
+        await bot_pool.initialize_shards()
+        # Optional worker processes for the fan-out (EGRESS_WORKERS > 0)
+        egress.start_egress_pool()
+        logger.info("Successfully registered command handlers.")
     except Exception as e:
         logger.critical(f"Failed to register handlers: {e}", exc_info=True)
         return # Stop if handlers fail to register
@@ -121,10 +183,31 @@ async def main():
             logger.info(f"Telethon client running as user: {user.first_name} (ID: {user.id})")
             logger.info(f"Listening for messages from source bot ID: {settings.SOURCE_BOT_IDENTIFIER}...")
 
+            # Resolve bot/source identities once, before the message handlers read them
+            await identity_cache.prime(ptb_bot, telethon_client)
+            identity_cache.start_background_refresh(ptb_bot, telethon_client)
+
+            # Message handlers (the source filter uses the primed peer)
+            try:
+                ingest_queue = message_handlers.register_handlers(ptb_application, telethon_client, ptb_bot, semaphore)
+                logger.info("Successfully registered message handlers.")
+                # Before any new message: resumed sends keep their place in each chat's lane
+                await outbox_sends.resume_pending_sends(ptb_bot, semaphore)
+                register_metrics(semaphore, ingest_queue)
+            except Exception as e:
+                logger.critical(f"Failed to register message handlers: {e}", exc_info=True)
+                return
+
+            # Local Prometheus endpoint (METRICS_PORT > 0)
+            try:
+                await metrics.start_metrics_server()
+            except Exception as metrics_err:
+                logger.error(f"Could not start metrics endpoint: {metrics_err}")
+
             # ---> Log dynamically loaded count just before starting <---
             try:
-                # Load the latest list again right before the main loop starts
-                current_dynamic_targets = await persistent_config.load_target_groups()
+                # Read the latest in-memory snapshot right before the main loop starts
+                current_dynamic_targets = sorted(persistent_config.get_target_groups())
                 targets_str = ', '.join(map(str, current_dynamic_targets[:5]))
                 if len(current_dynamic_targets) > 5: targets_str += "..."
                 logger.info(f"Will forward messages to {len(current_dynamic_targets)} dynamically managed target chat(s): [{targets_str}]")
@@ -143,11 +226,13 @@ async def main():
 
             logger.info("Starting PTB Updater for polling updates...")
             await ptb_application.updater.start_polling(
-                 # ---> FIX: Add 'callback_query' AND 'chat_member' <---
-                allowed_updates=["message", "callback_query", "chat_member"],
+                allowed_updates=ALLOWED_UPDATES,
                 drop_pending_updates=True
             )
             ptb_started = True
+            await bot_pool.start_shards(ALLOWED_UPDATES)
+            if bot_pool.is_sharded():
+                logger.info(f"Bot pool: {bot_pool.get_stats()}")
             logger.info(f"Bot is listening for commands as @{ptb_application.bot.username}")
 
             logger.info("--- Bot is fully running (Telethon Client + PTB Application) ---")
@@ -164,6 +249,26 @@ async def main():
         logger.critical(f"Critical error during main runtime loop: {e}", exc_info=True)
     finally:
         # Graceful shutdown
+        if ingest_queue:
+            try:
+                await message_handlers.flush_albums()
+            except Exception as album_flush_err:
+                logger.error(f"Error flushing pending albums: {album_flush_err}")
+            try:
+                logger.info(f"Stopping ingest workers (queue stats: {ingest_queue.get_stats()})...")
+                await ingest_queue.stop()
+            except Exception as ingest_stop_err:
+                logger.error(f"Error stopping ingest workers: {ingest_stop_err}")
+
+        # Workers finish the jobs already published; their chat migrations/removals are applied before the flush below
+        try:
+            await egress.stop_egress_pool()
+        except Exception as egress_stop_err:
+            logger.error(f"Error stopping egress workers: {egress_stop_err}")
+
+        logger.info(f"Bot HTTP transport stats: {transport.get_stats()}")
+        await metrics.stop_metrics_server()
+
         if ptb_application and ptb_started:
             try:
                 logger.info("Stopping PTB Application...")
@@ -177,6 +282,20 @@ async def main():
             except Exception as ptb_stop_err:
                 logger.error(f"Error stopping/shutting down PTB application: {ptb_stop_err}")
 
+        await bot_pool.stop_shards()
+        await identity_cache.stop_background_refresh()
+
+        # Make sure pending target group / file_id cache changes reach disk
+        try:
+            await persistent_config.flush_target_groups()
+            await file_id_cache.flush()
+            await shard_config.flush_shard_map()
+            await group_config.flush_group_modes()
+            await outbox.close_outbox()
+            await deep_links.close_deep_link_index()
+        except Exception as flush_err:
+            logger.error(f"Error flushing persistent state on shutdown: {flush_err}")
+
         # Telethon client disconnects automatically when `async with` block exits
         logger.info("Telethon client will disconnect automatically.")
         logger.info("--- Telegram Bot Application Stopped ---")
@@ -203,4 +322,5 @@ if __name__ == '__main__':
         # Catch any unexpected errors at the top level
         logger.critical(f"Unhandled top-level exception: {e}", exc_info=True)
     finally:
+        logging_config.stop_logging() # Write out the queued log records
         print("--- Script execution finished ---")
\ No newline at end of file
@@ -0,0 +1,135 @@
+# telegram_clients/bot_pool.py
+# -*- coding: utf-8 -*-
+"""
+Pool of bots that deliver to target chats: the primary BOT_TOKEN bot plus optional shard bots
+(SHARD_BOT_TOKENS). Each target chat is served by one bot (sticky, see config/shard_config.py),
+so every bot spends its own Bot API rate budget and fan-out throughput grows with the pool.
+"""
+import logging
+from typing import Callable, Iterable
+
+from telegram import Bot
+from telegram.ext import Application
+
+from config import settings, shard_config
+from . import setup
+
+logger = logging.getLogger(__name__)
+
+_primary_id: int | None = None
+_bots: dict[int, Bot] = {}
+_shard_applications: list[Application] = []
+
+
+def bot_id_from_token(token: str) -> int:
+    """The bot id is the numeric part of the token, no API call needed."""
+    return int(token.split(':', 1)[0])
+
+
+def get_bot_id(bot: Bot) -> int:
+    return bot_id_from_token(bot.token)
+
+
+def register_primary(bot: Bot):
+    """Registers the main bot (serves every chat without a shard assignment)."""
+    global _primary_id
+    _primary_id = get_bot_id(bot)
+    _bots[_primary_id] = bot
+
+
+def get_primary_bot() -> Bot | None:
+    return _bots.get(_primary_id)
+
+
+def get_bot(bot_id: int) -> Bot | None:
+    return _bots.get(bot_id)
+
+
+def get_bots() -> list[Bot]:
+    return list(_bots.values())
+
+
+def is_sharded() -> bool:
+    return len(_bots) > 1
+
+
+def bot_id_for_chat(chat_id: int) -> int:
+    """Bot id that delivers to chat_id: its assigned shard bot if that bot is running, else the primary."""
+    assigned = shard_config.get_assigned_bot(chat_id)
+    if assigned is not None and assigned in _bots:
+        return assigned
+    return _primary_id
+
+
+def get_bot_for_chat(chat_id: int) -> Bot | None:
+    return _bots.get(bot_id_for_chat(chat_id))
+
+
+def group_by_bot(chat_ids: Iterable[int]) -> dict[int, list[int]]:
+    """Splits target chats into {bot_id: [chat_id, ...]} (order within each bot is kept; unsharded, a list/tuple is returned as is)."""
+    groups: dict[int, list[int]] = {}
+    if not is_sharded(): # Fast path: everything goes through the primary bot
+        if not isinstance(chat_ids, (list, tuple)):
+            chat_ids = list(chat_ids)
+        return {_primary_id: chat_ids} if chat_ids else {}
+    for chat_id in chat_ids:
+        groups.setdefault(bot_id_for_chat(chat_id), []).append(chat_id)
+    return groups
+
+
+def build_shard_applications(register_handlers: Callable[[Application], None]) -> list[Application]:
+    """Builds one Application per shard token; register_handlers adds the handlers each bot needs."""
+    for index, token in enumerate(settings.SHARD_BOT_TOKENS, start=1):
+        bot_id = bot_id_from_token(token)
+        if bot_id in _bots:
+            logger.warning(f"Shard token #{index} belongs to bot {bot_id}, which is already in the pool. Skipping.")
+            continue
+        application = setup.setup_ptb_application(token=token, name=f"shard{index}")
+        register_handlers(application)
+        _bots[bot_id] = application.bot
+        _shard_applications.append(application)
+        logger.info(f"Added shard bot {bot_id} to the bot pool.")
+    return list(_shard_applications)
+
+
+async def initialize_shards():
+    """Initializes the shard applications; a shard that fails (bad token...) is dropped from the pool."""
+    for application in list(_shard_applications):
+        bot_id = get_bot_id(application.bot)
+        try:
+            await application.initialize()
+        except Exception as e:
+            logger.error(f"Failed to initialize shard bot {bot_id}: {e}. Its chats fall back to the main bot.", exc_info=True)
+            _shard_applications.remove(application)
+            _bots.pop(bot_id, None)
+
+
+async def start_shards(allowed_updates: list[str]):
+    """Starts polling for every shard bot (membership updates keep the shard map current)."""
+    for application in _shard_applications:
+        try:
+            await application.start()
+            await application.updater.start_polling(allowed_updates=allowed_updates, drop_pending_updates=True)
+            logger.info(f"Shard bot @{application.bot.username} is polling.")
+        except Exception as e:
+            logger.error(f"Failed to start polling for shard bot {get_bot_id(application.bot)}: {e}", exc_info=True)
+
+
+async def stop_shards():
+    for application in _shard_applications:
+        try:
+            if application.updater and application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+        except Exception as e:
+            logger.error(f"Error stopping shard bot {get_bot_id(application.bot)}: {e}")
+
+
+def get_stats() -> dict:
+    counts = shard_config.get_shard_counts()
+    return {
+        'bots': len(_bots),
+        'assigned_chats': {bot_id: counts.get(bot_id, 0) for bot_id in _bots},
+    }
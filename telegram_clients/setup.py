@@ -3,7 +3,9 @@ import logging
 from telethon import TelegramClient
 from telegram import Bot # Từ python-telegram-bot
 from telegram.error import InvalidToken
+from telegram.ext import Application
 from config import settings
+from .transport import build_bot_request
 
 logger = logging.getLogger(__name__)
 
@@ -36,4 +38,28 @@ def setup_ptb_bot():
         raise # Raise lại lỗi để dừng chương trình
     except Exception as e:
         logger.error(f"Could not initialize target bot: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def setup_ptb_application(token: str | None = None, name: str = "bot") -> Application:
+    """Builds a PTB Application (BOT_TOKEN by default), against a self-hosted Bot API server if configured."""
+    # Pools sized to the configured concurrency, uploads on their own pool
+    builder = Application.builder().token(token or settings.BOT_TOKEN).request(build_bot_request(name))
+    if settings.BOT_API_BASE_URL:
+        builder = builder.base_url(settings.BOT_API_BASE_URL)
+        logger.info(f"Using Bot API server for '{name}': {settings.BOT_API_BASE_URL}")
+    if settings.BOT_API_BASE_FILE_URL:
+        builder = builder.base_file_url(settings.BOT_API_BASE_FILE_URL)
+    if settings.BOT_API_LOCAL_MODE:
+        # Path inputs are sent as file:// URIs instead of uploading their bytes
+        builder = builder.local_mode(True)
+        logger.info("Bot API local mode enabled: media is passed to the server by file path.")
+    return builder.build()
+
+def setup_send_bot(token: str, name: str = "bot") -> Bot:
+    """Builds a bare Bot for sending only (egress workers): same transport and Bot API server as the Application bots."""
+    kwargs = {'request': build_bot_request(name), 'local_mode': settings.BOT_API_LOCAL_MODE}
+    if settings.BOT_API_BASE_URL:
+        kwargs['base_url'] = settings.BOT_API_BASE_URL
+    if settings.BOT_API_BASE_FILE_URL:
+        kwargs['base_file_url'] = settings.BOT_API_BASE_FILE_URL
+    return Bot(token, **kwargs)
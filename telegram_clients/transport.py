@@ -0,0 +1,127 @@
+# telegram_clients/transport.py
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+
+import httpx
+from telegram.request import BaseRequest, HTTPXRequest, RequestData
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Every pool built by build_bot_request(), for get_stats()
+_pools: list["PooledHTTPXRequest"] = []
+
+
+class PooledHTTPXRequest(HTTPXRequest):
+    """
+    HTTPXRequest that admits at most pool_size requests at once (one per pooled connection)
+    and records how long requests waited for a free connection.
+    """
+
+    def __init__(self, name: str, connection_pool_size: int, **kwargs):
+        super().__init__(connection_pool_size=connection_pool_size, **kwargs)
+        self.name = name
+        self.pool_size = connection_pool_size
+        self._slots = asyncio.Semaphore(connection_pool_size)
+        self._in_flight = 0
+
+        # Counters
+        self.requests_total = 0
+        self.pool_waits_total = 0 # Requests that found every connection busy
+        self.pool_wait_seconds_total = 0.0
+        self.pool_wait_seconds_max = 0.0
+
+    async def do_request(self, url: str, method: str, request_data: RequestData | None = None, *args, **kwargs) -> tuple[int, bytes]:
+        started = time.monotonic()
+        async with self._slots:
+            waited = time.monotonic() - started
+            self.requests_total += 1
+            if waited > 0.001:
+                self.pool_waits_total += 1
+                self.pool_wait_seconds_total += waited
+                if waited > self.pool_wait_seconds_max:
+                    self.pool_wait_seconds_max = waited
+            self._in_flight += 1
+            try:
+                return await super().do_request(url, method, request_data, *args, **kwargs)
+            finally:
+                self._in_flight -= 1
+
+    def get_stats(self) -> dict:
+        return {
+            'pool_size': self.pool_size,
+            'in_flight': self._in_flight,
+            'requests_total': self.requests_total,
+            'pool_waits_total': self.pool_waits_total,
+            'pool_wait_seconds_total': self.pool_wait_seconds_total,
+            'pool_wait_seconds_max': self.pool_wait_seconds_max,
+        }
+
+
+class RoutedRequest(BaseRequest):
+    """
+    Sends requests that upload files through the media pool and everything else (text sends,
+    file_id sends, commands) through the text pool, so slow uploads never hold the connections
+    that FX/text sends need.
+    """
+
+    def __init__(self, text_request: BaseRequest, media_request: BaseRequest):
+        self._text_request = text_request
+        self._media_request = media_request
+
+    @property
+    def read_timeout(self) -> float | None:
+        return self._text_request.read_timeout
+
+    async def initialize(self) -> None:
+        await self._text_request.initialize()
+        await self._media_request.initialize()
+
+    async def shutdown(self) -> None:
+        await self._text_request.shutdown()
+        await self._media_request.shutdown()
+
+    async def do_request(self, url: str, method: str, request_data: RequestData | None = None, *args, **kwargs) -> tuple[int, bytes]:
+        if request_data is not None and request_data.contains_files:
+            return await self._media_request.do_request(url, method, request_data, *args, **kwargs)
+        return await self._text_request.do_request(url, method, request_data, *args, **kwargs)
+
+
+def _build_pool(name: str, pool_size: int, **kwargs) -> PooledHTTPXRequest:
+    pool_size = max(1, pool_size)
+    # Keep idle connections open across quiet periods (httpx default expiry is only 5s)
+    limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_SECONDS,
+    )
+    pool = PooledHTTPXRequest(
+        name,
+        pool_size,
+        http_version=settings.HTTP_VERSION,
+        httpx_kwargs={'limits': limits},
+        **kwargs,
+    )
+    _pools.append(pool)
+    return pool
+
+
+def build_bot_request(name: str = "bot") -> RoutedRequest:
+    """Builds the request object for a Bot: separate connection pools for uploads and everything else."""
+    text_pool = _build_pool(f"{name}-text", settings.HTTP_TEXT_POOL_SIZE)
+    media_pool = _build_pool(
+        f"{name}-media", settings.HTTP_MEDIA_POOL_SIZE, media_write_timeout=settings.HTTP_MEDIA_WRITE_TIMEOUT
+    )
+    logger.info(
+        f"HTTP transport '{name}': text pool {text_pool.pool_size}, media pool {media_pool.pool_size}, "
+        f"HTTP/{settings.HTTP_VERSION}, keepalive {settings.HTTP_KEEPALIVE_SECONDS}s."
+    )
+    return RoutedRequest(text_pool, media_pool)
+
+
+def get_stats() -> dict:
+    """Per-pool request and pool-wait counters."""
+    return {pool.name: pool.get_stats() for pool in _pools}
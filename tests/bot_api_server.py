@@ -0,0 +1,126 @@
+# tests/bot_api_server.py
+# -*- coding: utf-8 -*-
+"""
+Minimal stand-in for a (local) Bot API server: answers every method with a plausible result.
+
+Used by the tests (one in-process server that records the requests it received) and by
+benchmarks/egress_throughput.py and benchmarks/spooled_media.py (server processes sharing a
+port through SO_REUSEPORT).
+"""
+import asyncio
+import email.policy
+import json
+import multiprocessing
+import socket
+import time
+from dataclasses import dataclass
+from email.parser import BytesParser
+from urllib.parse import parse_qs
+
+PHOTO_FILE_ID = 'benchmark-photo' # file_id returned for every sendPhoto
+_MAX_PARSED_BODY = 8 * 1024 * 1024
+
+
+@dataclass
+class RecordedRequest:
+    path: str
+    method: str
+    content_type: str
+    params: dict # For multipart uploads: the form fields only (file parts are not recorded)
+
+
+def _multipart_fields(content_type: str, body: bytes) -> dict:
+    """Plain form fields of a multipart body (file parts are skipped)."""
+    message = BytesParser(policy=email.policy.HTTP).parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+    return {
+        part.get_param('name', header='content-disposition'): part.get_payload(decode=True).decode()
+        for part in message.iter_parts() if part.get_filename() is None
+    }
+
+
+def _response(method: str, params: dict) -> bytes:
+    if method == 'getMe':
+        result = {'id': 123456, 'is_bot': True, 'first_name': 'Benchmark', 'username': 'benchmark_bot'}
+    else:
+        chat_id = int(params.get('chat_id', 0))
+        result = {'message_id': 1, 'date': int(time.time()), 'chat': {'id': chat_id, 'type': 'supergroup'}, 'text': params.get('text', '')}
+        if method in ('sendPhoto', 'sendMediaGroup'): # Uploads return a reusable file_id
+            result['photo'] = [{'file_id': PHOTO_FILE_ID, 'file_unique_id': 'benchmark', 'width': 1, 'height': 1}]
+        if method == 'sendMediaGroup': # One message per item
+            items = json.loads(params.get('media', '[]'))
+            result = [{**result, 'message_id': index + 1} for index in range(len(items))]
+    body = json.dumps({'ok': True, 'result': result}).encode()
+    return b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body)
+
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, latency: float,
+                             requests: list[RecordedRequest] | None = None):
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            request_line, *header_lines = head.decode('latin-1').split("\r\n")
+            headers = {k.strip().lower(): v.strip() for k, _, v in (h.partition(':') for h in header_lines if h)}
+            length = int(headers.get('content-length', 0))
+            if length > _MAX_PARSED_BODY:
+                # Large uploads (benchmarks): drained without keeping them, their fields are not recorded
+                while length > 0:
+                    length -= len(await reader.readexactly(min(length, 1024 * 1024)))
+                body = b''
+            else:
+                body = await reader.readexactly(length)
+            path = request_line.split(' ')[1]
+            method = path.rsplit('/', 1)[-1]
+            content_type = headers.get('content-type', '')
+            if content_type.startswith('application/json'):
+                params = json.loads(body or b'{}')
+            elif content_type.startswith('multipart/'):
+                params = _multipart_fields(content_type, body) if body else {}
+            else:
+                params = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+            if requests is not None:
+                requests.append(RecordedRequest(path, method, content_type, params))
+            if latency:
+                await asyncio.sleep(latency)
+            writer.write(_response(method, params))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_local_server(requests: list[RecordedRequest] | None = None, latency: float = 0.0) -> tuple[asyncio.Server, int]:
+    """Serves from the running event loop on a free port; received requests are appended to `requests`."""
+    server = await asyncio.start_server(
+        lambda r, w: _handle_connection(r, w, latency, requests), '127.0.0.1', 0
+    )
+    return server, server.sockets[0].getsockname()[1]
+
+
+def _serve(port: int, latency: float):
+    async def main():
+        server = await asyncio.start_server(
+            lambda r, w: _handle_connection(r, w, latency), '127.0.0.1', port, reuse_port=True
+        )
+        async with server:
+            await server.serve_forever()
+    asyncio.run(main())
+
+
+def start_mock_server(processes: int, latency: float) -> tuple[int, list]:
+    """Starts `processes` server processes on one free port; terminate() them when done."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    ctx = multiprocessing.get_context('spawn')
+    servers = [ctx.Process(target=_serve, args=(port, latency), daemon=True) for _ in range(processes)]
+    for server in servers:
+        server.start()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline: # Wait until the port accepts connections
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return port, servers
@@ -0,0 +1,17 @@
+# tests/conftest.py
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# Settings are read at import time: configure a throwaway environment before importing the app
+for name, value in {
+    'API_ID': '1',
+    'API_HASH': 'test',
+    'PHONE_NUMBER': '+10000000000',
+    'SOURCE_BOT_IDENTIFIER': '1',
+    'BOT_TOKEN': '123456:TEST',
+    'TARGET_CHAT_IDS': '',
+    'LOG_LEVEL': 'WARNING',
+}.items():
+    os.environ.setdefault(name, value)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
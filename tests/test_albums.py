@@ -0,0 +1,163 @@
+# tests/test_albums.py
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+from telegram import Bot, Chat, Message, PhotoSize
+from telegram.error import BadRequest
+
+from handlers.album_aggregator import AlbumAggregator
+from handlers.message_processing import sender
+from handlers.message_processing.content_formatter import ContentPayload
+from handlers.message_processing.delivery_lanes import LaneDispatcher
+from handlers.message_processing.media_handler import AlbumMediaResult, MediaResult
+from utils.helpers.media_utils import SpooledMedia
+
+TARGETS = [-1001000000000 - i for i in range(10)]
+STALE_FILE_ID = 'stale-file-id'
+
+
+class AlbumBot(Bot):
+    """Answers send_media_group/send_message locally; refuses STALE_FILE_ID like Telegram does."""
+
+    def __init__(self):
+        super().__init__("123456:TEST")
+        with self._unfrozen():
+            self.counts = {'uploads': 0, 'file_id': 0, 'rejected': 0, 'text': 0}
+
+    def _message(self, **fields) -> Message:
+        chat = Chat(id=-1, type=Chat.SUPERGROUP)
+        return Message(message_id=1, date=datetime.datetime.now(datetime.timezone.utc), chat=chat, **fields)
+
+    async def send_media_group(self, chat_id, media, *args, **kwargs):
+        await asyncio.sleep(0.001)
+        sources = [item.media for item in media]
+        if STALE_FILE_ID in sources:
+            self.counts['rejected'] += 1
+            raise BadRequest("Wrong file identifier/http url specified")
+        if all(isinstance(source, str) for source in sources):
+            self.counts['file_id'] += 1
+        else:
+            self.counts['uploads'] += 1
+        return tuple(
+            self._message(photo=(PhotoSize(f'uploaded-{index}', f'uploaded-{index}', 1280, 720),))
+            for index in range(len(media))
+        )
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        self.counts['text'] += 1
+        return self._message(text=text)
+
+
+def _cached_part(refetched: list, content: bytes | None) -> MediaResult:
+    async def refetch():
+        refetched.append(content)
+        return SpooledMedia(data=content, size=len(content)) if content else None
+
+    return MediaResult(media_type='photo', file_id=STALE_FILE_ID, refetch=refetch)
+
+
+def _run_album(album_media: AlbumMediaResult) -> tuple[list, AlbumBot]:
+    bot = AlbumBot()
+    payload = ContentPayload(text='text', caption='caption', reply_markup=None, parse_mode=None)
+
+    async def fan_out():
+        tasks = sender.launch_album_sends(bot, payload, album_media, TARGETS, asyncio.Semaphore(len(TARGETS)), "[Test] ")
+        return await asyncio.gather(*tasks)
+
+    return asyncio.run(fan_out()), bot
+
+
+def test_rejected_cached_album_is_downloaded_and_uploaded_once():
+    refetched, cached = [], []
+    album_media = AlbumMediaResult(parts=[_cached_part(refetched, b'one'), _cached_part(refetched, b'two')])
+    for part in album_media.parts:
+        part.on_file_id = cached.append
+    results, bot = _run_album(album_media)
+
+    assert results == [True] * len(TARGETS)
+    assert refetched == [b'one', b'two'] # Each cached part downloaded once
+    assert bot.counts['uploads'] == 1
+    assert bot.counts['file_id'] == len(TARGETS) - 1
+    assert bot.counts['text'] == 0
+    assert cached == ['uploaded-0', 'uploaded-1'] # The new file_ids replace the stale cache entries
+    assert album_media.upload_count == 1
+
+
+def test_rejected_cached_album_falls_back_to_text_when_the_download_fails():
+    refetched = []
+    album_media = AlbumMediaResult(parts=[_cached_part(refetched, b'one'), _cached_part(refetched, None)])
+    results, bot = _run_album(album_media)
+
+    assert results == [True] * len(TARGETS)
+    assert len(refetched) == 2
+    assert bot.counts['uploads'] == 0
+    assert bot.counts['text'] == len(TARGETS)
+
+
+def test_album_is_handed_over_with_its_first_part():
+    async def scenario():
+        handed_over = []
+
+        async def enqueue(album):
+            handed_over.append(album)
+            return True
+
+        aggregator = AlbumAggregator(enqueue, window_seconds=0.05)
+        parts = [SimpleNamespace(id=message_id, grouped_id=7) for message_id in (12, 11)]
+        assert await aggregator.add(parts[0])
+        assert len(handed_over) == 1 and not handed_over[0].complete.is_set() # Queued before it is complete
+        assert await aggregator.add(parts[1])
+        assert not await aggregator.add(SimpleNamespace(id=13, grouped_id=None))
+
+        album = handed_over[0]
+        await asyncio.wait_for(album.wait_complete(), timeout=1)
+        return [m.id for m in album.messages], len(handed_over)
+
+    assert asyncio.run(scenario()) == ([11, 12], 1)
+
+
+def test_stop_completes_albums_and_waits_for_hand_overs():
+    async def scenario():
+        slot = asyncio.Event()
+        handed_over = []
+
+        async def enqueue(album): # Ingest queue full until the slot frees up
+            await slot.wait()
+            handed_over.append(album)
+            return True
+
+        aggregator = AlbumAggregator(enqueue, window_seconds=60)
+        add = asyncio.create_task(aggregator.add(SimpleNamespace(id=1, grouped_id=9)))
+        await asyncio.sleep(0)
+        add.cancel() # The Telethon handler goes away; the hand-over must not
+        stopping = asyncio.create_task(aggregator.stop())
+        await asyncio.sleep(0.01)
+        assert not stopping.done()
+        slot.set()
+        await stopping
+        return handed_over
+
+    handed_over = asyncio.run(scenario())
+    assert len(handed_over) == 1 and handed_over[0].complete.is_set()
+
+
+def test_split_batches_keep_the_reserved_lane_slot():
+    async def scenario():
+        dispatcher = LaneDispatcher()
+        order = []
+
+        async def send(label):
+            await asyncio.sleep(0)
+            order.append(label)
+
+        album_batch = dispatcher.open_batch([-1])
+        later_batch = dispatcher.open_batch([-1]) # A single message arriving after the album
+        later = later_batch.submit(-1, send('later'))
+        parts = album_batch.split(2)
+        tasks = [parts[1].submit(-1, send('part 2')), parts[0].submit(-1, send('part 1'))]
+        await asyncio.gather(later, *tasks)
+        return order, dispatcher.active_lanes
+
+    assert asyncio.run(scenario()) == (['part 1', 'part 2', 'later'], 0)
@@ -0,0 +1,30 @@
+# tests/test_file_utils.py
+# -*- coding: utf-8 -*-
+import asyncio
+
+from utils.helpers import file_utils
+from utils.helpers.file_utils import JsonWriteBehind, read_json
+
+
+def test_write_behind_coalesces_changes_and_flush_skips_the_delay(tmp_path, monkeypatch):
+    path = str(tmp_path / "registry.json")
+    state = {'items': []}
+    writes = []
+    real_write = file_utils.write_json_atomic
+
+    def counting_write(*args):
+        writes.append(args[1])
+        real_write(*args)
+
+    monkeypatch.setattr(file_utils, 'write_json_atomic', counting_write)
+    writer = JsonWriteBehind(path, lambda: list(state['items']), delay=60)
+
+    async def scenario():
+        for item in range(100):
+            state['items'].append(item)
+            writer.schedule()
+        await asyncio.wait_for(writer.flush(), 5) # Does not wait out the 60s delay
+
+    asyncio.run(scenario())
+    assert writes == [list(range(100))]
+    assert read_json(path) == list(range(100))
@@ -0,0 +1,66 @@
+# tests/test_ingest_queue.py
+# -*- coding: utf-8 -*-
+import asyncio
+from types import SimpleNamespace
+
+from handlers.ingest_queue import IngestQueue, OVERFLOW_BLOCK, OVERFLOW_DOWNGRADE, OVERFLOW_DROP_OLDEST
+
+
+def _message(message_id: int):
+    return SimpleNamespace(id=message_id)
+
+
+async def _fill_stalled_queue(policy: str, puts: int, maxsize: int = 2, max_waiting: int = 2):
+    """No workers running: the queue fills up and every further put() waits or is dropped."""
+    processed = []
+
+    async def process(item):
+        processed.append((item.message.id, item.downgraded))
+
+    ingest = IngestQueue(process, maxsize=maxsize, num_workers=1, overflow_policy=policy, max_waiting=max_waiting)
+    puts = [asyncio.create_task(ingest.put(_message(i))) for i in range(puts)]
+    await asyncio.sleep(0.01)
+    return ingest, puts, processed
+
+
+def test_block_drops_new_messages_once_max_waiting_is_reached():
+    async def scenario():
+        ingest, puts, processed = await _fill_stalled_queue(OVERFLOW_BLOCK, puts=6)
+        # 2 queued, 2 waiting for a slot, 2 dropped right away
+        assert [p.result() for p in puts if p.done()] == [True, True, False, False]
+        assert ingest.get_stats()['waiting'] == 2
+
+        ingest.start()
+        await ingest.stop()
+        assert [p.result() for p in puts] == [True, True, True, True, False, False]
+        return ingest, processed
+
+    ingest, processed = asyncio.run(scenario())
+    assert processed == [(0, False), (1, False), (2, False), (3, False)]
+    assert ingest.dropped_total == 2
+
+
+def test_downgrade_marks_waiting_messages_and_drops_past_the_cap():
+    async def scenario():
+        ingest, puts, processed = await _fill_stalled_queue(OVERFLOW_DOWNGRADE, puts=5, max_waiting=1)
+        ingest.start()
+        await ingest.stop()
+        return ingest, [p.result() for p in puts], processed
+
+    ingest, results, processed = asyncio.run(scenario())
+    assert results == [True, True, True, False, False]
+    assert processed == [(0, False), (1, False), (2, True)]
+    assert (ingest.dropped_total, ingest.downgraded_total) == (2, 1)
+
+
+def test_drop_oldest_never_waits():
+    async def scenario():
+        ingest, puts, processed = await _fill_stalled_queue(OVERFLOW_DROP_OLDEST, puts=5, max_waiting=0)
+        assert all(p.done() and p.result() for p in puts)
+        ingest.start()
+        await ingest.stop()
+        return ingest, processed
+
+    ingest, processed = asyncio.run(scenario())
+    assert processed == [(3, False), (4, False)]
+    assert ingest.dropped_total == 3
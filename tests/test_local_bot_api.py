@@ -0,0 +1,74 @@
+# tests/test_local_bot_api.py
+# -*- coding: utf-8 -*-
+import asyncio
+
+from config import settings
+from handlers.message_processing import sender
+from handlers.message_processing.content_formatter import ContentPayload
+from handlers.message_processing.media_handler import MediaResult
+from telegram_clients import setup
+from utils.helpers.media_utils import SpooledMedia
+from tests.bot_api_server import PHOTO_FILE_ID, start_local_server
+
+TOKEN = "123456:TEST"
+TARGETS = [-1001000000000 - i for i in range(5)]
+
+
+def _use_server(monkeypatch, port: int, local_mode: bool):
+    monkeypatch.setattr(settings, 'BOT_API_BASE_URL', f"http://127.0.0.1:{port}/bot")
+    monkeypatch.setattr(settings, 'BOT_API_BASE_FILE_URL', f"http://127.0.0.1:{port}/file/bot")
+    monkeypatch.setattr(settings, 'BOT_API_LOCAL_MODE', local_mode)
+
+
+def test_application_bot_sends_through_base_url(monkeypatch):
+    requests = []
+
+    async def scenario():
+        server, port = await start_local_server(requests)
+        async with server:
+            _use_server(monkeypatch, port, local_mode=False)
+            application = setup.setup_ptb_application(TOKEN, name="test")
+            await application.initialize()
+            try:
+                sent = await sender.execute_send(
+                    application.bot.send_message, {'chat_id': TARGETS[0], 'text': 'hello'},
+                    asyncio.Semaphore(1), "[Test] ", "Send text"
+                )
+            finally:
+                await application.shutdown()
+        return sent
+
+    assert asyncio.run(scenario())
+    assert [r.method for r in requests] == ['getMe', 'sendMessage']
+    assert all(r.path.startswith(f"/bot{TOKEN}/") for r in requests)
+    assert requests[1].params['text'] == 'hello'
+
+
+def test_local_mode_sends_media_by_path_once(monkeypatch, tmp_path):
+    requests = []
+    media_path = tmp_path / "media.jpg"
+    media_path.write_bytes(b'\xff\xd8' * 1024)
+
+    async def scenario():
+        server, port = await start_local_server(requests)
+        async with server:
+            _use_server(monkeypatch, port, local_mode=True)
+            bot = setup.setup_send_bot(TOKEN, name="test")
+            await bot.initialize()
+            try:
+                media_result = MediaResult(media_type='photo', spooled=SpooledMedia(path=str(media_path), size=2048))
+                payload = ContentPayload(text='text', caption='caption', reply_markup=None, parse_mode=None)
+                tasks = sender.launch_full_mode_sends(
+                    bot, payload, media_result, TARGETS, asyncio.Semaphore(len(TARGETS)), "[Test] "
+                )
+                return await asyncio.gather(*tasks)
+            finally:
+                await bot.shutdown()
+
+    assert asyncio.run(scenario()) == [True] * len(TARGETS)
+    photo_sends = [r for r in requests if r.method == 'sendPhoto']
+    assert len(photo_sends) == len(TARGETS)
+    # No multipart upload: the server is handed the file path, then the returned file_id is reused
+    assert not any(r.content_type.startswith('multipart/') for r in photo_sends)
+    assert photo_sends[0].params['photo'] == media_path.as_uri()
+    assert [r.params['photo'] for r in photo_sends[1:]] == [PHOTO_FILE_ID] * (len(TARGETS) - 1)
@@ -0,0 +1,36 @@
+# tests/test_media_prefetch.py
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+from types import SimpleNamespace
+
+from handlers import message_handlers
+from handlers.message_processing.media_handler import MediaResult
+from utils.helpers.media_utils import SpooledMedia
+
+
+def test_cancelled_prefetch_releases_the_shared_download(tmp_path, monkeypatch):
+    path = tmp_path / "media_1.mp4"
+    path.write_bytes(b'video')
+
+    async def process_media(analysis_result, client, bot, shared):
+        if bot == 'slow':
+            await asyncio.Event().wait() # Still resolving when the prefetch is cancelled
+        # Like _resolve_media: the memo keeps one reference, every bot's result another
+        download = shared.get('download:1')
+        if download is None:
+            download = shared['download:1'] = asyncio.get_running_loop().create_future()
+            download.set_result(SpooledMedia(path=str(path), size=5))
+        return MediaResult(media_type='video', spooled=download.result().share())
+
+    monkeypatch.setattr(message_handlers, 'process_media_for_full_mode', process_media)
+
+    async def scenario():
+        analysis_result = SimpleNamespace(media_type='video')
+        task = asyncio.create_task(message_handlers._prefetch_media(analysis_result, None, {1: 'fast', 2: 'slow'}))
+        await asyncio.sleep(0.01)
+        message_handlers._discard_media_prefetch(task) # e.g. no Full mode payload could be built
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert not os.path.exists(path)
@@ -0,0 +1,22 @@
+# tests/test_metrics.py
+# -*- coding: utf-8 -*-
+from utils import metrics
+
+
+def test_grouped_stats_keep_the_group_label_on_nested_dicts():
+    stats = {
+        'bot1': {'acquired_total': 3, 'parked': {'chat-a': 1, 'chat-b': 0}},
+        'bot2': {'acquired_total': 5, 'parked': {'chat-a': 2}},
+    }
+    lines = metrics._render_stats('scheduler', stats, 'bot', grouped=True)
+    series = [line.rsplit(' ', 1)[0] for line in lines if not line.startswith('#')]
+
+    assert len(series) == len(set(series)) # No duplicate series
+    assert 'forwarder_scheduler_acquired_total{bot="bot1"}' in series
+    assert 'forwarder_scheduler_parked{bot="bot2",key="chat-a"}' in series
+
+
+def test_ungrouped_nested_dict_uses_the_label():
+    lines = metrics._render_stats('bot_pool', {'bots': 2, 'assigned_chats': {1: 4}}, 'bot', grouped=False)
+    assert 'forwarder_bot_pool_assigned_chats{bot="1"} 4' in lines
+    assert 'forwarder_bot_pool_bots 2' in lines
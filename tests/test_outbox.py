@@ -0,0 +1,50 @@
+# tests/test_outbox.py
+# -*- coding: utf-8 -*-
+import asyncio
+import sqlite3
+
+from utils.outbox import Outbox
+
+JOB = {'message_id': 1, 'bot_id': 123456, 'kind': 'full', 'payload': {'text': 'text'}}
+
+
+def _outbox(path) -> Outbox:
+    return Outbox(str(path), commit_interval=0.001, batch_size=100)
+
+
+def test_failed_commit_is_retried_and_nothing_is_resumed(tmp_path):
+    path = tmp_path / "outbox.sqlite3"
+
+    async def deliver():
+        outbox = _outbox(path)
+        await outbox.open()
+        entries = await outbox.record(JOB, [-1001, -1002])
+
+        # The next commit fails once: the completions it carried, and a record queued with them, are kept
+        commit = outbox._commit
+        failures = []
+
+        def failing_commit(records, done):
+            if not failures:
+                failures.append(len(done))
+                raise sqlite3.OperationalError("database is locked")
+            return commit(records, done)
+
+        outbox._commit = failing_commit
+        for entry_id in entries.values():
+            outbox.mark_done(entry_id)
+        later_entries = await outbox.record({**JOB, 'message_id': 2}, [-1003])
+        outbox.mark_done(later_entries[-1003])
+        await outbox.close()
+        return failures
+
+    assert asyncio.run(deliver()) == [2]
+
+    async def resume():
+        outbox = _outbox(path)
+        await outbox.open()
+        pending = await outbox.load_pending()
+        await outbox.close()
+        return pending
+
+    assert asyncio.run(resume()) == []
@@ -0,0 +1,84 @@
+# tests/test_persistent_config.py
+# -*- coding: utf-8 -*-
+import asyncio
+import builtins
+
+import pytest
+
+from config import persistent_config
+from utils.helpers import file_utils
+
+
+@pytest.fixture(autouse=True)
+def registry_file(tmp_path, monkeypatch):
+    """Fresh, unloaded registry backed by a temp file."""
+    path = tmp_path / "target_groups.json"
+    monkeypatch.setattr(persistent_config, 'TARGET_GROUPS_FILE', str(path))
+    monkeypatch.setattr(persistent_config._writer, 'path', str(path))
+    monkeypatch.setattr(persistent_config, '_target_groups', frozenset())
+    monkeypatch.setattr(persistent_config, '_loaded', False)
+    return path
+
+
+def _count_calls(monkeypatch, owner, name: str, calls: list):
+    original = getattr(owner, name)
+
+    def counting(*args, **kwargs):
+        calls.append((name, args))
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(owner, name, counting)
+
+
+def test_hot_path_does_no_file_reads(registry_file, monkeypatch):
+    file_utils.write_json_atomic(str(registry_file), [-1001, -1002, -1003])
+    assert asyncio.run(persistent_config.load_target_groups()) # First load reads the file
+
+    calls = []
+    _count_calls(monkeypatch, builtins, 'open', calls)
+    _count_calls(monkeypatch, file_utils, 'read_json', calls)
+    _count_calls(monkeypatch, persistent_config, 'read_json', calls)
+
+    async def per_message_reads():
+        for _ in range(1000):
+            assert persistent_config.get_target_groups() == {-1001, -1002, -1003}
+        # Loading again is served from memory as well
+        assert sorted(await persistent_config.load_target_groups()) == [-1003, -1002, -1001]
+
+    asyncio.run(per_message_reads())
+    assert calls == []
+
+
+def test_add_and_remove_replace_the_snapshot(registry_file):
+    async def scenario():
+        await persistent_config.replace_target_groups([-1001])
+        before = persistent_config.get_target_groups()
+        assert await persistent_config.add_target_group(-1002)
+        assert not await persistent_config.add_target_group(-1002) # Already present
+        middle = persistent_config.get_target_groups()
+        assert await persistent_config.remove_target_group(-1001)
+        assert not await persistent_config.remove_target_group(-1001)
+        return before, middle
+
+    before, middle = asyncio.run(scenario())
+    # Readers holding an older snapshot are unaffected (copy-on-write, never mutated in place)
+    assert isinstance(before, frozenset)
+    assert before == {-1001}
+    assert middle == {-1001, -1002}
+    assert persistent_config.get_target_groups() == {-1002}
+
+
+def test_flush_writes_the_newest_snapshot(registry_file, monkeypatch):
+    writes = []
+    _count_calls(monkeypatch, file_utils, 'write_json_atomic', writes)
+
+    async def scenario():
+        await persistent_config.replace_target_groups([])
+        writes.clear()
+        for group_id in range(-1010, -1000):
+            await persistent_config.add_target_group(group_id) # Only schedules the write-behind save
+        await persistent_config.flush_target_groups()
+
+    asyncio.run(scenario())
+    assert file_utils.read_json(str(registry_file)) == list(range(-1010, -1000))
+    assert 1 <= len(writes) < 10 # Changes made while a save is pending are coalesced
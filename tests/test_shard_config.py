@@ -0,0 +1,52 @@
+# tests/test_shard_config.py
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from config import shard_config
+
+PRIMARY = 111
+SHARD = 222
+
+
+@pytest.fixture(autouse=True)
+def shard_map(tmp_path, monkeypatch):
+    """Empty, unloaded shard map backed by a temp file."""
+    path = tmp_path / "shard_map.json"
+    monkeypatch.setattr(shard_config, 'SHARD_MAP_FILE', str(path))
+    monkeypatch.setattr(shard_config._writer, 'path', str(path))
+    monkeypatch.setattr(shard_config, '_assignments', {})
+    monkeypatch.setattr(shard_config, '_members', {})
+    monkeypatch.setattr(shard_config, '_primary_bot_id', None)
+    monkeypatch.setattr(shard_config, '_loaded', False)
+    return path
+
+
+def test_existing_targets_stay_with_the_primary_bot():
+    async def scenario():
+        await shard_config.load_shard_map(PRIMARY, [-1001, -1002])
+        assert shard_config.get_member_bots(-1001) == {PRIMARY}
+
+        # A shard bot joins a target the primary bot served before sharding, then leaves again
+        assert shard_config.add_member(-1001, SHARD) == SHARD
+        assert shard_config.remove_member(-1001, SHARD) == PRIMARY
+        assert shard_config.get_assigned_bot(-1001) == PRIMARY
+        await shard_config.flush_shard_map()
+
+    asyncio.run(scenario())
+
+
+def test_chat_without_recorded_members_goes_back_to_the_primary_bot():
+    async def scenario():
+        await shard_config.load_shard_map(PRIMARY, [])
+        shard_config.add_member(-1003, SHARD) # Joined after the map was loaded, primary membership unknown
+
+        assert shard_config.remove_member(-1003, SHARD) == PRIMARY
+        # If the primary bot turns out not to be there either, the target is dropped
+        assert shard_config.remove_member(-1003, PRIMARY) is None
+        assert shard_config.get_assigned_bot(-1003) is None
+        assert shard_config.get_member_bots(-1003) == frozenset()
+        await shard_config.flush_shard_map()
+
+    asyncio.run(scenario())
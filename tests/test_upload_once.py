@@ -0,0 +1,91 @@
+# tests/test_upload_once.py
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+
+from telegram import Bot, Chat, Message, PhotoSize
+from telegram.error import BadRequest, Forbidden
+
+from config import settings
+from handlers.message_processing import sender
+from handlers.message_processing.content_formatter import ContentPayload
+from handlers.message_processing.media_handler import MediaResult
+from utils.helpers.media_utils import SpooledMedia
+
+TARGETS = [-1001000000000 - i for i in range(25)]
+
+
+class CountingBot(Bot):
+    """Answers send_photo/send_message locally and counts uploads (bytes) vs file_id sends."""
+
+    def __init__(self, fail_uploads: bool = False, gone_chats: set[int] = frozenset()):
+        super().__init__("123456:TEST")
+        with self._unfrozen():
+            self.fail_uploads = fail_uploads
+            self.gone_chats = gone_chats
+            self.counts = {'uploads': 0, 'file_id': 0, 'text': 0}
+
+    def _message(self, **fields) -> Message:
+        chat = Chat(id=-1, type=Chat.SUPERGROUP)
+        return Message(message_id=1, date=datetime.datetime.now(datetime.timezone.utc), chat=chat, **fields)
+
+    async def send_photo(self, chat_id, photo, *args, **kwargs):
+        await asyncio.sleep(0.001)
+        if isinstance(photo, str):
+            self.counts['file_id'] += 1
+        else:
+            self.counts['uploads'] += 1
+            if chat_id in self.gone_chats:
+                raise Forbidden("Forbidden: bot is not a member of the supergroup chat")
+            if self.fail_uploads:
+                raise BadRequest("Upload failed")
+        return self._message(photo=(PhotoSize('uploaded-photo', 'uploaded-photo', 1280, 720),))
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        self.counts['text'] += 1
+        return self._message(text=text)
+
+
+def _run_fan_out(bot: CountingBot) -> tuple[list, MediaResult]:
+    media_result = MediaResult(media_type='photo', spooled=SpooledMedia(data=b'\x89PNG', size=4))
+    payload = ContentPayload(text='text', caption='caption', reply_markup=None, parse_mode=None)
+
+    async def fan_out():
+        tasks = sender.launch_full_mode_sends(
+            bot, payload, media_result, TARGETS, asyncio.Semaphore(len(TARGETS)), "[Test] "
+        )
+        return await asyncio.gather(*tasks)
+
+    return asyncio.run(fan_out()), media_result
+
+
+def test_media_is_uploaded_once_across_targets():
+    bot = CountingBot()
+    results, media_result = _run_fan_out(bot)
+
+    assert results == [True] * len(TARGETS)
+    assert bot.counts == {'uploads': 1, 'file_id': len(TARGETS) - 1, 'text': 0}
+    assert media_result.upload_count == 1
+
+
+def test_failed_upload_is_not_retried_by_default():
+    assert settings.UPLOAD_ONCE_MAX_ATTEMPTS == 1
+    bot = CountingBot(fail_uploads=True)
+    results, _ = _run_fan_out(bot)
+
+    # The carrier gets the text version too, like every other target
+    assert bot.counts == {'uploads': 1, 'file_id': 0, 'text': len(TARGETS)}
+    assert results == [True] * len(TARGETS)
+
+
+def test_chat_error_passes_the_carrier_role_on(monkeypatch):
+    chat_events = []
+    monkeypatch.setattr(sender, '_chat_event_sink', chat_events.append) # Keep the registries untouched
+    bot = CountingBot(gone_chats={TARGETS[0], TARGETS[1]})
+    results, media_result = _run_fan_out(bot)
+
+    # Kicked from the first two targets: no upload attempt is used up, the third target carries the upload
+    assert results == [False, False] + [True] * (len(TARGETS) - 2)
+    assert bot.counts == {'uploads': 3, 'file_id': len(TARGETS) - 3, 'text': 0}
+    assert media_result.upload_count == 1
+    assert [event[1] for event in chat_events] == TARGETS[:2]
@@ -2,7 +2,11 @@
 # -*- coding: utf-8 -*-
 import time
 import logging
+from collections import OrderedDict, deque
+
 from telegram import Bot
+
+from config import settings
 # --->>> THAY ĐỔI IMPORT HELPERS <<<---
 # from . import helpers as utils_helpers # Xóa dòng này
 from .helpers import media_utils # Import submodule cụ thể
@@ -10,63 +14,161 @@ from .helpers import media_utils # Import submodule cụ thể
 
 logger = logging.getLogger(__name__)
 
+_ENTRY_OVERHEAD_BYTES = 200 # Rough per-entry cost of the dict, key and bookkeeping
+
+
+def _estimate_bytes(context_id: str, data: dict) -> int:
+    size = _ENTRY_OVERHEAD_BYTES + len(context_id)
+    for value in data.values():
+        if isinstance(value, str):
+            size += len(value)
+    return size
+
+
+class _ContextEntry:
+    __slots__ = ('data', 'expires_at', 'size')
+
+    def __init__(self, data: dict, expires_at: float, size: int):
+        self.data = data
+        self.expires_at = expires_at
+        self.size = size
+
+
+class ContextCache:
+    """
+    TTL cache of message contexts ({'text', 'media_type', 'file_id'}) for the deep links.
+    OrderedDict in LRU order for O(1) get/put and eviction; a deque of (expires_at, id, entry)
+    in insertion order (= expiry order, the TTL is fixed) so expiry only touches expired entries.
+    Deque items of replaced or removed entries are skipped when they reach the front.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int, max_bytes: int):
+        self._ttl = ttl_seconds
+        self._max_entries = max(1, max_entries)
+        self._max_bytes = max(1, max_bytes)
+        self._entries: OrderedDict[str, _ContextEntry] = OrderedDict()
+        self._expiry: deque[tuple[float, str, _ContextEntry]] = deque()
+        self._bytes = 0
+
+        # Counters
+        self.hits_total = 0
+        self.misses_total = 0
+        self.expired_total = 0
+        self.evictions_total = 0 # Removed by the entry/byte caps
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, context_id: str) -> _ContextEntry | None:
+        entry = self._entries.pop(context_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def expire(self, now: float | None = None) -> int:
+        """Removes expired entries from the front of the expiry deque. Returns how many were removed."""
+        if now is None:
+            now = time.monotonic()
+        expiry, entries = self._expiry, self._entries
+        removed = 0
+        while expiry and expiry[0][0] <= now:
+            _, context_id, entry = expiry.popleft()
+            if entries.get(context_id) is entry: # Not replaced/removed since
+                self._drop(context_id)
+                removed += 1
+        # Compact once stale deque items (replaced/removed entries) outnumber the live ones
+        if len(expiry) > 2 * len(entries) + 64:
+            self._expiry = deque(item for item in expiry if entries.get(item[1]) is item[2])
+        self.expired_total += removed
+        return removed
+
+    def put(self, context_id: str, data: dict):
+        now = time.monotonic()
+        self.expire(now)
+        self._drop(context_id)
+        entry = _ContextEntry(data, now + self._ttl, _estimate_bytes(context_id, data))
+        self._entries[context_id] = entry
+        self._expiry.append((entry.expires_at, context_id, entry))
+        self._bytes += entry.size
+        while len(self._entries) > self._max_entries or (self._bytes > self._max_bytes and len(self._entries) > 1):
+            _, evicted = self._entries.popitem(last=False) # Least recently used
+            self._bytes -= evicted.size
+            self.evictions_total += 1
+
+    def get(self, context_id: str) -> dict | None:
+        entry = self._entries.get(context_id)
+        if entry is None:
+            self.misses_total += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._drop(context_id)
+            self.expired_total += 1
+            self.misses_total += 1
+            return None
+        self._entries.move_to_end(context_id)
+        self.hits_total += 1
+        return entry.data
+
+    def remove(self, context_id: str) -> bool:
+        return self._drop(context_id) is not None
+
+    def get_stats(self) -> dict:
+        lookups = self.hits_total + self.misses_total
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'capacity': self._max_entries,
+            'capacity_bytes': self._max_bytes,
+            'hits_total': self.hits_total,
+            'misses_total': self.misses_total,
+            'expired_total': self.expired_total,
+            'evictions_total': self.evictions_total,
+            'hit_rate': (self.hits_total / lookups) if lookups else 0.0,
+        }
+
+
+_cache: ContextCache | None = None
+
+def get_context_cache() -> ContextCache:
+    """Returns the process-wide context cache (created from settings on first use)."""
+    global _cache
+    if _cache is None:
+        _cache = ContextCache(
+            ttl_seconds=settings.CONTEXT_CACHE_TTL_SECONDS,
+            max_entries=settings.CONTEXT_CACHE_MAX_ENTRIES,
+            max_bytes=settings.CONTEXT_CACHE_MAX_BYTES,
+        )
+    return _cache
 
-# Structure: { context_id: {'text': ..., 'media_type': ..., 'file_id': ..., 'timestamp': ...} }
-message_context_cache = {}
-CACHE_TTL_SECONDS = 600 # Keep context for 10 minutes (tăng lên một chút)
 
 def cleanup_cache():
-    # ... (logic giữ nguyên) ...
-    """Removes expired entries from the cache."""
-    now = time.time()
-    expired_keys = [
-        key for key, value in message_context_cache.items()
-        if now - value.get('timestamp', 0) > CACHE_TTL_SECONDS
-    ]
-    count = 0
-    for key in expired_keys:
-        try:
-            del message_context_cache[key]
-            count += 1
-        except KeyError:
-            pass # Already removed
+    """Removes expired entries from the cache (only touches entries that actually expired)."""
+    count = get_context_cache().expire()
     if count > 0:
         logger.debug(f"Removed {count} expired context cache entries.")
 
 
 def add_to_cache(context_id: str, data: dict):
-    # ... (logic giữ nguyên) ...
-    """Adds data to the cache with a timestamp."""
-    data['timestamp'] = time.time()
-    message_context_cache[context_id] = data
-    logger.info(f"Stored message context in cache with ID: {context_id}")
+    """Adds (or replaces) data in the cache; expires after CONTEXT_CACHE_TTL_SECONDS."""
+    get_context_cache().put(context_id, data)
+    logger.debug(f"Stored message context in cache with ID: {context_id}")
 
 
 def get_from_cache(context_id: str) -> dict | None:
-    # ... (logic giữ nguyên) ...
     """Gets data from cache if it exists and is not expired."""
-    cached_data = message_context_cache.get(context_id)
-    if not cached_data:
-        logger.warning(f"Context ID {context_id} not found in cache.")
-        return None
-
-    now = time.time()
-    if now - cached_data.get('timestamp', 0) > CACHE_TTL_SECONDS:
-        logger.warning(f"Context ID {context_id} expired.")
-        try: del message_context_cache[context_id] # Clean up expired entry
-        except KeyError: pass
-        return None
-
+    cached_data = get_context_cache().get(context_id)
+    if cached_data is None:
+        logger.warning(f"Context ID {context_id} not found in cache or expired.")
     return cached_data
 
 def remove_from_cache(context_id: str):
-    # ... (logic giữ nguyên) ...
     """Removes an entry from the cache."""
-    try:
-        del message_context_cache[context_id]
+    if get_context_cache().remove(context_id):
         logger.debug(f"Removed context cache key: {context_id}")
-    except KeyError:
-        pass # Ignore if already removed
+
+
+def get_stats() -> dict:
+    return get_context_cache().get_stats()
 
 
 # --->>> THÊM HÀM HELPER NÀY VÀO ĐÂY <<<---
@@ -78,6 +180,15 @@ async def resend_cached_message(chat_id: int, context_id: str, bot: Bot) -> bool
     if not cached_data:
         return False # Not found or expired
 
+    try:
+        return await send_context_content(chat_id, cached_data, bot, context_id)
+    finally:
+        # Always remove from cache after attempting resend (success or fail)
+        remove_from_cache(context_id) # Use remove_from_cache defined above
+
+
+async def send_context_content(chat_id: int, cached_data: dict, bot: Bot, context_id: str) -> bool:
+    """Sends the content of a context ({'text', 'media_type', 'file_id'}) to chat_id (context_id is for logs)."""
     logger.debug(f"Resending message content for context ID: {context_id}")
     text = cached_data.get('text', '') # Sử dụng caption làm text gốc nếu có media
     media_type = cached_data.get('media_type')
@@ -117,7 +228,6 @@ async def resend_cached_message(chat_id: int, context_id: str, bot: Bot) -> bool
             logger.debug("Prepared to resend text message.")
         else:
             logger.warning(f"No content found in cache for context ID {context_id} to resend.")
-            # remove_from_cache sẽ được gọi trong finally
             return False
 
         if resend_func:
@@ -131,9 +241,6 @@ async def resend_cached_message(chat_id: int, context_id: str, bot: Bot) -> bool
     except Exception as e:
         logger.error(f"Error resending cached message for {context_id}: {e}", exc_info=True)
         success = False
-    finally:
-        # Always remove from cache after attempting resend (success or fail)
-         remove_from_cache(context_id) # Use remove_from_cache defined above
 
     return success # Return True only if function was found and called without error
 # ------------------------------------------------
\ No newline at end of file
@@ -0,0 +1,109 @@
+# utils/dedupe_index.py
+# -*- coding: utf-8 -*-
+import logging
+import time
+from collections import OrderedDict
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Policies for a message whose status ID was already seen inside the window
+POLICY_SUPPRESS = 'suppress' # Skip it (no download, no upload, no sends)
+POLICY_ALLOW = 'allow'       # Forward it anyway
+VALID_POLICIES = {POLICY_SUPPRESS, POLICY_ALLOW}
+DEFAULT_POLICY_KEY = 'default'
+
+
+def parse_policy_map(raw: str) -> dict[str, str]:
+    """Parses 'Tweet:suppress,Quote:allow,default:suppress' into {'tweet': 'suppress', ...}."""
+    policies = {DEFAULT_POLICY_KEY: POLICY_SUPPRESS}
+    for item in (raw or "").split(','):
+        if not item.strip():
+            continue
+        action, _, policy = item.partition(':')
+        action, policy = action.strip().lower(), policy.strip().lower()
+        if policy not in VALID_POLICIES:
+            logger.warning(f"Ignoring invalid dedupe policy '{item.strip()}'. Valid policies: {sorted(VALID_POLICIES)}")
+            continue
+        policies[action] = policy
+    return policies
+
+
+class DedupeIndex:
+    """
+    Bounded, time-windowed index of recently forwarded tweet status IDs.
+    OrderedDict in first-seen order: expiry pops from the front, the size cap evicts the oldest.
+    """
+
+    def __init__(self, window_seconds: float, max_entries: int, policies: dict[str, str]):
+        self._window = window_seconds
+        self._max_entries = max(1, max_entries)
+        self._policies = policies
+        self._seen: OrderedDict[str, float] = OrderedDict()
+
+        # Counters
+        self.checks_total = 0
+        self.hits_total = 0 # Duplicates seen inside the window
+        self.suppressed_total = 0
+        self.misses_total = 0
+
+    def _expire(self, now: float):
+        seen = self._seen
+        while seen:
+            status_id, first_seen = next(iter(seen.items()))
+            if now - first_seen <= self._window:
+                break
+            seen.popitem(last=False)
+
+    def policy_for(self, action_type: str | None) -> str:
+        key = (action_type or DEFAULT_POLICY_KEY).lower()
+        return self._policies.get(key, self._policies[DEFAULT_POLICY_KEY])
+
+    def check_and_record(self, status_id: str | None, action_type: str | None) -> bool:
+        """
+        Records status_id and returns True if this message should be suppressed as a duplicate.
+        Messages without a status ID are never suppressed.
+        """
+        if not status_id:
+            return False
+        now = time.monotonic()
+        self.checks_total += 1
+        self._expire(now)
+
+        if status_id in self._seen:
+            self.hits_total += 1
+            if self.policy_for(action_type) == POLICY_SUPPRESS:
+                self.suppressed_total += 1
+                return True
+            return False # Duplicate but allowed; keep the original first-seen time
+
+        self.misses_total += 1
+        self._seen[status_id] = now
+        if len(self._seen) > self._max_entries:
+            self._seen.popitem(last=False)
+        return False
+
+    def get_stats(self) -> dict:
+        return {
+            'entries': len(self._seen),
+            'checks_total': self.checks_total,
+            'hits_total': self.hits_total,
+            'suppressed_total': self.suppressed_total,
+            'misses_total': self.misses_total,
+            'hit_rate': (self.hits_total / self.checks_total) if self.checks_total else 0.0,
+        }
+
+
+_index: DedupeIndex | None = None
+
+def get_dedupe_index() -> DedupeIndex:
+    """Returns the process-wide dedupe index (created from settings on first use)."""
+    global _index
+    if _index is None:
+        _index = DedupeIndex(
+            window_seconds=settings.DEDUPE_WINDOW_SECONDS,
+            max_entries=settings.DEDUPE_MAX_ENTRIES,
+            policies=parse_policy_map(settings.DEDUPE_POLICY),
+        )
+    return _index
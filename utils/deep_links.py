@@ -0,0 +1,291 @@
+# utils/deep_links.py
+# -*- coding: utf-8 -*-
+"""
+Signed "Deploy" deep links. The start parameter only carries the source message ID and an
+HMAC of it (28 characters of [A-Za-z0-9_-], within Telegram's 64 character limit); the text,
+media type and file_id needed to resend the message live in a small SQLite index keyed by that
+ID, so nothing is kept in memory per forwarded message and links keep working after a restart.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import secrets
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram import Bot
+
+from config import settings
+from utils import context_cache
+
+logger = logging.getLogger(__name__)
+
+LINK_PREFIX = 'm' # Format marker of the signed payload (legacy links start with 'deploy_')
+_ID_BYTES = 8
+_MAC_BYTES = 12
+_ID_CHARS = 11 # base64url length of _ID_BYTES without padding
+_MAC_CHARS = 16
+PAYLOAD_LENGTH = len(LINK_PREFIX) + _ID_CHARS + _MAC_CHARS
+_MAC_DOMAIN = b'deploy:'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contexts (
+    message_id INTEGER PRIMARY KEY,
+    text TEXT,
+    media_type TEXT,
+    file_id TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contexts_created ON contexts(created_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+_PRUNE_INTERVAL_SECONDS = 3600
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _mac(key: bytes, id_bytes: bytes) -> bytes:
+    return hmac.new(key, _MAC_DOMAIN + id_bytes, hashlib.sha256).digest()[:_MAC_BYTES]
+
+
+def encode_payload(key: bytes, message_id: int) -> str:
+    id_bytes = message_id.to_bytes(_ID_BYTES, 'big')
+    return f"{LINK_PREFIX}{_b64encode(id_bytes)}{_b64encode(_mac(key, id_bytes))}"
+
+
+def decode_payload(key: bytes, payload: str) -> int | None:
+    """Returns the message ID of a signed start parameter, or None if it is malformed or forged."""
+    if len(payload) != PAYLOAD_LENGTH or not payload.startswith(LINK_PREFIX):
+        return None
+    try:
+        id_bytes = _b64decode(payload[len(LINK_PREFIX):len(LINK_PREFIX) + _ID_CHARS])
+        mac = _b64decode(payload[len(LINK_PREFIX) + _ID_CHARS:])
+    except (ValueError, TypeError):
+        return None
+    if len(id_bytes) != _ID_BYTES or not hmac.compare_digest(mac, _mac(key, id_bytes)):
+        return None
+    return int.from_bytes(id_bytes, 'big')
+
+
+class DeepLinkIndex:
+    """
+    Persistent message_id -> {'text', 'media_type', 'file_id'} index behind the signed links.
+    Writes are buffered and committed in one transaction per flush (debounced), reads check the
+    buffer first. Entries older than the retention are pruned.
+    """
+
+    def __init__(self, path: str, secret: str = '', retention_seconds: float = 30 * 86400, flush_seconds: float = 0.5):
+        self._path = path
+        self._secret = secret
+        self._retention = retention_seconds
+        self._flush_seconds = flush_seconds
+        self._conn: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="deep-links")
+        self._key = b''
+        self._pending: dict[int, dict] = {} # Not yet committed; 'text' missing = file_id update only
+        self._flush_task: asyncio.Task | None = None
+        self._last_prune = 0.0
+
+        # Counters
+        self.records_total = 0
+        self.resolved_total = 0
+        self.invalid_total = 0 # Malformed or forged links
+        self.not_found_total = 0 # Valid links whose entry was pruned
+        self.pruned_total = 0
+
+    # --- Writer thread ---
+    def _connect(self):
+        conn = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        if self._secret:
+            self._key = self._secret.encode('utf-8')
+        else:
+            # No configured secret: generate one once and keep it with the index
+            row = conn.execute("SELECT value FROM meta WHERE key = 'hmac_key'").fetchone()
+            if row is None:
+                conn.execute("INSERT INTO meta (key, value) VALUES ('hmac_key', ?)", (secrets.token_hex(32),))
+                row = conn.execute("SELECT value FROM meta WHERE key = 'hmac_key'").fetchone()
+            self._key = bytes.fromhex(row[0])
+        self._conn = conn
+
+    def _write(self, pending: dict[int, dict], prune_before: float | None) -> int:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for message_id, row in pending.items():
+                if 'text' in row:
+                    conn.execute(
+                        "INSERT INTO contexts (message_id, text, media_type, file_id, created_at) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT(message_id) DO UPDATE SET text = excluded.text, media_type = excluded.media_type, "
+                        "file_id = COALESCE(excluded.file_id, contexts.file_id), created_at = excluded.created_at",
+                        (message_id, row['text'], row['media_type'], row.get('file_id'), row['created_at']),
+                    )
+                else:
+                    conn.execute("UPDATE contexts SET file_id = ? WHERE message_id = ?", (row['file_id'], message_id))
+            pruned = conn.execute("DELETE FROM contexts WHERE created_at < ?", (prune_before,)).rowcount if prune_before else 0
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return pruned
+
+    def _read(self, message_id: int) -> dict | None:
+        row = self._conn.execute("SELECT text, media_type, file_id FROM contexts WHERE message_id = ?", (message_id,)).fetchone()
+        if row is None:
+            return None
+        return {'text': row[0] or '', 'media_type': row[1], 'file_id': row[2]}
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # --- Public API ---
+    async def open(self):
+        if self._conn is None:
+            await self._run(self._connect)
+            logger.info(f"Deep link index opened at {self._path}.")
+
+    def make_payload(self, message_id: int) -> str:
+        return encode_payload(self._key, message_id)
+
+    def record(self, message_id: int, text: str, media_type: str | None):
+        """Stores what a link to message_id resends (committed with the next flush)."""
+        row = self._pending.get(message_id)
+        file_id = row.get('file_id') if row else None
+        self._pending[message_id] = {'text': text, 'media_type': media_type, 'file_id': file_id, 'created_at': time.time()}
+        self.records_total += 1
+        self._schedule_flush()
+
+    def set_file_id(self, message_id: int, file_id: str):
+        """Adds the Bot API file_id of the message's media once the first delivery returned it."""
+        self._pending.setdefault(message_id, {})['file_id'] = file_id
+        self._schedule_flush()
+
+    async def resolve(self, payload: str) -> dict | None:
+        """Returns the context of a signed start parameter, or None (invalid, forged or pruned)."""
+        message_id = decode_payload(self._key, payload)
+        if message_id is None:
+            self.invalid_total += 1
+            return None
+        data = await self._run(self._read, message_id)
+        pending = self._pending.get(message_id)
+        if pending:
+            data = {**(data or {}), **pending}
+        if not data or 'text' not in data:
+            self.not_found_total += 1
+            return None
+        self.resolved_total += 1
+        return data
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self._flush_seconds) # Batch a burst of messages into one commit
+        await self.flush()
+
+    async def flush(self):
+        if self._conn is None:
+            return
+        pending, self._pending = self._pending, {}
+        now = time.time()
+        prune_before = None
+        if now - self._last_prune > _PRUNE_INTERVAL_SECONDS:
+            self._last_prune = now
+            prune_before = now - self._retention
+        if not pending and prune_before is None:
+            return
+        try:
+            pruned = await self._run(self._write, pending, prune_before)
+        except Exception as e:
+            logger.error(f"Failed to write {len(pending)} deep link entries to {self._path}: {e}", exc_info=True)
+            for message_id, row in pending.items(): # Retry with the next flush (newer values win)
+                self._pending[message_id] = {**row, **self._pending.get(message_id, {})}
+            return
+        if pruned:
+            self.pruned_total += pruned
+            logger.debug(f"Pruned {pruned} deep link entries older than the retention.")
+
+    async def close(self):
+        if self._conn is None:
+            return
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        await self._run(self._conn.close)
+        self._conn = None
+        self._executor.shutdown(wait=False)
+        logger.info(f"Deep link index closed (stats: {self.get_stats()}).")
+
+    def get_stats(self) -> dict:
+        return {
+            'records_total': self.records_total,
+            'pending': len(self._pending),
+            'resolved_total': self.resolved_total,
+            'invalid_total': self.invalid_total,
+            'not_found_total': self.not_found_total,
+            'pruned_total': self.pruned_total,
+        }
+
+
+_index: DeepLinkIndex | None = None
+
+
+async def open_deep_link_index() -> DeepLinkIndex:
+    """Opens the process-wide deep link index."""
+    global _index
+    if _index is None:
+        index = DeepLinkIndex(
+            settings.DEEP_LINK_INDEX_FILE,
+            secret=settings.DEEP_LINK_SECRET,
+            retention_seconds=settings.DEEP_LINK_RETENTION_DAYS * 86400,
+        )
+        await index.open()
+        _index = index
+    return _index
+
+
+def get_deep_link_index() -> DeepLinkIndex | None:
+    return _index
+
+
+async def close_deep_link_index():
+    global _index
+    if _index is not None:
+        index, _index = _index, None
+        await index.close()
+
+
+def is_signed_payload(payload: str) -> bool:
+    return len(payload) == PAYLOAD_LENGTH and payload.startswith(LINK_PREFIX)
+
+
+async def resend_linked_message(chat_id: int, payload: str, bot: Bot) -> bool:
+    """Resolves a signed start parameter and resends the message content to chat_id."""
+    index = get_deep_link_index()
+    if index is None:
+        logger.error("Deep link index is not open: cannot resolve deep link.")
+        return False
+    data = await index.resolve(payload)
+    if data is None:
+        logger.warning(f"Deep link payload '{payload}' is invalid or its message is no longer indexed.")
+        return False
+    return await context_cache.send_context_content(chat_id, data, bot, payload)
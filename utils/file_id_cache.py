@@ -0,0 +1,120 @@
+# utils/file_id_cache.py
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+from config import settings
+from utils.helpers.file_utils import JsonWriteBehind, read_json
+
+logger = logging.getLogger(__name__)
+
+FILE_ID_CACHE_FILE = os.path.join(settings.PROJECT_ROOT, "file_id_cache.json")
+
+# LRU: key -> {'file_id': str, 'media_type': str}. Most recently used entries are at the end.
+# Key = "<bot_id>:<telethon media identity>" because Bot API file_ids are only valid for the bot that got them.
+_entries: OrderedDict[str, dict] = OrderedDict()
+_loaded = False
+# Debounced write-behind: bursts of puts end up in one write
+_writer = JsonWriteBehind(
+    FILE_ID_CACHE_FILE,
+    lambda: [[key, e['file_id'], e['media_type']] for key, e in _entries.items()],
+    delay=settings.FILE_ID_CACHE_FLUSH_SECONDS,
+    indent=None,
+)
+
+# Counters
+hits_total = 0
+misses_total = 0
+evictions_total = 0
+
+
+def make_key(bot_id: int | None, media_key: str | None) -> str | None:
+    if not media_key:
+        return None
+    return f"{bot_id or 0}:{media_key}"
+
+
+def get(key: str | None) -> dict | None:
+    """Returns {'file_id', 'media_type'} for the media identity, or None (counts hit/miss)."""
+    global hits_total, misses_total
+    if not key:
+        return None
+    entry = _entries.get(key)
+    if entry is None:
+        misses_total += 1
+        return None
+    _entries.move_to_end(key)
+    hits_total += 1
+    return entry
+
+
+def put(key: str | None, file_id: str, media_type: str):
+    """Stores a file_id for the media identity and schedules a (debounced) save."""
+    global evictions_total
+    if not key or not file_id:
+        return
+    _entries[key] = {'file_id': file_id, 'media_type': media_type}
+    _entries.move_to_end(key)
+    while len(_entries) > settings.FILE_ID_CACHE_MAX_ENTRIES:
+        _entries.popitem(last=False)
+        evictions_total += 1
+    _writer.schedule()
+
+
+def invalidate(key: str | None):
+    """Drops an entry (e.g. Telegram rejected the cached file_id)."""
+    if key and _entries.pop(key, None) is not None:
+        _writer.schedule()
+
+
+def _read_cache_file() -> list:
+    try:
+        data = read_json(FILE_ID_CACHE_FILE, default=[])
+        if not isinstance(data, list):
+            logger.error(f"Invalid format in {FILE_ID_CACHE_FILE}. Expected a list. Starting with an empty file_id cache.")
+            return []
+        return data
+    except Exception as e:
+        logger.error(f"Failed to load file_id cache from {FILE_ID_CACHE_FILE}: {e}. Starting empty.")
+        return []
+
+
+async def load():
+    """Loads the persisted cache (oldest -> newest) once, off the event loop."""
+    global _loaded
+    if _loaded:
+        return
+    data = await asyncio.to_thread(_read_cache_file)
+    loaded: OrderedDict[str, dict] = OrderedDict()
+    for item in data[-settings.FILE_ID_CACHE_MAX_ENTRIES:]:
+        try:
+            key, file_id, media_type = item
+        except (TypeError, ValueError):
+            continue
+        loaded[key] = {'file_id': file_id, 'media_type': media_type}
+    for key, entry in _entries.items(): # Entries added while loading are newer
+        loaded[key] = entry
+        loaded.move_to_end(key)
+    _entries.clear()
+    _entries.update(loaded)
+    _loaded = True
+    logger.info(f"Loaded {len(_entries)} file_id cache entries from {FILE_ID_CACHE_FILE}.")
+
+
+async def flush():
+    """Writes pending changes immediately (call on shutdown)."""
+    await _writer.flush()
+
+
+def get_stats() -> dict:
+    lookups = hits_total + misses_total
+    return {
+        'entries': len(_entries),
+        'capacity': settings.FILE_ID_CACHE_MAX_ENTRIES,
+        'hits_total': hits_total,
+        'misses_total': misses_total,
+        'evictions_total': evictions_total,
+        'hit_rate': (hits_total / lookups) if lookups else 0.0,
+    }
@@ -0,0 +1,61 @@
+# utils/hash_ring.py
+# -*- coding: utf-8 -*-
+import bisect
+import hashlib
+from typing import Hashable, Iterable
+
+
+def _hash(value: str) -> int:
+    """Stable 64-bit hash (Python's hash() is salted per process, so it cannot be shared between processes)."""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class ConsistentHashRing:
+    """
+    Consistent-hash ring with virtual nodes: maps keys (target chat ids) to nodes (egress workers).
+    Adding or removing a node only moves the keys of that node's ring segments.
+    """
+
+    def __init__(self, nodes: Iterable[Hashable] = (), vnodes: int = 64):
+        self._vnodes = max(1, vnodes)
+        self._points: list[int] = []
+        self._owners: list[Hashable] = []
+        self._nodes: set = set()
+        for node in nodes:
+            self.add_node(node)
+
+    @property
+    def nodes(self) -> set:
+        return set(self._nodes)
+
+    def add_node(self, node: Hashable):
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for replica in range(self._vnodes):
+            point = _hash(f"{node}#{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove_node(self, node: Hashable):
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    def get_node(self, key) -> Hashable | None:
+        """Node owning key (first ring point clockwise from the key's hash)."""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(str(key)))
+        return self._owners[index % len(self._owners)]
+
+    def partition(self, keys: Iterable) -> dict:
+        """Splits keys into {node: [key, ...]} (order within each node is kept)."""
+        groups: dict = {}
+        for key in keys:
+            groups.setdefault(self.get_node(key), []).append(key)
+        return groups
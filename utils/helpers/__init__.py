@@ -7,6 +7,7 @@ logger = logging.getLogger(__name__)
 
 try:
     from .batch_utils import process_batch
+    from .file_utils import write_json_atomic, read_json
     from .markup_utils import (
         extract_button_url,
         create_ptb_inline_markup,
@@ -21,10 +22,17 @@ try:
         MEDIA_STICKER,
         MEDIA_ANIMATION,
         get_telethon_media_type,
+        get_telethon_media_key,
         get_ptb_send_func_and_arg,
         get_media_file_id,
+        SpooledMedia,
+        get_telethon_media_size,
+        download_media_spooled,
+        stage_media_via_client,
     )
     from .text_utils import (
+        TweetHeader,
+        parse_tweet_header,
         extract_action_and_username,
         get_action_emoji,
         format_full_mode_header_html, # Giữ lại để định dạng header
@@ -32,6 +40,7 @@ try:
     )
     from .url_utils import (
         create_fxtwitter_url,
+        extract_tweet_status_id,
     )
 
     # Optional: Log successful import
@@ -45,6 +54,9 @@ except ImportError as e:
 __all__ = [
     # Batch
     "process_batch",
+    # File
+    "write_json_atomic",
+    "read_json",
     # Markup
     "extract_button_url",
     "create_ptb_inline_markup",
@@ -58,12 +70,20 @@ __all__ = [
     "MEDIA_STICKER",
     "MEDIA_ANIMATION",
     "get_telethon_media_type",
+    "get_telethon_media_key",
     "get_ptb_send_func_and_arg",
     "get_media_file_id",
+    "SpooledMedia",
+    "get_telethon_media_size",
+    "download_media_spooled",
+    "stage_media_via_client",
     # Text
+    "TweetHeader",
+    "parse_tweet_header",
     "extract_action_and_username",
     "get_action_emoji",
     "format_full_mode_header_html",
     # URL
     "create_fxtwitter_url",
+    "extract_tweet_status_id",
 ]
\ No newline at end of file
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+def write_json_atomic(path: str, data, indent: int | None = 4):
+    """
+    Ghi dữ liệu JSON ra file một cách atomic (temp file + rename).
+    Blocking I/O: gọi qua asyncio.to_thread khi đang ở trong event loop.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        # os.replace là atomic trên cùng một filesystem (POSIX và Windows)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def read_json(path: str, default=None):
+    """Đọc file JSON, trả về `default` nếu file không tồn tại."""
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class JsonWriteBehind:
+    """
+    Write-behind persistence of an in-memory registry: schedule() marks it dirty and makes sure a
+    single background task writes the newest snapshot() to path (write_json_atomic, off the event
+    loop). Changes made while a write is in flight are coalesced into one more write.
+    With delay, bursts of changes are batched: the task waits that long before its first write.
+    """
+
+    def __init__(self, path: str, snapshot: Callable[[], Any], delay: float = 0.0, indent: int | None = 4):
+        self.path = path
+        self._snapshot = snapshot
+        self._delay = delay
+        self._indent = indent
+        self._dirty = False
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None # Set by flush() to skip the remaining delay
+
+    def schedule(self):
+        """Marks the registry dirty and starts the write-behind task if needed."""
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run(self._wake))
+
+    async def _run(self, wake: asyncio.Event):
+        if self._delay > 0:
+            try:
+                await asyncio.wait_for(wake.wait(), self._delay)
+            except asyncio.TimeoutError:
+                pass
+        while self._dirty:
+            self._dirty = False
+            data = self._snapshot() # Always persist the newest snapshot, intermediate ones are skipped
+            try:
+                await asyncio.to_thread(write_json_atomic, self.path, data, self._indent)
+                logger.debug(f"Saved {self.path}")
+            except Exception as e:
+                logger.error(f"Failed to save {self.path}: {e}", exc_info=True)
+
+    async def flush(self):
+        """Writes pending changes now and waits until they are on disk (call on shutdown)."""
+        while self._task is not None and not self._task.done():
+            self._wake.set()
+            await asyncio.shield(self._task)
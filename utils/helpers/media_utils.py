@@ -1,5 +1,11 @@
 # utils/helpers/media_utils.py
+import contextlib
 import logging
+import os
+import tempfile
+from pathlib import Path
+
+from telegram import InputFile
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +59,17 @@ def get_telethon_media_type(message):
     return None
 
 
+def get_telethon_media_key(message) -> str | None:
+    """Stable identity of the message's media on Telegram ('photo:<id>:<access_hash>' / 'document:...')."""
+    photo = getattr(message, 'photo', None)
+    if photo is not None and getattr(photo, 'id', None):
+        return f"photo:{photo.id}:{getattr(photo, 'access_hash', 0)}"
+    document = getattr(message, 'document', None)
+    if document is not None and getattr(document, 'id', None):
+        return f"document:{document.id}:{getattr(document, 'access_hash', 0)}"
+    return None
+
+
 # Ánh xạ loại media sang hàm gửi của python-telegram-bot và tên tham số file_id/input_media
 MEDIA_SEND_INFO = {
     MEDIA_PHOTO: ('send_photo', 'photo'),
@@ -86,4 +103,122 @@ def get_media_file_id(ptb_message):
         return ptb_message.animation.file_id
     elif ptb_message.sticker:
         return ptb_message.sticker.file_id
-    return None
\ No newline at end of file
+    return None
+
+
+# --- Spooled (streaming) media download ---
+class SpooledMedia:
+    """
+    Downloaded media: kept in memory below a size threshold, in a temp file on disk above it.
+    Call close() when every send using it has finished (deletes the temp file).
+    Several owners (e.g. one per bot) can share it via share(); it is released on the last close().
+    """
+    __slots__ = ('data', 'path', 'size', '_refs')
+
+    def __init__(self, data: bytes | None = None, path: str | None = None, size: int = 0):
+        self.data = data
+        self.path = path
+        self.size = size
+        self._refs = 1
+
+    def share(self) -> "SpooledMedia":
+        """Adds an owner; each owner calls close() once."""
+        self._refs += 1
+        return self
+
+    @property
+    def in_memory(self) -> bool:
+        return self.data is not None
+
+    @contextlib.contextmanager
+    def open_upload(self, local_mode: bool = False, attach: bool = False):
+        """
+        Value for a PTB media argument, valid inside the with block: bytes, the Path in local mode
+        (the Bot API server reads the file itself), or else an InputFile that streams the temp file
+        (PTB would read a whole Path into memory first). httpx rewinds it for every retry.
+        attach: the value goes into an InputMedia (media groups reference uploads by attach name).
+        """
+        if self.data is not None:
+            yield self.data # InputMedia wraps bytes itself
+        elif local_mode:
+            yield Path(self.path)
+        else:
+            with open(self.path, 'rb') as handle:
+                yield InputFile(handle, filename=os.path.basename(self.path), attach=attach, read_file_handle=False)
+
+    def close(self):
+        self._refs -= 1
+        if self._refs > 0:
+            return
+        self.data = None
+        if self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not delete temp media file {self.path}: {e}")
+            self.path = None
+
+
+def get_telethon_media_size(message) -> int | None:
+    """Size in bytes of the message's media as announced by Telegram (None if unknown)."""
+    file = getattr(message, 'file', None)
+    return getattr(file, 'size', None) if file else None
+
+
+async def download_media_spooled(client, message, max_memory_bytes: int, temp_dir: str | None = None) -> SpooledMedia | None:
+    """
+    Downloads the message media into memory if it is known to be small, otherwise
+    streams it into a temp file. Returns None if the download produced no content.
+    """
+    size = get_telethon_media_size(message)
+    if size is not None and size <= max_memory_bytes:
+        data = await client.download_media(message, file=bytes)
+        return SpooledMedia(data=data, size=len(data)) if data else None
+
+    ext = getattr(getattr(message, 'file', None), 'ext', None) or ''
+    fd, path = tempfile.mkstemp(prefix='media_', suffix=ext, dir=temp_dir)
+    os.close(fd)
+    spooled = SpooledMedia(path=path)
+    try:
+        result = await client.download_media(message, file=path)
+        spooled.size = os.path.getsize(path) if result else 0
+    except BaseException:
+        spooled.close()
+        raise
+    if not spooled.size:
+        spooled.close()
+        return None
+    return spooled
+
+
+# --- Large media: staging through the user client ---
+async def stage_media_via_client(client, message, staging_chat, temp_dir: str | None = None) -> int | None:
+    """
+    Posts the message's media into a staging chat with the Telethon user client, so the bot can
+    copy it anywhere without the Bot API upload limit. Returns the staged message id (or None).
+    First tries re-sending the existing media by reference (no transfer at all), then falls back to
+    download + upload_file (Telethon's chunked MTProto upload).
+    """
+    try:
+        staged = await client.send_file(staging_chat, message.media)
+        return staged.id if staged else None
+    except Exception as e:
+        logger.warning(f"Msg {message.id}: staging media by reference failed ({e}). Re-uploading via user client.")
+
+    spooled = await download_media_spooled(client, message, 0, temp_dir) # 0 = always to disk
+    if not spooled:
+        return None
+    try:
+        uploaded = await client.upload_file(spooled.path)
+        document = getattr(message, 'document', None)
+        staged = await client.send_file(
+            staging_chat,
+            uploaded,
+            attributes=getattr(document, 'attributes', None), # Keep duration/dimensions/file name
+            force_document=get_telethon_media_type(message) == MEDIA_DOCUMENT,
+        )
+        return staged.id if staged else None
+    finally:
+        spooled.close()
@@ -2,57 +2,87 @@
 import logging
 import re
 import html
+from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
-def extract_action_and_username(text: str) -> tuple[str | None, str | None]:
+# --- Tweet header parser ---
+# The source bot puts the header ("**Tweet** from **username**") on the first line,
+# so only the beginning of the text is scanned. Together with the bounded
+# repetitions below this caps the worst case (no ReDoS on pathological input).
+HEADER_SCAN_LIMIT = 512
+
+# Optional action word (optionally bolded), then 'from **username**'.
+# Group 1: action word (None for the bare 'from **username**' fallback), group 2: username.
+_HEADER_RE = re.compile(
+    r"(?:(Retweet|Tweet|Quote|Reply)\s{0,8}\*{0,2}\s{1,8})?from\s{1,8}\*\*([^ *]{1,64}?)\*\*",
+    re.IGNORECASE,
+)
+# Optional bold 'RT' prefix at the start of a retweet body.
+_RT_PREFIX_RE = re.compile(r"\*{0,8}\s{0,8}RT\s{0,8}\*{0,8}\s*", re.IGNORECASE)
+
+_ACTION_NAMES = {"retweet": "Retweet", "tweet": "Tweet", "quote": "Quote", "reply": "Reply"}
+
+
+@dataclass(frozen=True, slots=True)
+class TweetHeader:
+    """Everything the pipeline needs from the source bot's text, parsed in one pass."""
+    action_type: str | None
+    username: str | None
+    body_start: int # Index where the body starts (-1 if the text has no line separator)
+    body: str # Body text, stripped; the RT prefix is removed when has_rt_prefix is True
+    has_rt_prefix: bool = False
+
+
+def parse_tweet_header(text: str) -> TweetHeader:
     """
-    Extracts the action type (Tweet, Retweet, Quote, Reply) and username,
-    handling optional bold markdown around the action word and username.
-    Returns (action_type, username) or (None, None).
+    Parses action, username, header/body boundary and RT prefix with one precompiled
+    regex over the (length-capped) header region plus two str.find calls.
     """
-    # ... (Code của hàm extract_action_and_username giữ nguyên) ...
     if not text:
-        return None, None
-
-    # Patterns: (regex, action_name_if_matched)
-    # Now explicitly look for optional ** around the action word.
-    patterns = [
-        # 1. Patterns with specific Action Words (allowing optional ** around action)
-        # Captures ActionWord in group 1, Username in group 2
-        (r"\**\s*(Retweet)\s*\**\s+from\s+\*\*([^ *]+?)\*\*", "Retweet"),
-        (r"\**\s*(Tweet)\s*\**\s+from\s+\*\*([^ *]+?)\*\*", "Tweet"),
-        (r"\**\s*(Quote)\s*\**\s+from\s+\*\*([^ *]+?)\*\*", "Quote"),
-        (r"\**\s*(Reply)\s*\**\s+from\s+\*\*([^ *]+?)\*\*", "Reply"),
-
-        # 2. Fallback: Just 'from **username**' - Action Unknown
-        # Captures Username in group 1
-        (r"from\s+\*\*([^ *]+?)\*\*", None) # Make sure this doesn't overlap greedily
-    ]
-
-    # Prioritize patterns with action words
-    for pattern, action_type_name in patterns:
-        if action_type_name: # Only check action word patterns first
-             match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
-             if match:
-                action_type = action_type_name # Use the predefined name
-                username = match.group(2).strip() # Username is the second capture group
-                logger.debug(f"Extracted Action/User: '{action_type}' / '{username}' (Pattern: Action Word)")
-                return action_type, username
-
-    # If no action word pattern matched, check the fallback pattern
-    fallback_pattern, _ = patterns[-1] # Get the 'from **username**' pattern
-    match = re.search(fallback_pattern, text, re.IGNORECASE | re.MULTILINE)
+        return TweetHeader(None, None, -1, "")
+
+    action_type = None
+    username = None
+    match = _HEADER_RE.search(text, 0, HEADER_SCAN_LIMIT)
     if match:
-        action_type = None # Action is unknown
-        username = match.group(1).strip() # Username is the first capture group
-        logger.debug(f"Extracted User only: '{username}' (Pattern: Fallback 'from')")
-        return action_type, username
+        action_word, username = match.group(1, 2)
+        username = username.strip() # A whitespace-only name stays '' (as before), not None
+        if action_word:
+            action_type = _ACTION_NAMES[action_word.lower()]
 
+    # Body starts after the first blank line, else after the first line break
+    body_start = text.find("\n\n")
+    if body_start != -1:
+        body_start += 2
+    else:
+        body_start = text.find("\n")
+        if body_start != -1:
+            body_start += 1
+    body = text[body_start:].strip() if body_start != -1 else text # Fallback to full text if no separator
+
+    has_rt_prefix = False
+    if action_type == "Retweet":
+        rt_match = _RT_PREFIX_RE.match(body)
+        if rt_match:
+            has_rt_prefix = True
+            body = body[rt_match.end():].strip()
+
+    return TweetHeader(action_type, username, body_start, body, has_rt_prefix)
 
-    # If absolutely nothing matched
-    logger.warning(f"Could not extract any username/action structure from text: '{text[:70]}...'")
-    return None, None
+
+def extract_action_and_username(text: str) -> tuple[str | None, str | None]:
+    """
+    Extracts the action type (Tweet, Retweet, Quote, Reply) and username,
+    handling optional bold markdown around the action word and username.
+    Returns (action_type, username) or (None, None).
+    """
+    header = parse_tweet_header(text)
+    if header.username:
+        logger.debug(f"Extracted Action/User: '{header.action_type}' / '{header.username}'")
+    elif text:
+        logger.warning(f"Could not extract any username/action structure from text: '{text[:70]}...'")
+    return header.action_type, header.username
 
 def get_action_emoji(action_type: str | None) -> str:
     """Gets the emoji corresponding to the Twitter action type."""
@@ -1,5 +1,6 @@
 # utils/helpers/url_utils.py
 import logging
+import re
 from urllib.parse import urlparse, urlunparse
 
 logger = logging.getLogger(__name__)
@@ -25,4 +26,14 @@ def create_fxtwitter_url(original_url: str | None) -> str | None:
             return original_url # Return original if not twitter/x
     except Exception as e:
         logger.error(f"Error parsing or converting URL '{original_url}': {e}")
-        return None # Return None on error
\ No newline at end of file
+        return None # Return None on error
+
+# Matches .../status/<id> and the legacy .../statuses/<id> (also i/web/status/<id>)
+_STATUS_ID_RE = re.compile(r"/status(?:es)?/(\d{1,25})")
+
+def extract_tweet_status_id(tweet_url: str | None) -> str | None:
+    """Extracts the canonical status ID from a twitter.com/x.com (or fxtwitter) URL."""
+    if not tweet_url:
+        return None
+    match = _STATUS_ID_RE.search(tweet_url)
+    return match.group(1) if match else None
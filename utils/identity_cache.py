@@ -0,0 +1,98 @@
+# utils/identity_cache.py
+# -*- coding: utf-8 -*-
+"""
+Runtime identity cache: resolve-once data about our bot and the source bot.
+
+Filled at startup (main.py), before the message handlers are registered, and refreshed
+in the background so the per-message path never has to call get_me()/get_entity().
+"""
+import asyncio
+import logging
+from telethon import TelegramClient
+from telegram import Bot
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_bot_id: int | None = None
+_bot_username: str | None = None
+_source_peer = None # Telethon InputPeer of SOURCE_BOT_IDENTIFIER
+_refresh_task: asyncio.Task | None = None
+
+
+def get_bot_username() -> str | None:
+    """Returns the cached username of the target bot (no API call)."""
+    return _bot_username
+
+
+def get_bot_id() -> int | None:
+    """Returns the cached id of the target bot (no API call)."""
+    return _bot_id
+
+
+def get_source_peer():
+    """Returns the resolved Telethon input peer of the source bot, or None if not resolved yet."""
+    return _source_peer
+
+
+async def refresh_bot_identity(bot: Bot):
+    """Resolves (or re-resolves) the bot's id and username."""
+    global _bot_id, _bot_username
+    bot_info = await bot.get_me()
+    if not bot_info.username:
+        raise ValueError("Bot username missing")
+    _bot_id = bot_info.id
+    _bot_username = bot_info.username
+    logger.debug(f"Identity cache: bot is @{_bot_username} (ID: {_bot_id}).")
+
+
+async def refresh_source_peer(client: TelegramClient):
+    """Resolves the source bot into a Telethon input peer (also warms Telethon's entity cache)."""
+    global _source_peer
+    _source_peer = await client.get_input_entity(settings.SOURCE_BOT_IDENTIFIER)
+    logger.debug(f"Identity cache: resolved source peer for {settings.SOURCE_BOT_IDENTIFIER}.")
+
+
+async def prime(bot: Bot, client: TelegramClient):
+    """Resolves bot and source identities once at startup. Raises if the bot identity cannot be resolved."""
+    await refresh_bot_identity(bot)
+    try:
+        await refresh_source_peer(client)
+    except Exception as e:
+        # Telethon will still resolve the source lazily, so this is not fatal
+        logger.error(f"Identity cache: could not resolve source bot {settings.SOURCE_BOT_IDENTIFIER}: {e}")
+    logger.info(f"Identity cache primed: bot @{_bot_username}, source peer resolved: {_source_peer is not None}")
+
+
+async def _refresh_loop(bot: Bot, client: TelegramClient, interval: float):
+    """Periodically refreshes the cached identities. Errors never stop the loop."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_bot_identity(bot)
+            await refresh_source_peer(client)
+        except Exception as e:
+            logger.warning(f"Identity cache: identity refresh failed, keeping cached values: {e}")
+
+
+def start_background_refresh(bot: Bot, client: TelegramClient, interval: float | None = None) -> asyncio.Task:
+    """Starts the background refresh task (every `interval` seconds, after prime())."""
+    global _refresh_task
+    if _refresh_task and not _refresh_task.done():
+        return _refresh_task
+    interval = interval or settings.IDENTITY_REFRESH_SECONDS
+    _refresh_task = asyncio.create_task(_refresh_loop(bot, client, interval))
+    return _refresh_task
+
+
+async def stop_background_refresh():
+    """Cancels the background refresh task (call on shutdown)."""
+    global _refresh_task
+    if _refresh_task and not _refresh_task.done():
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+    _refresh_task = None
@@ -0,0 +1,128 @@
+# utils/latency_ledger.py
+# -*- coding: utf-8 -*-
+import logging
+import math
+import time
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+MODE_FXTWITTER = 'fxtwitter'
+MODE_FULL = 'full' # Includes albums
+MODES = (MODE_FXTWITTER, MODE_FULL)
+
+
+class DeliveryRecord:
+    """Deliveries of one source message in one mode: source post time, first/last successful delivery."""
+    __slots__ = ('message_id', 'mode', 'source_ts', 'first_at', 'last_at', 'delivered', 'failed')
+
+    def __init__(self, message_id: int, mode: str, source_ts: float):
+        self.message_id = message_id
+        self.mode = mode
+        self.source_ts = source_ts
+        self.first_at: float | None = None
+        self.last_at: float | None = None
+        self.delivered = 0
+        self.failed = 0
+
+    def record(self, success: bool, at: float | None = None):
+        """Called once per target send when it finished."""
+        if not success:
+            self.failed += 1
+            return
+        if at is None:
+            at = time.time()
+        if self.first_at is None or at < self.first_at:
+            self.first_at = at
+        if self.last_at is None or at > self.last_at:
+            self.last_at = at
+        self.delivered += 1
+
+    def merge(self, first_at: float | None, last_at: float | None, delivered: int, failed: int):
+        """Adds the deliveries another process made for the same message and mode."""
+        if first_at is not None and (self.first_at is None or first_at < self.first_at):
+            self.first_at = first_at
+        if last_at is not None and (self.last_at is None or last_at > self.last_at):
+            self.last_at = last_at
+        self.delivered += delivered
+        self.failed += failed
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of a sorted, non-empty list."""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LatencyLedger:
+    """
+    Fixed-size ring of DeliveryRecords (one per message and mode): opening a record for a new
+    message overwrites the oldest one, so memory stays bounded whatever the traffic.
+    """
+
+    def __init__(self, capacity: int):
+        self._capacity = max(1, capacity)
+        self._ring: list[DeliveryRecord | None] = [None] * self._capacity
+        self._next = 0
+        self._index: dict[tuple[int, str], DeliveryRecord] = {} # Records currently in the ring
+
+    def open(self, message_id: int, mode: str, source_ts: float) -> DeliveryRecord:
+        """Returns the record of (message_id, mode), creating it in the oldest slot if needed."""
+        key = (message_id, mode)
+        record = self._index.get(key)
+        if record is not None:
+            return record
+        evicted = self._ring[self._next]
+        if evicted is not None:
+            self._index.pop((evicted.message_id, evicted.mode), None)
+        record = DeliveryRecord(message_id, mode, source_ts)
+        self._ring[self._next] = record
+        self._index[key] = record
+        self._next = (self._next + 1) % self._capacity
+        return record
+
+    def get(self, message_id: int, mode: str) -> DeliveryRecord | None:
+        """The record of (message_id, mode) if it is still in the ring."""
+        return self._index.get((message_id, mode))
+
+    def summary(self, window_seconds: float, now: float | None = None) -> dict[str, dict]:
+        """
+        Per mode, over messages posted in the last window_seconds: message count and p50/p95/p99
+        (seconds) of time-to-first and time-to-last delivery after the source post.
+        """
+        if now is None:
+            now = time.time()
+        since = now - window_seconds
+        to_first = {mode: [] for mode in MODES}
+        to_last = {mode: [] for mode in MODES}
+        for record in self._ring:
+            if record is None or record.first_at is None or record.source_ts < since:
+                continue
+            to_first[record.mode].append(record.first_at - record.source_ts)
+            to_last[record.mode].append(record.last_at - record.source_ts)
+        result = {}
+        for mode in MODES:
+            firsts, lasts = sorted(to_first[mode]), sorted(to_last[mode])
+            if not firsts:
+                result[mode] = {'messages': 0}
+                continue
+            result[mode] = {
+                'messages': len(firsts),
+                'first': tuple(_percentile(firsts, q) for q in (0.5, 0.95, 0.99)),
+                'last': tuple(_percentile(lasts, q) for q in (0.5, 0.95, 0.99)),
+            }
+        return result
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+_ledger: LatencyLedger | None = None
+
+def get_latency_ledger() -> LatencyLedger:
+    """Returns the process-wide latency ledger (created from settings on first use)."""
+    global _ledger
+    if _ledger is None:
+        _ledger = LatencyLedger(settings.LATENCY_LEDGER_SIZE)
+    return _ledger
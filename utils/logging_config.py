@@ -1,24 +1,77 @@
 # -*- coding: utf-8 -*-
+import atexit
+import itertools
+import json
 import logging
+import logging.handlers
+import queue
 import sys
 from config import settings
 
+# Background listener that formats and writes the records (None = handlers run inline)
+_listener: logging.handlers.QueueListener | None = None
+_send_success_counter = itertools.count(1)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message (+ exc when there is a traceback)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that only resolves the message on the calling thread. The stock prepare()
+    formats the whole record (timestamps, tracebacks) before enqueueing; here all formatting
+    happens in the listener thread. Records never leave the process, so exc_info can stay.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def _build_formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT == 'json':
+        return JsonFormatter()
+    # Định dạng log
+    return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
 def setup_logging():
     """Cấu hình hệ thống logging."""
+    global _listener
     log_level = getattr(logging, settings.LOG_LEVEL, logging.INFO)
 
-    # Định dạng log
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    formatter = logging.Formatter(log_format)
-
     # Handler cho console
     stream_handler = logging.StreamHandler(sys.stdout)
-    stream_handler.setFormatter(formatter)
+    stream_handler.setFormatter(_build_formatter())
 
     # Cấu hình root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(log_level)
-    root_logger.addHandler(stream_handler)
+    if settings.LOG_QUEUE_ENABLED:
+        # Callers (the event loop) only enqueue; a listener thread formats and writes to stdout
+        log_queue = queue.SimpleQueue()
+        root_logger.addHandler(_DeferredQueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        root_logger.addHandler(stream_handler)
 
     # Giảm độ chi tiết của các thư viện bên ngoài
     logging.getLogger("telethon").setLevel(logging.WARNING)
@@ -26,9 +79,26 @@ def setup_logging():
     logging.getLogger("httpx").setLevel(logging.WARNING) # Thường dùng bởi python-telegram-bot
 
     logger = logging.getLogger(__name__)
-    logger.info(f"Logging configured with level: {settings.LOG_LEVEL}")
+    logger.info(f"Logging configured with level: {settings.LOG_LEVEL} (format: {settings.LOG_FORMAT}, queued: {settings.LOG_QUEUE_ENABLED})")
 
     # Có thể thêm FileHandler ở đây nếu muốn ghi log ra file
     # file_handler = logging.FileHandler("bot.log")
     # file_handler.setFormatter(formatter)
-    # root_logger.addHandler(file_handler)
\ No newline at end of file
+    # root_logger.addHandler(file_handler)
+
+
+def stop_logging():
+    """Writes out the queued records and stops the listener thread (safe to call more than once)."""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+
+
+def sample_send_success() -> bool:
+    """
+    True for every LOG_SEND_SUCCESS_SAMPLE_EVERY-th successful send (0 = never): only those get
+    an INFO line, the rest is covered by the per-message summary.
+    """
+    every = settings.LOG_SEND_SUCCESS_SAMPLE_EVERY
+    return every > 0 and next(_send_success_counter) % every == 0
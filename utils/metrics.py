@@ -0,0 +1,326 @@
+# utils/metrics.py
+# -*- coding: utf-8 -*-
+"""
+In-process metrics: counters, gauges and histograms kept as plain numbers (no locks, the event
+loop is the only writer), rendered in the Prometheus text format by a small asyncio HTTP
+endpoint (GET /metrics). Hot paths bind their label values once (.labels(...)) so a sample is
+a dict-free increment or one bisect. The get_stats() dicts of the existing components are
+exported through register_stats() when scraped, so they cost nothing in between.
+"""
+import asyncio
+import logging
+import math
+import time
+from bisect import bisect_left
+from typing import Callable
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = 'forwarder'
+# Seconds: Bot API calls and pipeline stages range from a few ms to minutes (large uploads)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = f"{NAMESPACE}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Returns the child for these label values (keep it around on hot paths)."""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].value += amount
+
+    def _samples(self):
+        for key, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Gauge(_Metric):
+    """Gauge set by the code, or read from a callback when scraped (set_function)."""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Callable[[], float] | None = None
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._children[()].value = value
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            try:
+                yield f"{self.name} {_format_value(float(self._function()))}"
+            except Exception as e:
+                logger.debug(f"Gauge {self.name} callback failed: {e}")
+            return
+        for key, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class _HistogramChild:
+    __slots__ = ('_upper_bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, upper_bounds: tuple):
+        self._upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1) # Last slot: above the largest bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self._upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> '_Timer':
+        """Context manager observing the elapsed time of its block."""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ('_child', '_started')
+
+    def __init__(self, child: _HistogramChild):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def _samples(self):
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), child.counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+# --- Registry ---
+_metrics: dict[str, _Metric] = {}
+_stats_sources: dict[str, tuple[Callable[[], dict], str, bool]] = {}
+
+
+def _register(metric: _Metric) -> _Metric:
+    existing = _metrics.get(metric.name)
+    if existing is not None:
+        return existing # Same metric requested twice (e.g. module reloads): share it
+    _metrics[metric.name] = metric
+    return metric
+
+
+def counter(name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+    return _register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+    return _register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+def register_stats(prefix: str, stats_function: Callable[[], dict], label: str = 'key', grouped: bool = False):
+    """
+    Exports a component's get_stats() dict when scraped as {prefix}_{stat} samples (keys ending
+    in _total are counters). Nested {value: number} dicts become a label named label; with
+    grouped=True the dict itself is {label value: {stat: number}} (e.g. one entry per bot) and
+    nested dicts inside a group get a second label named 'key'.
+    """
+    _stats_sources[prefix] = (stats_function, label, grouped)
+
+
+def _render_stats(prefix: str, stats: dict, label: str, grouped: bool) -> list[str]:
+    samples: dict[str, list[str]] = {}
+
+    def add(stat: str, value, label_names: tuple = (), label_values: tuple = ()):
+        if isinstance(value, bool):
+            value = int(value)
+        if not isinstance(value, (int, float)):
+            return
+        name = f"{NAMESPACE}_{prefix}_{stat}"
+        samples.setdefault(name, []).append(f"{name}{_format_labels(label_names, label_values)} {_format_value(value)}")
+
+    groups = stats.items() if grouped else ((None, stats),)
+    for label_value, group in groups:
+        outer_names, outer_values = ((label,), (label_value,)) if grouped else ((), ())
+        inner_name = 'key' if grouped else label
+        for stat, value in group.items():
+            if isinstance(value, dict):
+                for inner_value, number in value.items():
+                    add(stat, number, (*outer_names, inner_name), (*outer_values, inner_value))
+            else:
+                add(stat, value, outer_names, outer_values)
+    lines = []
+    for name, name_samples in samples.items():
+        lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+        lines.extend(name_samples)
+    return lines
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in list(_metrics.values()):
+        lines.extend(metric.render())
+    for prefix, (stats_function, label, grouped) in list(_stats_sources.items()):
+        try:
+            stats = stats_function()
+        except Exception as e:
+            logger.debug(f"Stats source '{prefix}' failed: {e}")
+            continue
+        if stats:
+            lines.extend(_render_stats(prefix, stats, label, grouped))
+    return '\n'.join(lines) + '\n'
+
+
+# --- HTTP endpoint ---
+_server: asyncio.AbstractServer | None = None
+
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+            pass # Headers are not needed
+        parts = request_line.decode('latin-1').split()
+        path = parts[1].split('?', 1)[0] if len(parts) >= 2 else ''
+        if len(parts) >= 2 and parts[0] == 'GET' and path == '/metrics':
+            status, content_type, body = '200 OK', 'text/plain; version=0.0.4; charset=utf-8', render().encode('utf-8')
+        else:
+            status, content_type, body = '404 Not Found', 'text/plain; charset=utf-8', b'Not Found\n'
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1')
+            + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    except Exception as e:
+        logger.warning(f"Metrics endpoint error: {e}")
+    finally:
+        writer.close()
+
+
+async def start_metrics_server() -> asyncio.AbstractServer | None:
+    """Serves GET /metrics on METRICS_HOST:METRICS_PORT (METRICS_PORT=0 disables the endpoint)."""
+    global _server
+    if _server is None and settings.METRICS_PORT > 0:
+        _server = await asyncio.start_server(_handle_connection, settings.METRICS_HOST, settings.METRICS_PORT)
+        logger.info(f"Metrics endpoint listening on http://{settings.METRICS_HOST}:{settings.METRICS_PORT}/metrics")
+    return _server
+
+
+async def stop_metrics_server():
+    global _server
+    if _server is not None:
+        server, _server = _server, None
+        server.close()
+        await server.wait_closed()
@@ -0,0 +1,258 @@
+# utils/outbox.py
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS payloads (
+    id INTEGER PRIMARY KEY,
+    message_id INTEGER NOT NULL,
+    bot_id INTEGER,
+    kind TEXT NOT NULL,
+    job TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    id INTEGER PRIMARY KEY,
+    payload_id INTEGER NOT NULL REFERENCES payloads(id),
+    chat_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deliveries_payload ON deliveries(payload_id);
+"""
+
+
+class Outbox:
+    """
+    Write-ahead journal of sends in SQLite (WAL mode). A message's deliveries are recorded
+    (one payload row + one row per target) before the sends start and deleted when each send
+    has finished, so after a crash the remaining rows are exactly the undelivered sends.
+
+    Writes are group-committed: records and completions queue up in memory and one writer
+    task commits them together every commit_interval seconds (or once batch_size is reached).
+    record() waits for its commit; mark_done() does not wait.
+    """
+
+    def __init__(self, path: str, commit_interval: float, batch_size: int, synchronous: str = 'NORMAL', send_budget_ms: float = 1.0):
+        self._path = path
+        self._commit_interval = commit_interval
+        self._batch_size = max(1, batch_size)
+        self._synchronous = synchronous
+        self._send_budget_ms = send_budget_ms
+        self._conn: sqlite3.Connection | None = None
+        # Every statement runs on this one thread, in submission order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+        self._records: list[tuple[dict, list[int], asyncio.Future]] = []
+        self._done: list[int] = []
+        self._wakeup: asyncio.Event | None = None
+        self._writer_task: asyncio.Task | None = None
+        self._closed = False
+
+        # Counters
+        self.records_total = 0 # Deliveries journaled
+        self.done_total = 0
+        self.commits_total = 0
+        self.commit_seconds_total = 0.0
+        self.commit_seconds_max = 0.0
+        self.over_budget_commits_total = 0
+
+    # --- Writer thread ---
+    def _connect(self):
+        conn = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL: a commit survives a process crash (the crash case the outbox is for); FULL also survives power loss
+        conn.execute(f"PRAGMA synchronous={self._synchronous}")
+        conn.execute("PRAGMA busy_timeout=5000") # Egress worker processes write to the same file
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+
+    def _commit(self, records: list, done: list[int]) -> list[dict[int, int]]:
+        conn = self._conn
+        entries_per_record = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for job, chat_ids in records:
+                cursor = conn.execute(
+                    "INSERT INTO payloads (message_id, bot_id, kind, job, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job['message_id'], job['bot_id'], job['kind'], json.dumps(job), time.time()),
+                )
+                payload_id = cursor.lastrowid
+                entries = {}
+                for chat_id in chat_ids:
+                    entries[chat_id] = conn.execute(
+                        "INSERT INTO deliveries (payload_id, chat_id) VALUES (?, ?)", (payload_id, chat_id)
+                    ).lastrowid
+                entries_per_record.append(entries)
+            if done:
+                conn.executemany("DELETE FROM deliveries WHERE id = ?", ((entry_id,) for entry_id in done))
+                conn.execute("DELETE FROM payloads WHERE id NOT IN (SELECT payload_id FROM deliveries)")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return entries_per_record
+
+    def _load_pending(self) -> list[dict]:
+        rows = self._conn.execute(
+            "SELECT p.id, p.job, p.created_at, d.id, d.chat_id FROM payloads p JOIN deliveries d ON d.payload_id = p.id ORDER BY p.id, d.id"
+        ).fetchall()
+        pending: dict[int, dict] = {}
+        for payload_id, job, created_at, entry_id, chat_id in rows:
+            item = pending.get(payload_id)
+            if item is None:
+                item = pending[payload_id] = {'job': json.loads(job), 'created_at': created_at, 'entries': {}}
+            item['entries'][chat_id] = entry_id
+        return list(pending.values())
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # --- Public API ---
+    async def open(self):
+        if self._conn is None:
+            await self._run(self._connect)
+            self._wakeup = asyncio.Event()
+            self._writer_task = asyncio.create_task(self._writer_loop())
+            logger.info(f"Send outbox opened at {self._path} (group commit every {self._commit_interval * 1000:.0f} ms).")
+
+    async def record(self, job: dict, chat_ids: list[int]) -> dict[int, int]:
+        """Journals one delivery per chat for job and waits until it is committed. Returns {chat_id: entry_id}."""
+        if not chat_ids:
+            return {}
+        future = asyncio.get_running_loop().create_future()
+        self._records.append((job, list(chat_ids), future))
+        self._wakeup.set()
+        return await future
+
+    def mark_done(self, entry_id: int):
+        """Removes a finished delivery from the journal (committed with the next batch)."""
+        self._done.append(entry_id)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def load_pending(self) -> list[dict]:
+        """Undelivered sends left by a previous run: [{'job', 'created_at', 'entries': {chat_id: entry_id}}] in journal order."""
+        return await self._run(self._load_pending)
+
+    async def _writer_loop(self):
+        while True:
+            await self._wakeup.wait()
+            # Let more sends join this commit (unless the batch is already full)
+            if len(self._records) + len(self._done) < self._batch_size and not self._closed:
+                await asyncio.sleep(self._commit_interval)
+            self._wakeup.clear()
+            await self._flush_batch()
+            if self._closed and not self._records and not self._done:
+                return
+
+    async def _flush_batch(self):
+        records, self._records = self._records, []
+        done, self._done = self._done, []
+        if not records and not done:
+            return
+        started = time.monotonic()
+        try:
+            entries_per_record = await self._run(self._commit, [(job, chat_ids) for job, chat_ids, _ in records], done)
+        except Exception as e:
+            pending = [record for record in records if not record[2].done()]
+            if self._closed:
+                logger.error(f"Outbox commit failed while closing ({len(pending)} record(s), {len(done)} completion(s) lost): {e}", exc_info=True)
+                for _, _, future in pending:
+                    future.set_exception(e)
+                return
+            # Retried with the next batch: a lost completion would resume a delivered send after a restart
+            logger.error(f"Outbox commit failed ({len(pending)} record(s), {len(done)} completion(s)). Retrying: {e}", exc_info=True)
+            self._records = pending + self._records
+            self._done = done + self._done
+            await asyncio.sleep(self._commit_interval) # No busy loop while the database keeps failing
+            self._wakeup.set()
+            return
+        elapsed = time.monotonic() - started
+        deliveries = sum(len(chat_ids) for _, chat_ids, _ in records)
+        self.commits_total += 1
+        self.commit_seconds_total += elapsed
+        self.commit_seconds_max = max(self.commit_seconds_max, elapsed)
+        self.records_total += deliveries
+        self.done_total += len(done)
+        operations = deliveries + len(done)
+        if operations and elapsed * 1000 / operations > self._send_budget_ms:
+            self.over_budget_commits_total += 1
+            logger.warning(f"Outbox commit took {elapsed * 1000:.1f} ms for {operations} operation(s): above the {self._send_budget_ms} ms per-send budget.")
+        for (_, _, future), entries in zip(records, entries_per_record):
+            if not future.done():
+                future.set_result(entries)
+
+    async def close(self):
+        """Commits everything still queued and closes the database."""
+        if self._conn is None:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._writer_task is not None:
+            await self._writer_task
+        await self._run(self._conn.close)
+        self._conn = None
+        self._executor.shutdown(wait=False)
+        logger.info(f"Send outbox closed (stats: {self.get_stats()}).")
+
+    def get_stats(self) -> dict:
+        operations = self.records_total + self.done_total
+        return {
+            'records_total': self.records_total,
+            'done_total': self.done_total,
+            'commits_total': self.commits_total,
+            'queued': len(self._records) + len(self._done),
+            'ops_per_commit': (operations / self.commits_total) if self.commits_total else 0.0,
+            'commit_ms_per_op': (self.commit_seconds_total * 1000 / operations) if operations else 0.0,
+            'commit_seconds_max': self.commit_seconds_max,
+            'over_budget_commits_total': self.over_budget_commits_total,
+        }
+
+
+_outbox: Outbox | None = None
+
+
+async def open_outbox() -> Outbox | None:
+    """Opens the process-wide outbox (None if OUTBOX_ENABLED is off)."""
+    global _outbox
+    if _outbox is None and settings.OUTBOX_ENABLED:
+        outbox = Outbox(
+            settings.OUTBOX_FILE,
+            commit_interval=settings.OUTBOX_COMMIT_INTERVAL_MS / 1000,
+            batch_size=settings.OUTBOX_BATCH_SIZE,
+            synchronous=settings.OUTBOX_SYNCHRONOUS,
+            send_budget_ms=settings.OUTBOX_SEND_BUDGET_MS,
+        )
+        await outbox.open()
+        _outbox = outbox
+    return _outbox
+
+
+def get_outbox() -> Outbox | None:
+    return _outbox
+
+
+def release_entries(outbox_entries: dict[int, int] | None):
+    """
+    Clears the entries nobody took over (launch_*_sends and publishing take theirs out of the
+    dict), e.g. targets skipped for lack of a payload, so they are not resumed forever.
+    """
+    if _outbox is not None and outbox_entries:
+        for entry_id in outbox_entries.values():
+            _outbox.mark_done(entry_id)
+    if outbox_entries:
+        outbox_entries.clear()
+
+
+async def close_outbox():
+    global _outbox
+    if _outbox is not None:
+        outbox, _outbox = _outbox, None
+        await outbox.close()